@@ -7,21 +7,15 @@ Original file is located at
     https://colab.research.google.com/drive/1z4F_DnavrR9o2K-5VWGh_oxkdAgCOtgI
 """
 
-import copy
-import csv
-import matplotlib 
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas
-import random
 import seaborn
 
-from collections import Counter
+"""The models, trainers and helpers used below are defined in the `cs461` package at the root of this repository (`cs461.mnist` for this project, `cs461.utils` for the helpers shared by all projects), so each cell imports the ones it uses instead of defining them. Install it with `pip install -e .` from a checkout. Its unit tests are in `tests/` and run with `python -m pytest` from the repository root."""
 
-def set_seed(seed):  # For reproducibility, fix random seeds.
-  random.seed(seed)
-  np.random.seed(seed)
+from cs461.utils import set_seed
 
 set_seed(42)
 
@@ -36,69 +30,24 @@ drive.mount('/content/drive')
 
 datadir = '/content/drive/My Drive/data/MNIST/'
 
-class MNISTDataset:
-
-  def __init__(self, split):
-    assert split in ['train', 'train_small', 'val', 'test']
-    self.inputs = np.load('{:s}inputs_{:s}.npy'.format(datadir, split))
-    self.labels = None
-    if split != 'test':
-      self.labels, self.label_count = self.get_labels('{:s}labels_{:s}.npy'.format(datadir, split))
-      assert self.labels.shape[0] == self.inputs.shape[0]
-    self.split = split
-
-  def get_labels(self, filepath):
-    label_matrix = np.load(filepath)  # (num_examples, num_labels)
-    labels = np.zeros((len(label_matrix), 1)).astype(int)  # (num_examples, 1)
-    label_count = Counter()
-    for i in range(len(label_matrix)):
-      label= np.nonzero(label_matrix[i])[0][0]
-      labels[i] = label
-      label_count[label] += 1
-
-    return labels, label_count
-
-  def num_examples(self):
-    return self.inputs.shape[0]
-
-  def dim(self):
-    return self.inputs.shape[1]
-
-  def generate_batch(self, batch_size):
-    inds = list(range(self.num_examples()))  
-    if self.split == 'train':  # If train, shuffle example indices before generating
-      random.shuffle(inds)    
-    for i in range(0, len(inds), batch_size):
-        inds_batch = inds[i: i + batch_size]
-        X = self.inputs[inds_batch, :]
-        y = self.labels[inds_batch, :] if self.labels is not None else None
-        yield X, y
-
-dataset_train = MNISTDataset('train')
-dataset_val = MNISTDataset('val')
-dataset_test = MNISTDataset('test')
+from cs461.mnist import MNISTDataset
+
+dataset_train = MNISTDataset('train', datadir=datadir)
+dataset_val = MNISTDataset('val', datadir=datadir)
+dataset_test = MNISTDataset('test', datadir=datadir)
 
 print('Number of examples (train/val/test): {:d}/{:d}/{:d}'.format(dataset_train.num_examples(), dataset_val.num_examples(), dataset_test.num_examples()))
 print('Original number of features (image represented as a vector): {:d}'.format(dataset_train.dim()))
 print('First training input looks like this...', dataset_train.inputs[0, 160:200])
-print('Label: ', dataset_train.labels[0, 0])
+print('Label: ', dataset_train.labels[0])
 
 """Note that we don't have labels for the test portion. We can do a better job of visualizing the inputs."""
 
-def visualize_image(image_raw):
-  image = image_raw.reshape(28, 28)  # Reshape a vector into a square
-  fig = matplotlib.pyplot.figure()
-  ax = fig.add_subplot(1, 1, 1)
-  imgplot = ax.imshow(image, cmap=matplotlib.cm.Greys)
-  imgplot.set_interpolation("nearest")
-  ax.xaxis.set_ticks_position("top")
-  ax.yaxis.set_ticks_position("left")
-  matplotlib.pyplot.axis("off")
-  matplotlib.pyplot.show()
+from cs461.mnist import visualize_image
 
 print('First training input')
 visualize_image(dataset_train.inputs[0])
-print('Label: ', dataset_train.labels[0, 0])
+print('Label: ', dataset_train.labels[0])
 
 """The dataset is balanced so that we have an equal amount of supervision for each class. This is a luxury: in the wild we will need to deal with datasets with possibly very unbalanced datasets."""
 
@@ -110,37 +59,26 @@ for digit in range(10):
 Raw pixel values have high variance and are not mean-centered. To make learning more effective, we'll preprocess the data and normalize each feature (i.e., each pixel) so that each has mean 0 and variance 1 ("$z$-scoring"), similar to what we did in the regression assignment.
 """
 
-def normalize_features(X, mu=None, sigma=None):
-  if mu is None or sigma is None: 
-    mu = X.mean(0)
-    sigma = X.std(0)
-    sigma[sigma < 0.0001] = 1  # Avoid division by zero in case of degenerate features.
-
-  # Normalize features and also add a bias feature.
-  X_new = np.concatenate([np.ones((X.shape[0], 1)), (X - mu) / sigma], 1)
-
-  return X_new, mu, sigma
+from cs461.mnist import normalize_features
 
 print('First training input after normalization (not including the bias dimension)')
 visualize_image(normalize_features(dataset_train.inputs)[0][0, 1:])
 
+"""The statistics $\mu, \sigma$ are computed once on the training data and then fixed, so the normalized version of each split never changes. Rather than renormalizing every minibatch in every epoch, `MNISTDataset.normalize` computes it once (optionally in float32, and optionally saved to an `.npy` file that later runs memory-map) and training/evaluation just slice it."""
+
 """# Softmax
 
 Define a row-wise softmax that turns any rows of label scores (aka. "logits") into probability distributions over labels, with a numerical stability trick.
 """
 
-def softmax(scores):  # (num_examples, num_labels)
-  nonnegs = np.exp(scores - np.amax(scores, axis=1)[:, np.newaxis])  # Mitigate numerical overflow by subtracting max 
-  return nonnegs / np.sum(nonnegs, axis=1)[:, np.newaxis]
+from cs461.mnist import softmax
 
 u = np.array([[-1, 2, 0]])
 print(u[0], '=>', softmax(u)[0])
 
 """Also, define a row-wise logsumexp that computes the log of the sum of the elements of each row, with a numerical stability trick."""
 
-def logsumexp(scores):  # (num_examples, num_labels)
-  rowwise_max = np.amax(scores, axis=1)[:, np.newaxis] 
-  return rowwise_max + np.log(np.sum(np.exp(scores - rowwise_max), axis=1)[:, np.newaxis])
+from cs461.mnist import logsumexp
 
 v = np.array([[-1, -2, 3]])
 print(logsumexp(v)[0, 0])
@@ -168,69 +106,6 @@ $$
 with respect to $W$ evaluated at the *current* value of $W$, then accumulates $\nabla \hat{J}(W) \in \mathbb{R}^{d \times L}$ for gradient-based optimization.
 """
 
-class LinearClassifier:
-    
-  def __init__(self, inputs_train, num_labels, init_range=0.0):
-    new_features, self.mu, self.sigma = normalize_features(inputs_train)  # Get means and standard devations
-    self.dim = new_features.shape[1]
-
-    # Initialize parameters. 
-    self.W = np.random.uniform(-init_range, init_range, (self.dim, num_labels))
-
-    # Initialize the gradient.
-    self.W_grad = np.zeros((self.dim, num_labels))
-                      
-  def forward(self, X_raw, y=None, regularization_weight=0.):
-    X = normalize_features(X_raw, self.mu, self.sigma)[0]
-    scores = np.matmul(X, self.W)  # (batch_size, num_labels)        
-    loss_sum = None
-    if y is not None:  # We're given gold labels, we're training.
-
-      # Compute the negative log probabilities here using logsumexp. The NumPy function take_along_axis will also be useful.
-      negative_log_probs = None  # (batch_size,)
-      
-      sum_score = logsumexp(scores)
-      negative_log_probs = sum_score - np.take_along_axis(scores,y,axis=1)
-
-      squared_norm_W = np.linalg.norm(self.W[1:, :], 'fro') ** 2  # Don't regularize bias parameters
-      loss_sum = np.sum(negative_log_probs) + regularization_weight * squared_norm_W
-      self.accumulate_gradients(X, y, scores, regularization_weight)
-
-    return loss_sum, scores
-  
-  def accumulate_gradients(self, X, y, scores, regularization_weight):
-    batch_size, num_labels = scores.shape
-    probs = softmax(scores)        
-    G = np.zeros((batch_size,num_labels)) #Have to expand y to get Gold Matrix
-    for i in range(batch_size):
-      G[i][y[i]] = 1
-
-
-    # Compute the gradient of the average negative log probability wrt W
-    loss_grad = None  # (dim, num_labels)
-    loss_grad = np.matmul(np.transpose(X),probs) - np.matmul(np.transpose(X), G)
-    loss_grad *= 1/(batch_size)
-    
-
-
-    # Compute the gradient of the regularization term (again, remember that bias parameters are not regularized).
-    squared_norm_grad = None  # (dim, num_labels)
-    w_aa=self.W.copy()
-    w_aa[0, :]=0
-    squared_norm_grad = 2*w_aa
-    self.W_grad += loss_grad + regularization_weight * squared_norm_grad
-      
-  def predict(self, X_raw):
-      _, scores = self.forward(X_raw)
-      preds = np.argmax(scores, axis=1)[:, np.newaxis]  # (batch_size, 1)
-      return preds
-
-  def zero_grad(self):
-    self.W_grad.fill(0.)
-      
-  def num_parameters(self):
-    return self.W.size
-
 """## Gradient Check
 
 One useful way to ensure that your gradient computation is absolutely correct is to do what's called the **gradient check**. Recall that *by definition* the derivative of a function $f$ of some scalar variable $x \in \mathbb{R}$ evaluated at $x = a$ is:
@@ -240,126 +115,42 @@ f'(a) = \lim_{\epsilon \rightarrow 0} \frac{f(x + \epsilon) - f(x)}{\epsilon}
 $$
 
 Thus we can set some small $\epsilon > 0$ and check if this is indeed the case for our gradients. Remember, in our case the function of interest is $\hat{J}(W)$ above, defined on a single batch of labeled examples. We are calculating the gradient of that function with respect to model parameters $W$. Even though this is matrix-valued, a gradient is simply an array of partial derivatives so we can check each derivative individually.
+
+Checking each derivative individually takes $dL$ forward passes though, which is only feasible for toy dimensions (the actual model would take 7,850). A cheaper check uses the fact that the directional derivative along any unit vector $v$ is $\nabla \hat{J}(W) \cdot v$. Comparing it with the central difference $(\hat{J}(W + \epsilon v) - \hat{J}(W - \epsilon v)) / 2\epsilon$ along a handful of random directions takes a handful of forward passes regardless of the model size, and a wrong gradient is very unlikely to agree along random directions.
 """
 
-import unittest
-
-class TestGradient(unittest.TestCase):
-
-  def setUp(self):
-    set_seed(42)
-    dim = 100
-    num_labels = 7
-    num_examples = 10
-    self.model = LinearClassifier(np.random.randn(num_examples, dim), num_labels, init_range=0.01)
-    self.X = np.random.randn(num_examples, dim)
-    self.y = np.random.randint(num_labels, size=(num_examples, 1))
-    self.epsilon = 1e-4
-    self.regularization_weight = 0.01
-    self.loss_avg = self.model.forward(self.X, self.y, self.regularization_weight)[0] / num_examples
-    self.model.zero_grad()
-      
-  def test_gradient_W(self):
-    for i in range(self.model.W.shape[0]):
-      for j in range(self.model.W.shape[1]): 
-        self.model.W[i, j] += self.epsilon
-        loss_avg_perturbed = self.model.forward(self.X, self.y, self.regularization_weight)[0] / self.X.shape[0]
-        partial_derivative_i_j = self.model.W_grad[i, j]
-        truth = (loss_avg_perturbed - self.loss_avg) / self.epsilon
-        error = abs(partial_derivative_i_j - truth)
-        self.assertLess(error, 1e-3)
-        self.model.W[i, j] -= self.epsilon
-        self.model.zero_grad()
-            
-unittest.main(TestGradient(), argv=[''], verbosity=2, exit=False)
+from cs461.utils import check_gradient
+from cs461.mnist import LinearClassifier
+
+# Sanity check on a full-size model and a batch of training examples
+model_check = LinearClassifier(dataset_train.inputs, 10, init_range=0.01)
+X_check, y_check = dataset_train.inputs[:64], dataset_train.labels[:64, np.newaxis]
+def loss_and_gradient(W):
+  model_check.W = W
+  return model_check.loss_and_gradient(X_check, y_check, regularization_weight=0.01)
+print('Max error of directional derivatives:', check_gradient(loss_and_gradient, model_check.W))
+
+"""At inference time the normalization is pure overhead: `predict` builds a normalized copy of the batch with a bias column before the matmul. `LinearClassifier.fold` rewrites the model as an equivalent `FoldedLinearClassifier` with weights $W_{2:d} / \sigma$ and bias $W_1 - (\mu / \sigma)^\top W_{2:d}$, which scores raw pixels with a single matmul."""
 
 """# Training
 
 We will use stochastic gradient descent (SGD) to optimize the average cross-entropy loss above. Define a simple SGD optimizer class, which updates parameters of the associated model.
 """
 
-class SGDOptimizer:
-    
-  def __init__(self, model, learning_rate):
-    self.model = model
-    self.lr = learning_rate
-      
-  def step(self):
-    self.model.W -= self.lr * self.model.W_grad
-      
-  def zero_grad(self):
-    self.model.zero_grad()
-      
-  def modify_lr(self, learning_rate):
-    self.lr = learning_rate
-
-def evaluate_accuracy(model, dataset_eval, batch_size_eval=64):
-  num_correct = 0
-  for X, y in dataset_eval.generate_batch(batch_size_eval):
-    num_correct += np.sum(model.predict(X) == y)
-  return num_correct / dataset_eval.num_examples() * 100.
-
-def train(dataset_train, dataset_val, learning_rate=0.1, init_range=0., batch_size=16, regularization_weight=0., max_num_epochs=10, seed=42, loss_improvement=0.01, decay=2., tolerance=5, verbose=False):
-  set_seed(seed)  
-  model = LinearClassifier(dataset_train.inputs, 10, init_range=init_range)  
-  optimizer = SGDOptimizer(model, learning_rate)
-  
-  best_acc_val = float('-inf')
-  best_W = None
-  num_continuous_fails = 0
-  loss_avg_before = None
-  
-  if verbose:
-    print('Num parameters {:d}'.format(model.num_parameters()))
-    print('Batch size {:d}, learning rate {:.5f}, regularization_weight {:.5f}'.format(batch_size, learning_rate, regularization_weight))
-      
-  for epoch in range(max_num_epochs):
-    loss_total = 0.
-    num_correct = 0    
-
-    for X, y in dataset_train.generate_batch(batch_size):  # Shuffled in each epoch
-      loss_sum, scores = model.forward(X, y, regularization_weight)
-      loss_total += loss_sum
-      preds = np.argmax(scores, axis=1)[:, np.newaxis]
-      num_correct += np.sum(preds == y)
-
-      optimizer.step()
-      optimizer.zero_grad()
-
-    loss_avg = loss_total / dataset_train.num_examples()
-    acc_train = num_correct / dataset_train.num_examples() * 100. 
-    acc_val = evaluate_accuracy(model, dataset_val)
-  
-    if acc_val > best_acc_val:
-      num_continuous_fails = 0
-      best_acc_val = acc_val
-      best_W = copy.deepcopy(model.W)
-    else:
-      num_continuous_fails += 1
-      if num_continuous_fails > tolerance:
-        if verbose: 
-            print('Early stopping')
-        break
-    
-    if loss_avg_before is not None:
-      if loss_avg_before - loss_avg < loss_improvement:  # Training loss has not improved sufficiently, decay the learning rate
-        optimizer.modify_lr(optimizer.lr / decay)
-        if verbose and decay != 1.0:
-          print('Decaying learning rate to {:.5f}'.format(optimizer.lr))
-    loss_avg_before = loss_avg 
-
-    if verbose:
-      print('End of epoch {:3d}:\t loss avg {:10.4f}\t acc train {:10.2f}\t acc val {:10.2f}'.format(
-          epoch + 1, loss_avg, acc_train, acc_val)) 
-
-  model.W = best_W
-  if verbose:
-    print('Best acc val: {:10.2f}'.format(best_acc_val))
-
-  return model, best_acc_val, loss_avg, acc_train
+"""Plain SGD takes many epochs to converge. Adaptive methods (see [this overview](https://ruder.io/optimizing-gradient-descent/)) usually get to the same validation accuracy in fewer epochs. They share the interface of `SGDOptimizer` (so the learning rate decay in `train` still applies), and keep their state in buffers that are allocated once and updated in place."""
+
+from cs461.mnist import train
 
 model, acc_val, loss_avg, acc_train = train(dataset_train, dataset_val, learning_rate=5., batch_size=24, decay=2, verbose=True)
 
+"""## Full-Batch Optimization
+
+The regularized objective $\hat{J}(W)$ is convex and smooth, so instead of many epochs of minibatch SGD we can also hand the loss and gradient on the *whole* (normalized) training set to a quasi-Newton method. [L-BFGS](https://en.wikipedia.org/wiki/Limited-memory_BFGS) builds a curvature estimate from recent gradients and typically gets to the optimum in far fewer passes over the data, each of which is a single large matmul. It is also deterministic: there is no shuffling, learning rate or decay to tune."""
+
+from cs461.mnist import train_lbfgs
+
+model_lbfgs, acc_val, loss_avg, acc_train = train_lbfgs(dataset_train, dataset_val, regularization_weight=0.001, verbose=True)
+
 """# Hyperparameter Tuning
 
 Experiments usually involve heavy hyperparameter tuning. This means you try a few different values of key hyperparameters to find one that works best (on validation data). For stochastic gradient descent, two important hyperparameters are the *batch size* and the *learning rate*. These two interact, so you have to search over their joint space. Typically you change them on a logarithmic scale (e.g., 0.0001, 0.001, 0.01, 0.1 for learning rates, 16, 32, 64, 128, 256 for batch sizes). 
@@ -367,16 +158,22 @@ Experiments usually involve heavy hyperparameter tuning. This means you try a fe
 However, to focus on the effect of regularization, we will fix the batch size and learning rate to be some reasonable values and only vary the regularization weight.
 """
 
+"""Note that `train` reseeds, so every value of $\lambda$ sees exactly the same initialization and the same sequence of shuffled minibatches. Rather than rerunning every epoch once per configuration, we can stack the parameters of all $C$ configurations into one $(C, d, L)$ tensor and update them together with batched matmuls on each minibatch. Each configuration keeps its own learning rate, decay and early stopping (a configuration that stops is frozen while the others continue), so the results are the same as calling `train` for each one."""
+
+"""Batch size and learning rate can't be stacked like this (they change the updates themselves), but different (batch size, learning rate) pairs are completely independent. So we fan them out to a pool of worker processes, each of which runs `train_many` over all values of $\lambda$. The datasets are written once to memory-mapped files that every worker maps, rather than being copied into each process."""
+
+from cs461.mnist import sweep
+
 model_best = None
 best_acc_val = float('-inf')
-for batch_size in [16]:
-  for learning_rate in [0.1]:
-    for regularization_weight in [0.003,0.0025,0.05,0, 0.0001, 0.001, 0.01, 1.0, 10.0]:
-      model, acc_val, loss_avg, acc_train = train(dataset_train, dataset_val, learning_rate=learning_rate, batch_size=batch_size, regularization_weight=regularization_weight, max_num_epochs=60)
-      print('Lambda {:10.4f}\t loss {:10.4f}\t acc train {:2.2f}\t acc val {:2.2f}'.format(regularization_weight, loss_avg, acc_train, acc_val))
-      if acc_val > best_acc_val:
-        best_acc_val = acc_val
-        model_best = copy.deepcopy(model)
+regularization_weights = [0.003,0.0025,0.05,0, 0.0001, 0.001, 0.01, 1.0, 10.0]
+configs = [{'batch_size': batch_size, 'learning_rate': learning_rate, 'max_num_epochs': 60} for batch_size in [16] for learning_rate in [0.1]]
+for config, acc_val_config, results, is_best in sweep(dataset_train, dataset_val, regularization_weights, configs):
+  for regularization_weight, (model, acc_val, loss_avg, acc_train) in zip(regularization_weights, results):
+    print('Batch size {:d}\t lr {:.4f}\t lambda {:10.4f}\t loss {:10.4f}\t acc train {:2.2f}\t acc val {:2.2f}'.format(config['batch_size'], config['learning_rate'], regularization_weight, loss_avg, acc_train, acc_val))
+  if is_best:  # Configs finish in any order; is_best breaks ties toward the earlier config, like a serial loop
+    best_acc_val = acc_val_config
+    model_best = next(model for model, acc_val, _, _ in results if acc_val == acc_val_config)  # The first lambda with the best acc val
 
 """## Question
 
@@ -384,21 +181,23 @@ What is the impact of regularization on training loss/accuracy and validation ac
 
 The impact of regularization on training loss/accuracy and validation accuracy is that we sacrifice training accuracy to improve validation or vice versa. It is not a solution for every problem, but it may improve accuracy and reliability, since it is a reduction in the validation loss.
 
-# Qualitative Analysis
+## Data-Parallel Training
+
+At batch sizes like 16 or 24 the matmuls in a step are too small for BLAS to spread over several cores. Instead we can split every (larger) batch into shards, one per worker process, and have each worker compute the gradient on its shard. Since the gradient of the average loss over a batch of $n$ examples is the average of the shard gradients weighted by $n_i / n$, the combined update is the same as the serial one. The normalized inputs, the current $W$ and the per-worker gradients live in memory-mapped files that all processes share, so only shard boundaries and a few statistics go through pipes. Each epoch's order comes from the same `epoch_permutation` that `train`'s shuffler uses, so with one worker the updates are the ones `train` makes.
+"""
+
+from cs461.mnist import train_data_parallel
+
+model, acc_val, loss_avg, acc_train = train_data_parallel(dataset_train, dataset_val, num_workers=os.cpu_count(), learning_rate=5., batch_size=256, decay=2, verbose=True)
+
+"""# Qualitative Analysis
 
 ## Weight Visualization
 
 Since the model parameters are $w_l \in \mathbb{R}^d$ for $l = 1 \ldots 10$ where the $(i+1)$th dimension corresponds to how much the $i$-th pixel value (shifted due to the bias dimension) implies the $l$-th label (i.e., digit $l-1$), we can directly visualize the parameters.
 """
 
-def visualize_model(model):
-  fig = plt.figure(figsize=(20,10))
-  for label in range(10):
-    plt.subplot(2, 5, label + 1)
-    plt.imshow(model.W[1:, label].reshape(28, 28))
-    plt.title('Label {:d}'.format(label))
-    plt.colorbar()
-  plt.show()
+from cs461.mnist import visualize_model
 
 visualize_model(model_best)
 
@@ -413,19 +212,7 @@ We cannot really say anything about the visualized weights for each class label
 Because we only have 10 labels we can easily visualize the prediction behavior of the model through a [confusion matrix](https://en.wikipedia.org/wiki/Confusion_matrix).
 """
 
-def build_confusion_matrix(model, dataset_val, batch_size_eval=64):
-  confusion_matrix = [[0 for _ in range(10)] for _ in range(10)]
-  for X, y in dataset_val.generate_batch(batch_size_eval):
-    preds = model.predict(X)
-    for i in range(X.shape[0]):
-      confusion_matrix[y[i, 0]][preds[i][0]] += 1
-
-  for label1 in range(10):
-    num_label1_total = sum(confusion_matrix[label1])
-    for label2 in range(10):
-      confusion_matrix[label1][label2] /= num_label1_total / 100
-
-  return confusion_matrix
+from cs461.mnist import build_confusion_matrix
 
 df = pandas.DataFrame(build_confusion_matrix(model_best, dataset_val), 
                       index=[str(digit) for digit in range(10)], columns=[str(digit) for digit in range(10)])
@@ -443,7 +230,7 @@ Diagonal represents how we correctly label 0. 1 time we incorrectly 0 as 1 is 0.
 To study the effect of the amount of supervision, we will train the model on a small subset of the training dataset with 30 examples total (3 examples per digit).
 """
 
-dataset_train_small = MNISTDataset('train_small')
+dataset_train_small = MNISTDataset('train_small', datadir=datadir)
 
 print(dataset_train_small.num_examples())
 for digit in range(10):
@@ -453,14 +240,14 @@ for digit in range(10):
 
 model_best_small = None
 best_acc_val_small = float('-inf')
-for batch_size in [8]:
-  for learning_rate in [0.1]:
-    for regularization_weight in [0, 0.0001, 0.001, 0.01, 1.0, 10.0]:
-      model, acc_val, loss_avg, acc_train = train(dataset_train_small, dataset_val, learning_rate=learning_rate, batch_size=batch_size, regularization_weight=regularization_weight, max_num_epochs=60)
-      print('Lambda {:10.4f}\t loss {:10.4f}\t acc train {:2.2f}\t acc val {:2.2f}'.format(regularization_weight, loss_avg, acc_train, acc_val))
-      if acc_val > best_acc_val_small:
-        best_acc_val_small = acc_val
-        model_best_small = copy.deepcopy(model)
+regularization_weights = [0, 0.0001, 0.001, 0.01, 1.0, 10.0]
+configs = [{'batch_size': batch_size, 'learning_rate': learning_rate, 'max_num_epochs': 60} for batch_size in [8] for learning_rate in [0.1]]
+for config, acc_val_config, results, is_best in sweep(dataset_train_small, dataset_val, regularization_weights, configs):
+  for regularization_weight, (model, acc_val, loss_avg, acc_train) in zip(regularization_weights, results):
+    print('Batch size {:d}\t lr {:.4f}\t lambda {:10.4f}\t loss {:10.4f}\t acc train {:2.2f}\t acc val {:2.2f}'.format(config['batch_size'], config['learning_rate'], regularization_weight, loss_avg, acc_train, acc_val))
+  if is_best:  # Configs finish in any order; is_best breaks ties toward the earlier config, like a serial loop
+    best_acc_val_small = acc_val_config
+    model_best_small = next(model for model, acc_val, _, _ in results if acc_val == acc_val_config)  # The first lambda with the best acc val
 
 visualize_model(model_best_small)
 
@@ -475,7 +262,19 @@ What do you observe about the *weight visualization* and *confusion matrix* **co
 
 We can say that the weight visualization clearly distinguishes in the large training data, and does a good job with differentiation. However the confusion matrix does not in the large training data. For example, at (4,4) it has a very low percentage, 27%, of correctly classifying it.
 
-# Kaggle Submission
+# Quantized Inference
+
+Scoring is bound by memory bandwidth rather than arithmetic: every prediction streams the weights and the pixels. Storing each label's column of the folded weights as int8 with one float scale makes the weights 8x smaller than float64, and the pixels can be read as the uint8 values they already are. Let's check what this costs in accuracy on the validation split.
+"""
+
+from cs461.mnist import compare_quantized
+
+report = compare_quantized(model_best, dataset_val)
+print('acc val {:2.2f}, quantized {:2.2f} (delta {:+.2f}), predictions agree on {:2.2f}%'.format(
+    report['acc'], report['acc_quantized'], report['acc_quantized'] - report['acc'], report['agreement']))
+print('weights {:d} bytes, quantized {:d} bytes'.format(report['weight_bytes'], report['weight_bytes_quantized']))
+
+"""# Kaggle Submission
 
 To make the assignment more engaging we have a [Kaggle competition](https://www.kaggle.com/c/rutgers-cs461-hw2-fall-2021)! We will make test predictions with the best model we can train on the full training dataset (best in validation accuracy). Don't use more training data (in particular, don't retrain on train+val), but you can go back to the hyperparameter tuning and search other values of
 
@@ -487,16 +286,7 @@ To make the assignment more engaging we have a [Kaggle competition](https://www.
 and others. It's fine to "guess" at this or that value, but it's usually best to be systematic about it and sweep all configurations because we don't know which hyperparameters interact with which (e.g., learning rate interacts strongly with batch size). If you feel ambitious you might even try [different gradient-based optimization methods](https://ruder.io/optimizing-gradient-descent/) like Adagrad or Adam.
 """
 
-def create_kaggle_submission(model, dataset_test, netid, batch_size_eval=64):
-  preds = []
-  for X, _ in dataset_test.generate_batch(batch_size_eval):  # Not shuffled
-    preds.extend(model.predict(X)[:, 0].tolist())
-
-  with open('/content/drive/My Drive/cs461hw2_{:s}.csv'.format(netid), 'w') as f:
-    writer = csv.writer(f)
-    writer.writerow(['id', 'category'])  # Header
-    for i, pred in enumerate(preds):
-        writer.writerow([i, pred])
+from cs461.mnist import create_kaggle_submission
 
 # Use your best model (assumed model_best) with your NetID here.
 create_kaggle_submission(model_best, dataset_test, 'zmm21')
@@ -513,4 +303,15 @@ Report the result of your **best model**
 Training Accuracy: 0.9377 ,
 Validation Accuracy: 0.9190 ,
 Test Accuracy based on Kaggle Submission was: 0.91700
-"""
\ No newline at end of file
+"""
+
+"""# Saving Models
+
+A trained model only lives in notebook memory. `save_model` writes it to a directory with one raw `.npy` file per array and a small `header.json` (model type and the few non-array attributes). `load_model` memory-maps the arrays back, so a scoring process (e.g. `batch_score.py` at the repository root) can start serving in milliseconds without retraining or unpickling.
+"""
+
+from cs461.mnist import evaluate_accuracy, save_model, load_model
+
+model_dir = '/content/drive/My Drive/models/mnist_best'
+save_model(model_best, model_dir)
+print('acc val of the loaded model {:.2f}'.format(evaluate_accuracy(load_model(model_dir), dataset_val)))
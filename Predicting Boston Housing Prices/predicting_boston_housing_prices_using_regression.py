@@ -10,13 +10,15 @@ Original file is located at
 # Commented out IPython magic to ensure Python compatibility.
 # %matplotlib inline
 
-import math
 import matplotlib.pyplot as plt
 import numpy as np
 import sklearn.datasets
+import tempfile
 
 from math import sqrt
 
+"""The models, trainers and helpers used below are defined in the `cs461` package at the root of this repository (`cs461.regression` for this project, `cs461.utils` for the helpers shared by all projects), so each cell imports the ones it uses instead of defining them. Install it with `pip install -e .` from a checkout. Its unit tests are in `tests/` and run with `python -m pytest` from the repository root."""
+
 """# Linear Regression
 
 In **linear regression**, the model maps a vector $x \in \mathbb{R}^d$ to a continuous label $\hat{y} \in \mathbb{R}$ using a learnable parameter $w \in \mathbb{R}^d$ by  
@@ -49,49 +51,7 @@ $$
 and use them to normalize the training data (i.e., make the training data have mean zero and variance 1 *after the transform*) for numerical stability. We will use the same $\mu$ and $\sigma$ to normalize test data so that normalization is consistent between training and testing.
 """
 
-def polynomial_expansion(X, degrees, mu=None, sigma=None):
-  """
-    Input:
-      X (N, d): Training data, each row is a d-dimensional input vector 
-      degrees: List of degrees specifying the polynomial expansion
-      mu (D,): Feature means for normalization
-      sigma (D,): Feature standard deviations for normalization
-
-    Output:
-      X_new (N, D): Training data after expansion and normalization 
-      mu (D,): See Input, if None is passed this is computed
-      sigma (D,): See Input, if None is passsed this is computed
-      X_new_unnormalized (N, D): Training data after expansion before normalization (for sanity check)
-  """
-  N, d = X.shape
-    
-  # Calculate the dimension of the transformed feature vector phi(x)
-  D = (len(degrees) - 1) * d + 1 if 0 in degrees else len(degrees) * d
-      
-  X_new_unnormalized = np.empty([N, D])
-  if 0 in degrees:
-    X_new_unnormalized[:, 0] = 1
-    column = 1
-  else:
-    column = 0  # Track current column position
-      
-  for degree in degrees:
-    if degree != 0:
-      new_features = X ** degree  # (N, d)
-      X_new_unnormalized[:, column:column + d] = new_features  # Populate the next d columns              
-      column += d
-
-  # Normalize features (independently).
-  if mu is None or sigma is None:
-    mu = X_new_unnormalized.mean(0)
-    sigma = X_new_unnormalized.std(0)
-    sigma[sigma < 0.0001] = 1  # If the feature is constant, variance is zero. Avoid division by zero
-
-  X_new = (X_new_unnormalized - mu) / sigma
-  if 0 in degrees:
-    X_new[:, 0] = 1  # We don't normalize the bias dimension.
-
-  return X_new, mu, sigma, X_new_unnormalized
+from cs461.regression import polynomial_expansion
 
 # Sanity check
 X = np.array([[2, 3], 
@@ -126,82 +86,21 @@ $$
 We know that the unique solution is given by $w^* = \phi(X)^+ y$ where $\phi(X)^+ \in \mathbb{R}^{D \times N}$ is the [pseudo-inverse](https://en.wikipedia.org/wiki/Moore%E2%80%93Penrose_inverse) of $\phi(X) \in \mathbb{R}^{N \times D}$. In the class we mostly assume that $\phi(X)$ is invertible (i.e., the feature columns are linearly independent, which is a reasonable assumption) in which case $\phi(X)^+ = (\phi(X)^\top \phi(X))^{-1} \phi(X)$, but the pseudo-inverse solution is true even if $X$ is not invertible (as long as nonzero). See [Appendix F of this note](http://karlstratos.com/notes/policy_gradient.pdf) if you want to see a proof.
 """
 
-class LinearRegressor:
-
-  def __init__(self, X_train=None, y_train=None, degrees=(0, 1)):
-    self.w = None  # Parameter
-    self.mu = None  # Feature means (computed from training data)
-    self.sigma = None  # Feature standard deviations (computed from training data)
-    self.degrees = degrees
-
-    # If given training data at initialization, compute the closed-form LSE.
-    if X_train is not None and y_train is not None:
-      X_train_new = self.feature_transform(X_train, train=True)
-      self.w = np.dot(np.linalg.pinv(X_train_new), y_train) 
-
-  def feature_transform(self, X, train=False):
-    if train: 
-      X_new, mu, sigma, _ = polynomial_expansion(X, self.degrees)
-      self.mu = mu
-      self.sigma = sigma
-    else:
-      assert self.mu is not None and self.sigma is not None
-      X_new = polynomial_expansion(X, self.degrees, self.mu, self.sigma)[0]
-
-    return X_new
-
-  def predict(self, X):
-    assert self.w is not None 
-    X_new = self.feature_transform(X)
-    preds = np.dot(X_new, self.w)
-    return preds
-
-  def squared_loss(self, X, y):
-    preds = self.predict(X)
-    errors = y - np.squeeze(preds) 
-    squared_loss = np.mean(errors ** 2)  # Average squared difference
-    return squared_loss
-
 """# Synthetic Experiment
 
 Before we work on a real dataset with a multi-dimensional input space, let's explore regression in 1-dimensional inputs, which is easy to visualize. We will do this with a <i>synthetic</i> data domain, where we simply generate the data from a noisy model.
 Note that in this case, contrary to the real world scenario, we can ask how well the regression method recovers the true model; in the real world case this is of course not a meaningful question because we will never know the true model.
 """
 
-class TrueModel:
-
-  def __init__(self): 
-    self.true_mapping = lambda x: np.sin(x * 1.7) + .1 * x ** 2 + 3
-    self.true_standard_deviation = 0.3
-
-  def sample(self, num_samples, left_end=-2, right_end=2):
-    # Get evenly separated inputs then jitter 'em. 
-    X_clean = np.linspace(left_end, right_end, num_samples)
-    noise_x = np.random.uniform(-.1, .1, X_clean.shape)
-    X = np.expand_dims(X_clean + noise_x, axis=1)
-    
-    # Generate labels according to the true model.
-    y_clean = self.true_mapping(X)
-    noise_y = np.random.normal(0, self.true_standard_deviation, y_clean.shape)
-    y = np.squeeze(y_clean + noise_y)
-    
-    return X, y   
-
-  def visualize_samples(self, num_samples, left_end=-2, right_end=2):
-    X, y = self.sample(num_samples, left_end, right_end)
-    plt.plot(X, y, 'r*')
-    plt.xlabel('x')
-    plt.ylabel('y')
-
-    # Also plot the true mapping over dense x-axis ticks
-    xticks = np.expand_dims(np.arange(left_end, right_end, 0.01), axis=1)
-    plt.plot(xticks, self.true_mapping(xticks), 'r:')
+from cs461.regression import TrueModel
 
 true_model = TrueModel()
 true_model.visualize_samples(30, -3, 3)
 
 """Let's train models with various degrees on samples from the true model. We expect that more complex models can fit the *training* data better. Visualization helps us understand why. """
 
+from cs461.regression import LinearRegressor
+
 X_train, y_train = true_model.sample(20, -3, 3)
 
 model_linear = LinearRegressor(X_train, y_train, (0, 1))
@@ -321,63 +220,25 @@ $$
 Make sure you can verify this yourself, either by reducing it to single-variable calculus and taking the partial derivative of $J(w)$ with respect to $w_j$ for $j = 1 \ldots d$, or using [matrix calculus](https://www.google.com/search?q=matrix+cookbook&oq=matrix+cookboo&aqs=chrome.0.0i512j69i57j0i512l3j0i22i30l2.1982j0j7&sourceid=chrome&ie=UTF-8). In every step of gradient descent, we compute the gradient of $J$ at the current value of $w \in \mathbb{R}^d$, which yields a vector of the same length $\nabla J(w) \in \mathbb{R}^d$ to be subtracted from $w$.
 """
 
-def squared_loss_and_gradient(X, y, w, no_grad=False):  # Expects X already feature transformed
-  preds = np.dot(X, w)
-  errors = y - np.squeeze(preds) 
-  loss = np.mean(errors **2)
-  if no_grad:
-    return loss
-  else: 
-    grad = - 2 * np.mean(X * np.expand_dims(errors, axis=1), axis=0)
-    return loss, grad.reshape(w.shape)
+"""We can check the gradient numerically: along any unit vector $v$, the directional derivative $\nabla J(w) \cdot v$ should match the central difference $(J(w + \epsilon v) - J(w - \epsilon v)) / 2\epsilon$. Checking a few random directions costs a few loss evaluations, however many features we have."""
+
+from cs461.utils import check_gradient
+from cs461.regression import squared_loss_and_gradient
+
+# Sanity check
+X_train_new = polynomial_expansion(X_train, (0, 1, 2, 3))[0]
+w_random = np.random.randn(X_train_new.shape[1])
+print('Max error of directional derivatives:', check_gradient(lambda w: squared_loss_and_gradient(X_train_new, y_train, w), w_random))
 
 """## Gradient Descent Algorithm
 
 Let's define a general-ish gradient descent routine. In general, gradient descent has various optimization-related "hyperparameters" that we may tune to make training more effective. But we'll keep things simple and stick with the most basic version: constant learning rate and early stopping based on validation loss.
 """
 
-def gradient_descent(model, X_train, y_train, loss_and_gradient, X_val=None, y_val=None, lr=0.01, num_steps_max=10000, patience=10):
-  X_train_new = model.feature_transform(X_train, train=True)  
-  has_val = X_val is not None and y_val is not None
-  if has_val:
-    X_val_new = model.feature_transform(X_val)
-  model.w = np.zeros((X_train_new.shape[1]))  # Parameter initialized as a zero vector
-  losses = []  # Let's keep track of training loss
-  loss_val_best = float('inf')
-  death_count = 0
-
-  for t in range(num_steps_max):
-    loss, grad = loss_and_gradient(X_train_new, y_train, model.w)  # Generic function that returns loss/gradient at current w 
-    losses.append(loss)
-        
-    
-    # (1) Implement the gradient-based update of model.w. 
-    model.w = model.w - lr*grad
-    # (2) Early stop if converged. One way to do this is as follows (if we have validation data). 
-    #     Check if the validation loss is better than previous best. 
-    #     If so, reset death_count to zero. If not, increase it by 1, and if it goes over patience call break. 
-
-    loss_val = loss_and_gradient(X_val_new, y_val, model.w, no_grad=True)
-    if loss_val < loss_val_best :
-      loss_val_best = loss_val
-      death_count = 0
-
-    if death_count > patience :
-      break
-
-    else :
-      death_count = death_count + 1
-
-    #raise NotImplementedError
-
-  # Compute training loss and validation loss of the trained model
-  loss_train = loss_and_gradient(X_train_new, y_train, model.w, no_grad=True)
-  loss_val = loss_and_gradient(X_val_new, y_val, model.w, no_grad=True) if has_val else None
-
-  return losses, loss_train, loss_val
-
 """You should be able to train a linear model with the code below; you can compare it to the closed form solution to make sure you get similar results."""
 
+from cs461.regression import gradient_descent
+
 model = LinearRegressor(degrees=(0, 1))
 
 # Training 
@@ -393,17 +254,17 @@ loss_exact_train = model_exact.squared_loss(X_train, y_train)
 loss_exact_val = model_exact.squared_loss(X_val, y_val)
 print('Exact solution: train RMSE {:.4f}, val RMSE {:.4f}'.format(sqrt(loss_exact_train), sqrt(loss_exact_val)))
 
-"""Now we can explore some more feature spaces and do **model selection** based on validation loss."""
+"""Now we can explore some more feature spaces and do **model selection** based on validation loss. Each feature set is trained independently, so we train them in parallel on a pool of worker processes that memory-map the data rather than each receiving a copy."""
+
+from cs461.regression import sweep_feature_sets
 
 feature_sets = [(0,), (0, 1), (0, 1, 2), (0, 1, 2, 3)]  # Try others!
 
 best_loss_val = float('inf')
 best_model = None
-for feature_set in feature_sets:
-  model = LinearRegressor(degrees=feature_set)
-  losses, loss_train, loss_val = gradient_descent(model, X_train, y_train, squared_loss_and_gradient, X_val, y_val)
-  print('Model {:s}: {:d} iterations, train RMSE {:.4f}, val RMSE {:.4f}'.format(str(feature_set), len(losses), sqrt(loss_train), sqrt(loss_val)))
-  if loss_val < best_loss_val:
+for config, _, (model, num_steps, loss_train, loss_val), is_best in sweep_feature_sets([{'degrees': feature_set} for feature_set in feature_sets]):
+  print('Model {:s}: {:d} iterations, train RMSE {:.4f}, val RMSE {:.4f}'.format(str(config['degrees']), num_steps, sqrt(loss_train), sqrt(loss_val)))
+  if is_best:
     best_loss_val = loss_val
     best_model = model
 
@@ -422,48 +283,20 @@ $$
 where $\alpha \geq 0$ is an additional hyperparameter specifying the relative weight of the loss on underestimating predictions.
 """
 
-def asymmetric_squared_loss_and_gradient(X, y, w, no_grad=False, alpha=0.05):  # Expects X already feature transformed
-  Implement. You should be able to copy and paste the code from squared_loss_and_gradient and modify it only a little bit. 
-   preds = np.dot(X, w)
-   errors = y - np.squeeze(preds) 
-   e_k = errors
-   s = 0
-   for x in range(len(errors)) :
-    if preds[x] < y[x]  :
-      s = s + alpha*(errors[x]**2)
-      e_k[x]= alpha*errors[x]
-    else :
-      s = s + (errors[x]**2)
- # loss = np.mean(errors **2)
-    loss = s/len(errors)
-    if no_grad:
-      return loss
-    else: 
-      grad = - 2 * np.mean(X * np.expand_dims(errors, axis=1), axis=0)
-    return loss, grad.reshape(w.shape)
-
-  #raise NotImplementedError
-
-# For convenience, we will define this lambda expression so we could call it inside GD without passing alpha to GD.
-def aloss(alpha):
-    return lambda X, y, w, no_grad=False: asymmetric_squared_loss_and_gradient(X, y, w, no_grad=no_grad, alpha=alpha)
-
 """We can now train a linear regressor to optimize this asymmetric loss. The only change in the code is passing a different function to calculate the loss and gradient in the gradient descent algorithm. We'll do similar model selection based on the validation loss (which is the new asymmetric loss, not squared loss!)."""
 
 alpha = 0.05  # We will penalize underestimation of housing prices by only 5% of the penalty for overestimation. 
 
 best_loss_val_asym = float('inf')
 best_model_asym = None
-Do model selection using the same feature sets you used for the symmetric loss. 
+# Do model selection using the same feature sets you used for the symmetric loss. 
 # You should be able to copy and paste the model selection code from before and modify it only a little bit. 
 
 
 feature_sets = [(0,), (0, 1), (0, 1, 2), (0, 1, 2, 3)]
-for feature_set in feature_sets:
-  model = LinearRegressor(degrees=feature_set)
-  losses, loss_train, loss_val = gradient_descent(model, X_train, y_train, aloss(alpha), X_val, y_val)
-  print('Model {:s}: {:d} iterations, train RMSE {:.4f}, val RMSE {:.4f}'.format(str(feature_set), len(losses), sqrt(loss_train), sqrt(loss_val)))
-  if loss_val < best_loss_val_asym:
+for config, _, (model, num_steps, loss_train, loss_val), is_best in sweep_feature_sets([{'degrees': feature_set, 'alpha': alpha} for feature_set in feature_sets]):
+  print('Model {:s}: {:d} iterations, train RMSE {:.4f}, val RMSE {:.4f}'.format(str(config['degrees']), num_steps, sqrt(loss_train), sqrt(loss_val)))
+  if is_best:
     best_loss_val_asym = loss_val
     best_model_asym = model
 
@@ -479,6 +312,8 @@ print('Best performing model is {:s} with val RASE {:.4f}'.format(str(best_model
 Now that we have done model selection for both the regular squared loss and the new asymmetric loss, we can do final evaluation on the test portion.
 """
 
+from cs461.regression import asymmetric_squared_loss_and_gradient
+
 #  Implement final evaluation by computing sym/asym loss on best sym/asym models. Be careful to use the correct feature transform for each model.
 symmetric_t = best_model.feature_transform(X_test, train=False)
 asymmetric_t = best_model_asym.feature_transform(X_test, train=False)
@@ -504,4 +339,15 @@ print('Asym model      {:.4f}  |  {:.4f}'.format(test_loss_sym_model_asym, test_
 """What can we conclude from this comparison? Which model is "better", and in what sense?
 
 Using this comparison, it seems that symmetric model is better due to having a large difference in symmetric losses between both models. For Asymmetric loss, it is not that different for both models, however, since they are very close in magnitude, while for symmetric losses they are not, we choose the symmetric model.
-"""
\ No newline at end of file
+"""
+
+"""# Saving Models
+
+A fitted model only lives in notebook memory. `save_model` writes it to a directory with one raw `.npy` file per array (the parameter $w$ and the feature statistics $\mu$, $\sigma$) and a small `header.json` with the polynomial degrees. `load_model` memory-maps the arrays back, so a scoring process can start in milliseconds without refitting.
+"""
+
+from cs461.regression import save_model, load_model
+
+with tempfile.TemporaryDirectory() as model_dir:
+  save_model(best_model, model_dir)
+  print('Test RASE of the loaded model {:.4f}'.format(sqrt(load_model(model_dir).squared_loss(X_test, y_test))))
@@ -7,19 +7,9 @@ Original file is located at
     https://colab.research.google.com/drive/1jJJgjzKsgt8jQ4Hihi7flq0azEFWhGrH
 """
 
-import heapq
-import matplotlib 
 import matplotlib.pyplot as plt
-import numpy as np
-import pickle
-import random
 
-from collections import deque
-from itertools import accumulate, groupby
-
-def set_seed(seed):  # For reproducibility, fix random seeds.
-  random.seed(seed)
-  np.random.seed(seed)
+"""The models, trainers and helpers used below are defined in the `cs461` package at the root of this repository (`cs461.spam` for this project, `cs461.utils` for the helpers shared by all projects), so each cell imports the ones it uses instead of defining them. Install it with `pip install -e .` from a checkout. Its unit tests are in `tests/` and run with `python -m pytest` from the repository root."""
 
 """# Decision Tree
 
@@ -28,18 +18,6 @@ def set_seed(seed):  # For reproducibility, fix random seeds.
 To learn decision trees, we will use [Gini impurity](https://en.wikipedia.org/wiki/Decision_tree_learning#Gini_impurity) to measure how "impure" a distribution (over labels) is.
 """
 
-def gini_impurity(distribution):  
-  # distribution: [p_1 ... p_L] such that p_l >= 0 and sum_{l=1}^L p_l = 1
-
-  # TODO: Implement
-  #return None  
-  return distribution[0] * distribution[1]
-  #k=0
-  #for t in distribution:
-    #k += t*(1-t)
-
- # return k
-
 """## Split Loss
 
 We compute the loss of a split $S = S_1 \perp S_2$ as 
@@ -55,239 +33,46 @@ where
 For binary classification, we only need to know the (1) total weight of each split, and (2) the total weight of one label type (e.g., positive) in each split.
 """
 
-def compute_split_loss(total1, total2, positive1, positive2):
-  positive1_prob = positive1 / total1 if total1 > 0. else 0.5
-  positive2_prob = positive2 / total2 if total2 > 0. else 0.5
-  impurity1 = gini_impurity([1 - positive1_prob, positive1_prob])
-  impurity2 = gini_impurity([1 - positive2_prob, positive2_prob])
-  impurity = total1 * impurity1 + total2 * impurity2
-  return impurity
-
 """## Stump Learning
 
 We will implement the fast stump algorithm that scales linearly with data size (ignoring the sorting complexity).
 """
 
-def fit_stump(data, weights=None, indices=None):  # O(dN)
-  """
-  Computes the best split on a dataset of N (input, label) pairs according to Gini impurity where the label is either +1 or -1.
-  Each example is weighted by some nonnegative weight value (1.0 if None).
-  Only the examples included in the list of indices are considered (all if None). 
-  """
-  if weights is None:
-    weights = np.ones(len(data))
-  assert len(weights) == len(data)  
-  assert (weights >= 0).all()
-  
-  if indices is None:
-    indices = list(range(len(data)))
-
-  feature_best = None
-  threshold_best = None
-  loss_best = float('inf')
-
-  for feature in range(len(data[0][0])):
-    key = lambda i: data[i][0][feature]
-
-    # Sorting indices so that feature values are nondecreasing. 
-    indices_sorted = sorted(indices, key=key)
-
-    # Group indices with the same feature value for efficiency.
-    groups = [list(group) for _, group in groupby(indices_sorted, key)]
-    group_weights = [sum(weights[i] for i in group) for group in groups]
-    group_weights_positive = [sum(weights[i] for i in group if data[i][1] == 1) for group in groups]
-
-    # Precompute (1) total weight and (2) total positive label weight of every partition in O(N) time.  
-    cumulative_weights = list(accumulate(group_weights))
-    cumulative_weights_positive = list(accumulate(group_weights_positive))
-    total = cumulative_weights[-1]  
-    positive = cumulative_weights_positive[-1]
-
-    # Loop over effective partitions.
-    for group_num, (total1, positive1) in enumerate(zip(cumulative_weights[:-1], cumulative_weights_positive[:-1])):
-
-      # TODO: Implement. You simply need to call compute_split_loss with right values.
-      #loss = None
-      loss = compute_split_loss(total1,total-total1, positive1,positive-positive1)
-
-      if loss < loss_best:
-        loss_best = loss
-        feature_best = feature
-        current_feature_value = data[groups[group_num][0]][0][feature]
-        next_feature_value = data[groups[group_num + 1][0]][0][feature]
-        threshold_best = (current_feature_value + next_feature_value) / 2.        
-    
-  # May return (None, None, float('inf')) if no split can be found (e.g., has one feature group for every dimension).
-  return feature_best, threshold_best, loss_best
-
-import unittest
-
-class TestFitStump(unittest.TestCase):
-
-  def setUp(self):
-    set_seed(42)
-    num_features = 15
-    self.dim = 13
-    num_examples = 42
-    num_examples_subset = 31
-
-    # Random feature values in {0...num_features-1}
-    self.data = [[np.random.randint(0, num_features, size=(self.dim,)), 2 * np.random.randint(2) - 1] for _ in range(num_examples)]
-    self.weights = np.random.rand(num_examples)
-    self.indices = np.random.choice(list(range(num_examples)), num_examples_subset, replace=False)
-
-  def fit_stump_naive(self):  # O(dN^2)
-    data = [self.data[i] for i in self.indices]
-    weights = [self.weights[i] for i in self.indices]
-    
-    loss_best = float('inf')
-    feature_best = None
-    threshold_best = None    
-    for feature in range(self.dim):  # O(d)
-      for threshold in self.get_thresholds():  # O(N)
-        total1 = sum([weights[i] for i, (x, _) in enumerate(data) if x[feature] <= threshold])  # O(N)
-        total2 = sum([weights[i] for i, (x, _) in enumerate(data) if x[feature] > threshold])
-        positive1 = sum([weights[i] for i, (x, y) in enumerate(data) if x[feature] <= threshold and y == 1])
-        positive2 = sum([weights[i] for i, (x, y) in enumerate(data) if x[feature] > threshold and y == 1])
-        loss = compute_split_loss(total1, total2, positive1, positive2)
-        if loss < loss_best:
-          loss_best = loss
-          feature_best = feature        
-          threshold_best = threshold
-
-    return feature_best, threshold_best, loss_best  
-
-  def test_fit_stump(self): 
-    feature, threshold, loss = fit_stump(self.data, weights=self.weights, indices=self.indices)
-    feature_gold, threshold_gold, loss_gold = self.fit_stump_naive()
-    self.assertEqual(feature, feature_gold)
-    self.assertAlmostEqual(threshold, threshold_gold)
-    self.assertAlmostEqual(loss, loss_gold)
-  
-  def get_thresholds(self):
-    feature_values = {}
-    for x, _ in self.data:
-      for value in x:
-        feature_values[value] = True
-    feature_values_sorted = sorted(feature_values.keys())
-    thresholds = [(feature_values_sorted[j] + feature_values_sorted[j + 1]) / 2. for j in range(len(feature_values_sorted) - 1)]
-    return thresholds
-            
-unittest.main(TestFitStump(), argv=[''], verbosity=2, exit=False)
+"""## Presorted Feature Index
+
+`fit_stump` sorts the examples under a node by every feature, and a tree does this at every node (and `adaboost` for every tree). Instead, `FeatureIndex` converts the training data into a NumPy matrix once and argsorts each feature column once. A node keeps its examples as one sorted index row per feature, and splitting a node just filters these rows, which keeps them sorted. The same index is reused by all trees in the ensemble.
+
+While fitting, a tree keeps a single copy of these rows, and every node owns a range of columns `start:end`. `partition` rearranges the range of a node in place when it is split (left examples first, still sorted), so the children are just two smaller ranges. Their label weight totals come from the cumulative sums of the split search (`best_split_presorted`) instead of new sums over their examples.
+"""
+
+"""## Histogram Split Finding
+
+Even presorted, the exact search looks at every distinct value of every feature at every node. `FeatureBins` instead quantizes each feature once into at most 255 bins (stored as `uint8`). A node then only needs a histogram per feature of the example counts, total weights and positive label weights in each bin, and finding its best split costs O(bins) per feature no matter how many examples it has. After a split, only the smaller child's histograms are built from its examples; the larger child's are the parent's minus the smaller sibling's. With at most 255 distinct values per feature, the histogram splits are the same as the exact ones.
+"""
 
 """## Tree Learning
 
 Here's a simple (binary tree) node class.
 """
 
-class Node:
+"""Top-down greedy heuristic to approximate a tree that minimizes Gini impurity of leaves. The number of leaves/regions of the tree is controlled by max depth and min split size."""
+
+"""### Flat Layout
 
-  def __init__(self, parent):
-    self.parent = parent
-    self.child_left = None
-    self.child_right = None
-    self.feature = None  # Feature (i.e., dimension) to split on
-    self.threshold = None  
-    self.label = None
-    self.leaf = False
+`predict` walks the linked nodes one example at a time in Python. For batch prediction, `flatten_trees` lays the nodes out in breadth-first order as parallel NumPy arrays: the feature and threshold of every node, its label, and the indices of its two children (-1 at leaves). Several trees can be concatenated, with `tree_starts[t]` the index of the root of tree $t$. `predict_flat` then moves all inputs down the trees together, one level per iteration, with vectorized gathers. `DecisionTree.predict_all` uses it for NumPy inputs, such as the grid in `draw_contour` below and the data arrays in `tune_tree`. Rows given as Python lists are still walked one at a time, since converting them to an array costs more than the walk.
+"""
 
-"""Top-down greedy heuristic to approximate a tree that minimizes Gini impurity of leaves. The number of leaves/regions of the tree is controlled by max depth and min split size."""
+"""### Leaf-wise Growth
 
-class BinaryClassifier:
-
-  def predict(self, x):  # Given a vector x, return either +1 or -1 
-      raise NotImplementedError
-
-  def predict_all(self, data_unlabeled):
-    return [self.predict(x) for x in data_unlabeled]    
-
-  def evaluate_accuracy(self, data):
-    num_correct = sum(y == self.predict(x) for (x, y) in data)
-    return num_correct / len(data) * 100.
-
-class DecisionTree(BinaryClassifier):
-
-  def __init__(self, data, weights=None, max_depth=10, min_split_size=1):
-    if weights is None:
-      weights = np.ones(len(data))  
-    self.root = self.fit(data, weights, max_depth, min_split_size)
-
-  def fit(self, data, weights, max_depth, min_split_size):
-    root = Node(None)
-    queue = deque()
-    queue.append((list(range(len(data))), root, 1))
-    while queue:
-      indices, node, depth = queue.popleft()
-      weight_total = sum(weights[i] for i in indices)
-      weight_total_positive = sum(weights[i] for i in indices if data[i][1] == 1)
-      node.label = 1 if weight_total_positive > weight_total / 2. else -1 
-
-      if depth >= max_depth or len(indices) < min_split_size:
-        node.leaf = True 
-        continue
-      
-      # TODO: Fit a stump on the data subset under the node (indicated by indices). 
-      # This should give you 3 variables: feature, threshold, and loss.
-      #raise 
-      feature, threshold, loss = fit_stump(data, weights, indices)
-
-      if loss == float('inf'):  # Could not find any split (e.g., pure).
-        node.leaf = True 
-        continue
-
-      node.feature = feature
-      node.threshold = threshold
-      indices_left = [i for i in indices if data[i][0][feature] <= threshold]
-      indices_right = [i for i in indices if data[i][0][feature] > threshold]
-      node.child_left = Node(None)
-      node.child_right = Node(None)
-      queue.append((indices_left, node.child_left, depth + 1))
-      queue.append((indices_right, node.child_right, depth + 1))
-  
-    return root    
-
-  def predict(self, x):
-    node = self.root
-    while not node.leaf: 
-      node = node.child_left if x[node.feature] <= node.threshold else node.child_right
-    return node.label
+`fit` grows a tree level by level, so every node down to `max_depth` gets split, even when splitting it barely reduces the loss, and the number of leaves doubles with every level. With `max_leaves` (or `min_gain`), `fit_best_first` grows the tree leaf-wise instead. It keeps the leaves that can still be split in a priority queue (`heapq`), keyed by how much their best split reduces the loss (total weight times Gini impurity), and always splits the best one. Growth stops at `max_leaves` leaves or when no split gains more than `min_gain`, which is a fraction of the total weight of the root (so a split that gains nothing is never taken, even with the default `min_gain=0`). Leaves created once the budget is reached are not searched at all. This bounds the training cost and the model size directly, and puts the leaves where they help most.
+"""
 
 """### Synthetic Data
 
 To facilitate development, we will work with a (non-separable) synthetic dataset based on the XOR function.
 """
 
-class DataXOR:
-  
-  def __init__(self, num_examples=1000, num_examples_train=500):
-    assert 0 < num_examples_train < num_examples
-    set_seed(42)
-    data = []
-    for _ in range(num_examples):
-      mean, label = random.choice([((-2, -2), 1), ((2, -2), -1), ((2, 2), 1), ((-2, 2), -1)])
-      data.append((np.random.randn(2) + mean, label))
-    self.train = data[:num_examples_train]
-    self.val = data[num_examples_train:]
-
-  def plot_train(self):
-    plt.scatter([x[0] for x, _ in self.train], [x[1] for x, _ in self.train], c=[y for _, y in self.train], cmap=matplotlib.cm.Paired)
-    plt.plot()  
-
-  def draw_contour(self, model, M=200):
-    # First, scatter plot training examples from which the tree is learned.
-    self.plot_train()
-
-    # Next, compute model predictions for (M, M) "grid" coordinates on the plane. 
-    # To do this, we need 2 * M^2 input values: M^2 values for dim 1 and M^2 values for dim 2.
-    # We can get such evenly spaced values by NumPy's linspace and meshgrid.
-    ticks = np.linspace(min(min(x) for x, _ in self.train), max(max(x) for x, _ in self.train), M)
-    x1, x2 = np.meshgrid(ticks, ticks, indexing="ij")
-    inputs = np.stack([x1, x2], axis=2).reshape(-1, 2)
-    preds = np.array(model.predict_all(inputs)).reshape(x1.shape)  # {+1, -1}^{M x M}
-
-    # Draw the contour based on the grid predictions. The bigger M is, the smoother the contour.
-    plt.contourf(x1, x2, preds, cmap=matplotlib.cm.Paired, alpha=0.8)
-    plt.plot()
+from cs461.spam import DecisionTree, DataXOR
 
 data_xor = DataXOR()
 data_xor.plot_train()
@@ -313,18 +98,13 @@ We will be applying these models to a spam classification dataset consisting of
 from google.colab import drive
 drive.mount('/content/drive')
 
-import os
-import pickle
-
 datadir = '/content/drive/My Drive/data/spam/'
 
-def load_data(split):
-  with open(os.path.join(datadir, split + '.pkl'), 'rb') as f:
-    return pickle.load(f)
+from cs461.spam import load_data
 
-data_train = load_data('train')
-data_val = load_data('val')
-data_test = load_data('x_test')      
+data_train = load_data('train', datadir)
+data_val = load_data('val', datadir)
+data_test = load_data('x_test', datadir)      
 
 print('{:d}/{:d}/{:d} train/val/test examples, no labels provided for test'.format(len(data_train), len(data_val), len(data_test)))
 print('Dimension {:d}'.format(len(data_train[0][0])))
@@ -332,24 +112,12 @@ print('{:d} positive, {:d} negative training examples'.format(sum(y == 1 for _,
 print('x_1:', data_train[0][0])
 print('y_1:', data_train[0][1])
 
-"""Let's automate hyperparameter tuning. We'll search values of max depth and min split size in log space, that is 1, 2, 4, 8, 16, ..."""
-
-def tune_tree(data_train, data_val, verbose=False):
-  tree_best = None
-  acc_val_best = 0. 
-  for max_depth in np.logspace(1, 5, num=6, base=2).astype(int):
-    for min_split_size in np.logspace(0, 4, num=5, base=2).astype(int):
-      tree = DecisionTree(data_train, max_depth=max_depth, min_split_size=min_split_size)
-      acc_train = tree.evaluate_accuracy(data_train)
-      acc_val = tree.evaluate_accuracy(data_val)
-      print_string = 'max_depth={:d}   min_split_size={:d}   acc_train {:.2f}   acc_val {:.2f}'.format(max_depth, min_split_size, acc_train, acc_val)
-      if acc_val > acc_val_best:
-        acc_val_best = acc_val
-        tree_best = tree
-        print_string += ' <--------new best'
-      if verbose:
-        print(print_string)
-  return tree_best, acc_val_best
+"""Let's automate hyperparameter tuning. We'll search values of max depth and min split size in log space, that is 1, 2, 4, 8, 16, ...
+
+Every (max depth, min split size) pair is fit independently, so we fit them in parallel on a pool of worker processes. The data is written once to memory-mapped files that the workers map instead of each receiving a copy.
+"""
+
+from cs461.spam import tune_tree
 
 tree_best, acc_best = tune_tree(data_train, data_val, verbose=True)
 
@@ -361,86 +129,18 @@ tree_best, acc_best = tune_tree(data_train, data_val, verbose=True)
 
 ## An Ensemble of Binary Classifiers
 
-Let's write a generic ensemble model that keeps a list of binary classifiers each of which outputs either +1 or -1 given an input, along with their weights ("alphas"). The ensemble predicts the sign of weighted predictions.
+Let's write a generic ensemble model that keeps a list of binary classifiers each of which outputs either +1 or -1 given an input, along with their weights ("alphas"). The ensemble predicts the sign of weighted predictions. For a whole block of inputs, `score_matrix` returns the weighted predictions of every classifier as a (T, n) matrix, with the trees predicting on their flat layout, and `predict_all` takes the sign of its column sums.
 """
 
-class Ensemble(BinaryClassifier):
-
-  def __init__(self): 
-    self.classifiers = []  # Each must have a predict function outputting +1 or -1
-    self.alphas = []  
-
-  def predict(self, x):
-    score = sum(alpha * classifier.predict(x) for alpha, classifier in zip(self.alphas, self.classifiers))
-    return np.sign(score)
-
 """## AdaBoost
 
 AdaBoost (Freund and Schapire, 1997) is a seminal work on learning an ensemble. It works by iteratively training a classifier on a differently weighted version of the same training dataset. While any classifier can be used as a base classifier, the standard one is a (shallow) decision tree because it's easy to train and naturally admits weighted training (what we've already implemented above).
 """
 
-def adaboost(data_train, data_val, max_steps=100, max_depth=7, min_split_size=25, patience=40, verbose=False):  #100, 4, 10, 20
-  weights = np.full(len(data_train), 1. / len(data_train))  
-
-  # Will maintain ensemble scores on all data for efficiency
-  scores_train_current = np.zeros(len(data_train))
-  scores_val_current = np.zeros(len(data_val))
-
-  ensemble = Ensemble()
-  step_best = 0
-  acc_val_best = 0
-
-  weighted_l = np.array([data_train[i][1] for i in range(len(data_train))])
-
-  for step in range(max_steps):
-    tree = DecisionTree(data_train, weights=weights, max_depth=max_depth, min_split_size=min_split_size)
-    preds = np.array([tree.predict(x) for x, _ in data_train])
-    risk = np.zeros(len(weighted_l))
-
-    for i in range(len(weighted_l)): 
-      if weighted_l[i] != preds[i]:
-        risk[i] = 1
-
-    # TODO: Implement AdaBoost
-    weighted_error = np.sum(weights[i] for i in range(len(weighted_l)) if weighted_l[i] != preds[i])
-    alpha = (1/2)*np.log((1-weighted_error)/weighted_error)
-    weights = np.exp(weighted_l*(-alpha)*preds)*weights
-    weights = weights / np.sum(weights)
-
-    # Sanity check
-    assert 0 <= weighted_error <= 0.5
-    assert (weights >= 0).all()
-    assert abs(1 - weights.sum()) < 1e-6
-
-    # Update ensemble scores incrementally
-    scores_train_current += alpha * preds
-    scores_val_current += alpha * np.array([tree.predict(x) for x, _ in data_val])
-    acc_train = sum(pred == y for pred, (_, y) in zip(np.sign(scores_train_current), data_train)) / len(data_train) * 100. 
-    acc_val = sum(pred == y for pred, (_, y) in zip(np.sign(scores_val_current), data_val)) / len(data_val) * 100. 
-    print_string = 'Step {:d}   weighted_error {:.4f}   acc_train {:.2f}   acc_val {:.2f}'.format(step, weighted_error, acc_train, acc_val)
-
-    if acc_val > acc_val_best: 
-      step_best = step 
-      acc_val_best = acc_val
-      print_string += ' <--------new best'
-    elif step - step_best > patience:
-      if verbose: 
-        print(print_string, '\nNo improvement in over {:d} steps, early stopping'.format(patience))
-      break 
-    
-    if verbose: 
-      print(print_string)
-
-    ensemble.classifiers.append(tree)
-    ensemble.alphas.append(alpha)
-
-  # Only use the weak learners that gave us the best validation accuracy.
-  ensemble.classifiers = ensemble.classifiers[: step_best + 1]
-  ensemble.alphas = ensemble.alphas[: step_best + 1]
-  return ensemble, acc_val_best
-
 """Let's try fitting an ensemble on the toy XOR dataset. """
 
+from cs461.spam import adaboost
+
 ensemble_xor, acc_val_xor = adaboost(data_xor.train, data_xor.val)
 print('Best val acc: {:.2f}'.format(acc_val_xor))
 data_xor.draw_contour(ensemble_xor, M=200)
@@ -464,15 +164,7 @@ To make the assignment more engaging we have a [Kaggle competition](https://www.
 - Patience
 """
 
-import csv
-
-def create_kaggle_submission(model, data_unlabeled, netid):
-  preds = model.predict_all(data_unlabeled)
-  with open('/content/drive/My Drive/cs461hw4_{:s}.csv'.format(netid), 'w') as f:
-    writer = csv.writer(f)
-    writer.writerow(['id', 'prediction'])  # Header
-    for i, pred in enumerate(preds):
-        writer.writerow([i, int(pred)])
+from cs461.spam import create_kaggle_submission
 
 # Use your best model (assumed model_best) with your NetID here.
 model_best = ensemble_best 
@@ -484,3 +176,16 @@ Question: Report the result of your **best model** here.
 - Test accuracy on the Kaggle public leaderboard (you can check the Kaggle private leaderboard after the competition deadline) 
 Mine is 0.9555
 """
+
+"""# Saving Models
+
+A trained model only lives in notebook memory. `save_model` writes it to a directory with one raw `.npy` file per array and a small `header.json` (model type and the few non-array attributes). `load_model` memory-maps the arrays back, so a scoring process can start in milliseconds without retraining or unpickling.
+
+A tree is stored in its flat layout (see `flatten_trees` above). An ensemble concatenates the arrays of its trees and stores the tree weights in `alphas`.
+"""
+
+from cs461.spam import save_model, load_model
+
+model_dir = '/content/drive/My Drive/models/spam_best'
+save_model(model_best, model_dir)
+print('acc val of the loaded model {:.2f}'.format(load_model(model_dir).evaluate_accuracy(data_val)))
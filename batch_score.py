@@ -0,0 +1,6 @@
+"""Scores a large unlabeled input with a saved model, see cs461/batch_score.py."""
+
+from cs461.batch_score import main
+
+if __name__ == '__main__':
+  main()
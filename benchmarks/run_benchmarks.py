@@ -0,0 +1,254 @@
+"""
+Times the hot paths of the cs461 models and trainers on synthetic data, writes the results to a JSON file,
+and compares them against a stored baseline.
+
+Every benchmark generates its own data from a fixed seed. --scale multiplies the number of examples (not
+the dimensions), so a run at --scale 0.1 is a quick smoke test and --scale 1 matches the stored baseline.
+Each benchmark is timed --repeat times after one warm-up call, and the median is compared: a benchmark
+whose median is more than --tolerance slower than in the baseline is reported as a regression, and the
+script exits with status 1.
+
+  python benchmarks/run_benchmarks.py --output results.json --baseline benchmarks/baseline.json
+  python benchmarks/run_benchmarks.py --filter gmm --repeat 10
+  python benchmarks/run_benchmarks.py --output benchmarks/baseline.json  # Refresh the baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Run from a checkout
+
+from cs461 import gmm, mnist, regression, spam, svm
+from cs461.utils import set_seed
+
+BENCHMARKS = {}  # name -> setup(scale) returning (params, function to time)
+
+def benchmark(name):
+  def register(setup):
+    BENCHMARKS[name] = setup
+    return setup
+  return register
+
+def scaled(num_examples, scale):
+  return max(int(num_examples * scale), 10)
+
+def spam_data(num_examples, dim=57):  # Lists of (x, y) like the spam data, with a few informative features
+  X = np.round(np.random.exponential(size=(num_examples, dim)), 2)
+  y = np.where(X[:, :5].sum(axis=1) + np.random.randn(num_examples) > 5, 1, -1)
+  return list(zip(X.tolist(), y.tolist()))
+
+@benchmark('linear_classifier_forward')
+def setup_linear_classifier_forward(scale):
+  N, d = scaled(4096, scale), 784
+  X = np.random.rand(N, d)
+  y = np.random.randint(10, size=(N, 1))
+  model = mnist.LinearClassifier(X, 10, init_range=0.01)
+  return {'N': N, 'd': d, 'L': 10}, lambda: model.forward(X, y, regularization_weight=0.01)
+
+@benchmark('fit_stump')
+def setup_fit_stump(scale):
+  N = scaled(2000, scale)
+  data = spam_data(N)
+  weights = np.full(N, 1. / N)
+  return {'N': N, 'd': 57}, lambda: spam.fit_stump(data, weights)
+
+@benchmark('decision_tree_fit')
+def setup_decision_tree_fit(scale):
+  N = scaled(2000, scale)
+  data = spam_data(N)
+  return {'N': N, 'd': 57, 'max_depth': 7}, lambda: spam.DecisionTree(data, max_depth=7, min_split_size=25)
+
+@benchmark('decision_tree_fit_deep')
+def setup_decision_tree_fit_deep(scale):  # The deepest trees in tune_tree
+  N = scaled(2000, scale)
+  data = spam_data(N)
+  return {'N': N, 'd': 57, 'max_depth': 32, 'min_split_size': 1}, lambda: spam.DecisionTree(data, max_depth=32, min_split_size=1)
+
+@benchmark('decision_tree_fit_best_first')
+def setup_decision_tree_fit_best_first(scale):  # As many leaves as a depth 6 tree at most
+  N = scaled(2000, scale)
+  data = spam_data(N)
+  return {'N': N, 'd': 57, 'max_depth': 32, 'max_leaves': 32}, lambda: spam.DecisionTree(data, max_depth=32, max_leaves=32)
+
+@benchmark('decision_tree_fit_histogram')
+def setup_decision_tree_fit_histogram(scale):  # Includes binning the data
+  N = scaled(2000, scale)
+  data = spam_data(N)
+  return {'N': N, 'd': 57, 'max_depth': 7, 'max_bins': 255}, lambda: spam.DecisionTree(data, max_depth=7, min_split_size=25, max_bins=255)
+
+@benchmark('decision_tree_predict')
+def setup_decision_tree_predict(scale):
+  N = scaled(20000, scale)
+  tree = spam.DecisionTree(spam_data(2000), max_depth=7, min_split_size=25)
+  inputs = [x for x, _ in spam_data(N)]
+  return {'N': N, 'd': 57, 'max_depth': 7}, lambda: tree.predict_all(inputs)
+
+@benchmark('decision_tree_predict_array')
+def setup_decision_tree_predict_array(scale):  # On the flat layout
+  N = scaled(20000, scale)
+  tree = spam.DecisionTree(spam_data(2000), max_depth=7, min_split_size=25)
+  inputs = np.array([x for x, _ in spam_data(N)])
+  return {'N': N, 'd': 57, 'max_depth': 7}, lambda: tree.predict_all(inputs)
+
+@benchmark('adaboost')
+def setup_adaboost(scale):
+  N = scaled(1000, scale)
+  data = spam_data(N + N // 4)
+  return {'N': N, 'd': 57, 'max_steps': 10, 'max_depth': 3}, lambda: spam.adaboost(data[:N], data[N:], max_steps=10, max_depth=3)
+
+@benchmark('adaboost_histogram')
+def setup_adaboost_histogram(scale):
+  N = scaled(1000, scale)
+  data = spam_data(N + N // 4)
+  return ({'N': N, 'd': 57, 'max_steps': 10, 'max_depth': 3, 'max_bins': 255}, 
+          lambda: spam.adaboost(data[:N], data[N:], max_steps=10, max_depth=3, max_bins=255))
+
+@benchmark('ensemble_predict')
+def setup_ensemble_predict(scale):
+  N = scaled(20000, scale)
+  data = spam_data(2000)
+  ensemble = spam.Ensemble()
+  for _ in range(50):
+    ensemble.classifiers.append(spam.DecisionTree(data, np.random.rand(len(data)), max_depth=3, min_split_size=25))
+    ensemble.alphas.append(np.random.rand())
+  inputs = [x for x, _ in spam_data(N)]
+  return {'N': N, 'd': 57, 'num_trees': 50, 'max_depth': 3}, lambda: ensemble.predict_all(inputs)
+
+@benchmark('linear_svm_forward')
+def setup_linear_svm_forward(scale):
+  N, d = scaled(4096, scale), 2000
+  X = (np.random.rand(N, d) < 0.005).astype(np.int64)  # Like bag-of-words inputs
+  y = 2 * np.random.randint(2, size=N) - 1
+  model = svm.LinearSVM(d, init_randn=True)
+  return {'N': N, 'd': d}, lambda: model.forward(X, y, 0.01)
+
+@benchmark('pegasos_kernelized')
+def setup_pegasos_kernelized(scale):
+  N = scaled(500, scale)
+  data = svm.Data2D(N, boundary='circle')
+  kernel = svm.construct_kernel('gaussian', gamma=10.)
+  return {'N': N, 'd': 2, 'max_num_epochs': 2}, lambda: svm.pegasos_kernelized(data, kernel, 0.01, max_num_epochs=2)
+
+@benchmark('construct_kernel')
+def setup_construct_kernel(scale):  # Building the kernel and evaluating it on a (N, N) Gram matrix
+  N, d = scaled(1000, scale), 20
+  X = np.random.randn(N, d)
+  def run():
+    for kernel_type in ('linear', 'poly', 'gaussian'):
+      svm.construct_kernel(kernel_type, dim=3, offset=1.)(X, X)
+  return {'N': N, 'd': d}, run
+
+def gmm_setup(scale, diag):
+  N, d, K = scaled(2000, scale), (256 if diag else 64), (10 if diag else 5)
+  inputs = np.random.rand(N, d)
+  model = gmm.GMM(d, K, diag=diag)
+  model.mu = inputs[np.random.choice(N, K, replace=False)]
+  model.sigma = np.full((K, d), 0.1) if diag else np.array([0.1 * np.identity(d)] * K)
+  return {'N': N, 'd': d, 'K': K}, model, inputs
+
+@benchmark('gmm_compute_log_probs_diag')
+def setup_gmm_compute_log_probs_diag(scale):
+  params, model, inputs = gmm_setup(scale, diag=True)
+  return params, lambda: model.compute_log_probs(inputs)
+
+@benchmark('gmm_compute_log_probs_full')
+def setup_gmm_compute_log_probs_full(scale):
+  params, model, inputs = gmm_setup(scale, diag=False)
+  return params, lambda: model.compute_log_probs(inputs)
+
+@benchmark('gmm_update_parameters')
+def setup_gmm_update_parameters(scale):
+  params, model, inputs = gmm_setup(scale, diag=True)
+  posteriors = model.compute_posteriors(inputs)[0]
+  trainer = gmm.GMMTrainerEM(model, smoothing=0.1)
+  return params, lambda: trainer.update_parameters(inputs, posteriors)
+
+@benchmark('polynomial_expansion')
+def setup_polynomial_expansion(scale):
+  N, d = scaled(5000, scale), 13
+  X = np.random.randn(N, d)
+  return {'N': N, 'd': d, 'degrees': [0, 1, 2, 3]}, lambda: regression.polynomial_expansion(X, (0, 1, 2, 3))
+
+@benchmark('gradient_descent')
+def setup_gradient_descent(scale):  # Boston-sized, with a fixed number of steps
+  N, d = scaled(354, scale), 13
+  X = np.random.randn(N + N // 4, d)
+  y = X.dot(np.random.randn(d)) + 0.1 * np.random.randn(len(X))
+  def run():
+    model = regression.LinearRegressor(degrees=(0, 1, 2))
+    regression.gradient_descent(model, X[:N], y[:N], regression.squared_loss_and_gradient, X[N:], y[N:],
+                                num_steps_max=500, patience=500)
+  return {'N': N, 'd': d, 'degrees': [0, 1, 2], 'num_steps': 500}, run
+
+def time_benchmark(setup, scale, repeat):
+  set_seed(0)
+  params, run = setup(scale)
+  run()  # Warm up caches and lazy imports
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    run()
+    times.append(time.perf_counter() - start)
+  return {'params': params, 'repeat': repeat, 'min': min(times), 'median': statistics.median(times)}
+
+def run_benchmarks(names, scale=1., repeat=5, verbose=False):
+  results = {}
+  for name in names:
+    results[name] = time_benchmark(BENCHMARKS[name], scale, repeat)
+    if verbose:
+      print('{:30s} {:10.4f}s median {:10.4f}s min'.format(name, results[name]['median'], results[name]['min']), file=sys.stderr)
+  meta = {'scale': scale, 'repeat': repeat, 'python': platform.python_version(), 'numpy': np.__version__,
+          'machine': platform.machine(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+          'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+  return {'meta': meta, 'results': results}
+
+def compare(report, baseline, tolerance=0.25):
+  """
+  Compares the median times in report against baseline. Returns a list of (name, baseline median, median,
+  ratio, regressed) for the benchmarks in both, where regressed means slower than the baseline by more
+  than the tolerance. Benchmarks whose parameters differ (e.g. another scale) are not comparable and skipped.
+  """
+  rows = []
+  for name, result in report['results'].items():
+    result_baseline = baseline['results'].get(name)
+    if result_baseline is None or result_baseline['params'] != result['params']:
+      continue
+    ratio = result['median'] / result_baseline['median']
+    rows.append((name, result_baseline['median'], result['median'], ratio, ratio > 1. + tolerance))
+  return rows
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Time the cs461 hot paths on synthetic data.')
+  parser.add_argument('--scale', type=float, default=1., help='multiplier for the number of examples')
+  parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+  parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+  parser.add_argument('--output', help='JSON file to write the results to')
+  parser.add_argument('--baseline', help='JSON results to compare against')
+  parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown relative to the baseline')
+  args = parser.parse_args(argv)
+
+  names = [name for name in BENCHMARKS if args.filter in name]
+  report = run_benchmarks(names, scale=args.scale, repeat=args.repeat, verbose=True)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      rows = compare(report, json.load(f), tolerance=args.tolerance)
+    print('{:30s} {:>12s} {:>12s} {:>8s}'.format('benchmark', 'baseline', 'current', 'ratio'))
+    for name, median_baseline, median, ratio, regressed in rows:
+      print('{:30s} {:11.4f}s {:11.4f}s {:7.2f}x{:s}'.format(name, median_baseline, median, ratio, '  REGRESSION' if regressed else ''))
+    if any(regressed for *_, regressed in rows):
+      return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
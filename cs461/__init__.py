@@ -0,0 +1,13 @@
+"""
+Models and trainers from the CS-461 projects as an importable package, one module per project:
+
+  cs461.mnist       MNIST digit classification (softmax linear classifier)
+  cs461.spam        Spam detection with decision trees and AdaBoost
+  cs461.svm         Twitter sentiment analysis with support vector machines
+  cs461.gmm         Classifying fashion images with Gaussian mixture models
+  cs461.regression  Predicting Boston housing prices with regression
+
+Importing a module has no side effects beyond defining it: data is loaded and models are trained only when 
+called, and plotting (matplotlib, seaborn, pandas) and text processing (nltk, sklearn) libraries are only 
+imported by the functions that need them.
+"""
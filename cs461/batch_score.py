@@ -0,0 +1,78 @@
+"""
+Scores a large unlabeled input with a saved model and writes id,prediction rows, one chunk at a time.
+
+The model is a directory written by save_model in one of the projects (raw .npy arrays plus header.json), and is 
+loaded by the load_model of the project that saved it, with its arrays memory-mapped: a LinearClassifier, 
+FoldedLinearClassifier or QuantizedLinearClassifier (MNIST, the prediction is the argmax label), a LinearSVM, 
+QuantizedLinearSVM or KernelSVM (Twitter sentiment, +1 or -1), or a DecisionTree or Ensemble (spam, +1 or -1). 
+Each chunk is scored the model's own way: a LinearClassifier is folded once (LinearClassifier.fold) to score raw 
+inputs, and trees and ensembles predict on their flat layout (predict_flat).
+
+The input is either an .npy file, which is memory-mapped so that only one chunk is in memory at a time, or
+a pickled list of feature vectors (e.g. the spam x_test.pkl).
+
+  python -m cs461.batch_score model_dir x_test.npy predictions.csv --chunk-size 65536
+"""
+
+import argparse
+import pickle
+import sys
+
+import numpy as np
+
+from . import mnist, spam, svm
+from .utils import load_arrays, write_predictions
+
+
+def load_inputs(path):
+  if path.endswith('.npy'):
+    return np.load(path, mmap_mode='r')
+  with open(path, 'rb') as f:
+    return pickle.load(f)
+
+model_modules = {  # Model type in header.json -> the project module whose load_model reads it
+  'LinearClassifier': mnist, 'FoldedLinearClassifier': mnist, 'QuantizedLinearClassifier': mnist,
+  'LinearSVM': svm, 'QuantizedLinearSVM': svm, 'KernelSVM': svm,
+  'DecisionTree': spam, 'Ensemble': spam,
+}
+
+def load_model(path):
+  model_type = load_arrays(path)[0]
+  if model_type not in model_modules:
+    raise ValueError('Cannot score model type: ' + model_type)
+  model = model_modules[model_type].load_model(path)
+  if isinstance(model, mnist.LinearClassifier):
+    model = model.fold()  # Scores raw inputs without a normalized copy
+  return model
+
+def predict(model, X):  # Labels of a chunk of raw inputs
+  if isinstance(model, (spam.DecisionTree, spam.Ensemble)):
+    return model.predict_all(X)  # An array, so on the flat layout
+  if isinstance(model, (svm.LinearSVM, svm.QuantizedLinearSVM, svm.KernelSVM)):
+    return np.atleast_1d(model.forward(X)['preds'])  # LinearSVM squeezes a single row to a scalar
+  return model.predict(X)[:, 0]
+
+def batch_score(model_path, inputs_path, output_path, chunk_size=65536, header='id,prediction'):
+  model = load_model(model_path)
+  inputs = load_inputs(inputs_path)
+  with open(output_path, 'w', buffering=1 << 20) as f:
+    if header:
+      f.write(header + '\n')
+    for start in range(0, len(inputs), chunk_size):
+      X = np.asarray(inputs[start:start + chunk_size])
+      write_predictions(f, predict(model, X), start)
+  return len(inputs)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Score an .npy or pickled input with a saved model.')
+  parser.add_argument('model', help='model directory written by save_model')
+  parser.add_argument('inputs', help='.npy (memory-mapped) or pickled list of feature vectors')
+  parser.add_argument('output', help='CSV file to write id,prediction rows to')
+  parser.add_argument('--chunk-size', type=int, default=65536, help='rows scored and written at a time')
+  parser.add_argument('--header', default='id,prediction', help='CSV header line (empty for none)')
+  args = parser.parse_args(argv)
+  num_examples = batch_score(args.model, args.inputs, args.output, chunk_size=args.chunk_size, header=args.header)
+  print('Wrote {:d} predictions to {:s}'.format(num_examples, args.output), file=sys.stderr)
+
+if __name__ == '__main__':
+  main()
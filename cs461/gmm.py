@@ -0,0 +1,226 @@
+"""
+Classifying fashion images with Gaussian mixture models: diagonal and full-covariance GMMs trained with EM, 
+one per label, classification by the most likely mixture, sweeps over the number of components, and 
+saving/loading models.
+"""
+
+import os
+
+import numpy as np
+
+from .utils import NullPhaseTimer, set_seed, run_sweep, shared_arrays, save_arrays, load_arrays
+
+DATADIR = '/content/drive/My Drive/data/FashionMNIST/'  # Where FashionMNIST looks for the .npy splits by default
+label_names = ['tshirt/top', 'trouser', 'pullover', 'dress', 'coat', 'sandal', 'shirt', 'sneaker', 'bag', 'ankle boot']  # Hardcoded
+
+
+class FashionMNIST:
+
+  def __init__(self, split, inputs=None, labels=None, datadir=None):
+    assert split in ['Tr', 'Vl']  # We don't have a test set
+    if inputs is None:  # Otherwise the arrays are given directly (e.g. mapped in a sweep worker)
+      datadir = datadir if datadir is not None else DATADIR
+      inputs = np.load(os.path.join(datadir, 'x{:s}.npy'.format(split)))  # (N, 16^2)
+      labels = np.load(os.path.join(datadir, 'y{:s}.npy'.format(split)))  # (N, 10)
+    self.inputs = inputs
+    self.labels = labels
+    self.num_examples, self.dim = self.inputs.shape
+    self.num_labels = self.labels.shape[1]
+
+    # Partition data by labels
+    self.partition = [self.inputs[np.where(np.argmax(self.labels, axis=1) == y)[0]] for y in range(self.num_labels)]
+
+def show_image(image, ax=None):
+  import matplotlib as mpl
+  import matplotlib.pyplot as plt
+  width = int(np.sqrt(image.shape[0]))
+  image = image.reshape(width, width)  
+  if ax == None:
+    fig = plt.figure()
+    ax = fig.add_subplot(1, 1, 1)
+  imgplot = ax.imshow(image, cmap=mpl.cm.Greys)
+  imgplot.set_interpolation('nearest')
+  ax.xaxis.set_ticks_position('top')
+  ax.yaxis.set_ticks_position('left')
+  plt.axis('off')
+
+class GMM:
+
+  def __init__(self, dim, num_components, diag=False):
+    self.pi = np.full(num_components, 1. / num_components)  # (K,)
+    self.mu = np.zeros((num_components, dim))  # (K, d)
+    if diag:
+      self.sigma = np.ones((num_components, dim))  # (K, d)
+    else:   
+      self.sigma = np.array([np.identity(dim) for _ in range(num_components)])   # (K, d, d)
+    self.diag = diag
+
+  def compute_log_probs(self, inputs):  # (N, d)
+    log_pi = np.log(self.pi)[:, np.newaxis]  # (K, 1)
+    diffs = inputs[np.newaxis, :, :] - self.mu[:, np.newaxis, :]  # (K, N, d)
+
+    if self.diag:
+      det_sigma = np.sum(np.log(self.sigma),axis = 1)
+      det_sigma = det_sigma[:, np.newaxis]
+      inv_sigma= (1/self.sigma)
+      matrix  = np.apply_along_axis(np.diag, -1, inv_sigma) 
+      di = (-1/2)*np.einsum('KNd, Kdd, KdN->KN',np.transpose(diffs, (0,1,2)),matrix,np.swapaxes(diffs, 1,2))
+      ti = self.mu.shape[1]*np.log(2*np.pi)
+      prob = -ti/2 - det_sigma/2 + di
+      log_probs = log_pi + prob  # (K, N): log p(k, inputs[i])
+    else:
+      s_inv = np.linalg.inv(self.sigma)
+      det_sigma = np.linalg.slogdet(self.sigma)[1][:, np.newaxis]
+      di = (-1/2)*np.einsum('KNd, Kdd, KdN->KN',np.transpose(diffs, (0,1,2)),s_inv,np.swapaxes(diffs, 1,2))
+      ti = self.mu.shape[1]*np.log(2*np.pi)
+      prob = -ti/2 - det_sigma/2 + di
+      log_probs = log_pi + prob
+    return log_probs  
+
+  def compute_posteriors(self, inputs):  # (N, d)
+    from scipy.special import logsumexp  # Imported on first use, scipy.special is slow to import
+    log_probs = self.compute_log_probs(inputs)  # (K, N): log p(k, x)
+    marginal_log_probs = logsumexp(log_probs, axis=0)  # (N,): log p(x)
+    marginal_log_likelihood = marginal_log_probs.mean()  # Scalar
+    posteriors = np.exp(log_probs - marginal_log_probs[np.newaxis, :])  # (K, N): p(k|x)
+    return posteriors, marginal_log_likelihood, marginal_log_probs
+
+class GMMTrainerEM:
+
+  def __init__(self, model, smoothing=0.1):
+    self.model = model
+    self.smoothing = smoothing
+    self.diag_smoother =  smoothing * np.array([np.identity(model.mu.shape[1]) for _ in range(model.mu.shape[0])])
+
+  def train(self, inputs, num_iterations_max=40, verbose=False, init_method='naive', timer=None):
+    timer = timer or NullPhaseTimer()
+    self.init_centers(inputs, init_method=init_method)
+    mll_previous = -np.inf 
+    posteriors, mll, _ = self.model.compute_posteriors(inputs)  # E step
+    timer.reset()
+    for iteration in range(num_iterations_max): 
+      with timer.phase('m_step'):
+        self.update_parameters(inputs, posteriors)  # M step
+      with timer.phase('e_step'):  # Also gives the marginal log-likelihood, i.e. the evaluation
+        posteriors, mll, _ = self.model.compute_posteriors(inputs)  # E step
+      timer.end_iteration('GMMTrainerEM.train', iteration + 1, inputs.shape[0], mll=mll)
+      if verbose:
+        print('Iteration {:3d}:\t marginal log-likelihood {:10.4f}'.format(iteration + 1,  mll))
+      if np.isclose(mll, mll_previous):
+        break
+      mll_previous = mll
+    return mll, iteration
+
+  def update_parameters(self, inputs, posteriors):
+    from scipy.special import logsumexp
+    expected_counts = posteriors.sum(axis=1) + self.smoothing # (K,)
+    self.model.pi = expected_counts / expected_counts.sum()
+
+    weighted_sums = posteriors @ inputs  # (K, d)
+    self.model.mu = weighted_sums / expected_counts[:, np.newaxis]
+
+    diffs = inputs[np.newaxis, :, :] - self.model.mu[:, np.newaxis, :]  # (K, N, d)
+    diffs_weighted = posteriors[:, :, np.newaxis] * diffs  # (K, N, d)
+    if self.model.diag:
+      self.model.sigma = np.sum(diffs_weighted*diffs, axis = 1)
+      self.model.sigma = self.model.sigma / expected_counts[:, np.newaxis] + self.smoothing 
+    else:
+      self.model.sigma = logsumexp(np.einsum('KdN, KNd -> Kd',diffs_weighted.transpose((0,2,1)),diffs))
+      self.model.sigma = (self.model.sigma)/expected_counts[:, np.newaxis, np.newaxis] + self.diag_smoother
+
+  def init_centers(self, inputs, init_method='naive'):
+    # Find K centers from the given input vectors (N, d) somehow.
+    if init_method == 'naive':
+      idx = np.random.randint(inputs.shape[0])
+      self.model.mu = np.zeros((self.model.mu.shape[0], inputs.shape[1]))
+      self.model.mu[0] = inputs[idx]
+      inputs = np.delete(inputs, idx, 0)
+
+      for i in range(1, self.model.mu.shape[0]):
+        dist = {}
+
+        for j in range(i):
+          norm = np.linalg.norm(self.model.mu[j] - inputs)
+          temp = np.min(norm)
+          index = np.argmin(norm)
+          dist[temp] = index
+
+        index = dist[max(dist.keys())]
+        self.model.mu[i] = inputs[index]
+        inputs = np.delete(inputs, index, 0)
+
+    else: 
+      raise ValueError('Unknown init method: ' + init_method)
+
+def compute_accuracy(models, data):  # models[y]: GMM for label y
+  log_probs_all = np.zeros((data.num_examples, data.num_labels))
+  for y in range(data.num_labels):
+    log_probs_all[:, y] = np.max(models[y].compute_log_probs(data.inputs), axis = 0)
+
+  preds = np.argmax(log_probs_all, axis=1)
+  acc = np.mean(preds == np.argmax(data.labels, axis=1)) * 100.
+  return acc, preds
+
+def show_means(models, y):
+  import matplotlib.pyplot as plt
+  num_components = len(models[y].pi)
+  fig, axes = plt.subplots(1, num_components)
+
+  for k in range(num_components):
+    if num_components == 1:
+      ax = axes
+    else:
+      ax = axes[k]
+    show_image(models[y].mu[k], ax)
+    ax.axis("off")
+    if k == 0:
+      ax.set_title(label_names[y] + "/" + str(k))
+    else:
+      ax.set_title("/" + str(k))
+  return fig, axes
+
+def train_gmms(config):  # Runs in a sweep worker
+  set_seed(config['seed'])
+  data_train = FashionMNIST('Tr', inputs=shared_arrays['inputs_train'], labels=shared_arrays['labels_train'])
+  data_val = FashionMNIST('Vl', inputs=shared_arrays['inputs_val'], labels=shared_arrays['labels_val'])
+  models = []
+  log = []
+  for y in range(data_train.num_labels):
+    model = GMM(data_train.dim, config['num_components'], diag=config['diag'])
+    trainer = GMMTrainerEM(model, smoothing=config['smoothing'])
+    models.append(model)
+    mll, iteration = trainer.train(data_train.partition[y], num_iterations_max=40, verbose=False)
+    log.append('Label {:d}: {:2d} iterations, final MLL {:10.3f}'.format(y, iteration, mll))
+  acc_train, _ = compute_accuracy(models, data_train)
+  acc_val, _ = compute_accuracy(models, data_val)
+  return acc_val, (models, acc_train, log)
+
+def sweep_gmms(data_train, data_val, configs, num_workers=None):
+  arrays = {'inputs_train': data_train.inputs, 'labels_train': data_train.labels, 
+            'inputs_val': data_val.inputs, 'labels_val': data_val.labels}
+  return run_sweep(train_gmms, configs, arrays, num_workers=num_workers)
+
+def save_model(model, path):
+  if isinstance(model, GMM):
+    save_arrays(path, 'GMM', {'pi': model.pi, 'mu': model.mu, 'sigma': model.sigma}, diag=model.diag)
+  elif isinstance(model, list) and all(isinstance(gmm, GMM) for gmm in model):  # models[y]: GMM for label y
+    arrays = {}
+    for y, gmm in enumerate(model):
+      arrays.update({'pi_{:d}'.format(y): gmm.pi, 'mu_{:d}'.format(y): gmm.mu, 'sigma_{:d}'.format(y): gmm.sigma})
+    save_arrays(path, 'GMMClassifier', arrays, diag=[gmm.diag for gmm in model])
+  else:
+    raise ValueError('Unknown model type: ' + type(model).__name__)
+
+def build_gmm(pi, mu, sigma, diag):
+  model = GMM.__new__(GMM)  # Skip allocating (possibly large) initial parameters
+  model.pi, model.mu, model.sigma, model.diag = pi, mu, sigma, diag
+  return model
+
+def load_model(path, mmap_mode='r'):
+  model_type, arrays, attributes = load_arrays(path, mmap_mode=mmap_mode)
+  if model_type == 'GMM':
+    return build_gmm(arrays['pi'], arrays['mu'], arrays['sigma'], attributes['diag'])
+  if model_type == 'GMMClassifier':
+    return [build_gmm(arrays['pi_{:d}'.format(y)], arrays['mu_{:d}'.format(y)], arrays['sigma_{:d}'.format(y)], diag) 
+            for y, diag in enumerate(attributes['diag'])]
+  raise ValueError('Unknown model type: ' + model_type)
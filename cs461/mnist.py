@@ -0,0 +1,811 @@
+"""
+MNIST digit classification with a softmax linear classifier: datasets, the model and its folded and int8 
+quantized forms for inference, SGD-style optimizers, minibatch, L-BFGS, multi-config and data-parallel 
+training, evaluation, and saving/loading models.
+"""
+
+import copy
+import functools
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+from .utils import (NullPhaseTimer, EpochShuffler, epoch_permutation, set_seed, shared_arrays, share_arrays, run_sweep, 
+                    save_arrays, load_arrays, write_predictions)
+
+DATADIR = '/content/drive/My Drive/data/MNIST/'  # Where MNISTDataset looks for the .npy splits by default
+
+
+class MNISTDataset:
+
+  def __init__(self, split, mmap_mode=None, prefetch=False, inputs=None, labels=None, datadir=None):
+    assert split in ['train', 'train_small', 'val', 'test']
+    if inputs is None:  # Otherwise the arrays are given directly (e.g. mapped in a sweep worker)
+      datadir = datadir if datadir is not None else DATADIR
+      # With mmap_mode='r' the arrays are mapped lazily instead of read into memory, so opening a split is cheap.
+      inputs = np.load(os.path.join(datadir, 'inputs_{:s}.npy'.format(split)), mmap_mode=mmap_mode)
+      if split != 'test':
+        labels = self.get_labels(os.path.join(datadir, 'labels_{:s}.npy'.format(split)), mmap_mode=mmap_mode)
+    self.inputs = inputs
+    self.labels = labels
+    if labels is not None:
+      self.label_count = Counter(dict(enumerate(np.bincount(labels, minlength=10).tolist())))
+      assert self.labels.shape[0] == self.inputs.shape[0]
+    self.split = split
+    self.features = None  # Normalized inputs with the bias dimension, see normalize
+    self.features_key = None
+    self.prefetch = prefetch  # Gather the next chunk of a shuffled training epoch in the background
+    self.shuffler = None
+
+  def get_labels(self, filepath, mmap_mode=None):
+    label_matrix = np.load(filepath, mmap_mode=mmap_mode)  # (num_examples, num_labels), one-hot
+    assert label_matrix.shape[1] <= 256  # So that labels fit in uint8
+    return np.argmax(label_matrix, axis=1).astype(np.uint8)  # (num_examples,)
+
+  def num_examples(self):
+    return self.inputs.shape[0]
+
+  def dim(self):
+    return self.inputs.shape[1]
+
+  def normalize(self, mu, sigma, dtype=np.float64, cache_dir=None):
+    """
+    Computes normalize_features(self.inputs, mu, sigma) once and keeps it as a contiguous array, 
+    so that generate_batch(..., normalized=True) only has to slice it. If cache_dir is given, 
+    the array is saved there as .npy (keyed on mu/sigma/dtype) and memory-mapped on later calls. 
+    """
+    key = feature_cache_key(mu, sigma, dtype)
+    if key == self.features_key:  # Already normalized with these statistics
+      return self.features
+
+    if cache_dir is None:
+      features = self.compute_features(mu, sigma, dtype)
+    else:
+      path = os.path.join(cache_dir, 'features_{:s}_{:s}.npy'.format(self.split, key))
+      if not os.path.exists(path):
+        path_tmp = '{:s}.{:d}.tmp'.format(path, os.getpid())
+        with open(path_tmp, 'wb') as f:
+          np.save(f, self.compute_features(mu, sigma, dtype))
+        os.replace(path_tmp, path)  # Atomic, in case several processes build the same cache
+      features = np.load(path, mmap_mode='r')
+
+    self.features = features
+    self.features_key = key
+    return features
+
+  def compute_features(self, mu, sigma, dtype, chunk_size=4096):
+    # Fill a preallocated array chunk by chunk instead of concatenating full-size temporaries.
+    features = np.empty((self.num_examples(), self.dim() + 1), dtype=dtype)
+    features[:, 0] = 1.
+    for i in range(0, self.num_examples(), chunk_size):
+      features[i: i + chunk_size, 1:] = (self.inputs[i: i + chunk_size] - mu) / sigma
+    return features
+
+  def is_normalized_for(self, model):
+    return self.features_key == feature_cache_key(model.mu, model.sigma, model.dtype)
+
+  def generate_batch(self, batch_size, normalized=False):
+    inputs = self.features if normalized else self.inputs
+    assert inputs is not None, 'Call normalize before generating normalized batches'
+    labels = self.labels
+    if self.split == 'train':  # If train, shuffle examples before generating
+      if self.shuffler is None or self.shuffler.inputs is not inputs:
+        self.shuffler = EpochShuffler(inputs, labels, prefetch=self.prefetch)
+      for _, X, y in self.shuffler.batches(batch_size):
+        yield X, y[:, np.newaxis] if y is not None else None  # (batch_size, 1)
+      return
+    for i in range(0, self.num_examples(), batch_size):
+        X = inputs[i: i + batch_size]  # Views, no copying
+        y = labels[i: i + batch_size, np.newaxis] if labels is not None else None  # (batch_size, 1)
+        yield X, y
+
+def visualize_image(image_raw):
+  import matplotlib.pyplot
+  image = image_raw.reshape(28, 28)  # Reshape a vector into a square
+  fig = matplotlib.pyplot.figure()
+  ax = fig.add_subplot(1, 1, 1)
+  imgplot = ax.imshow(image, cmap=matplotlib.cm.Greys)
+  imgplot.set_interpolation("nearest")
+  ax.xaxis.set_ticks_position("top")
+  ax.yaxis.set_ticks_position("left")
+  matplotlib.pyplot.axis("off")
+  matplotlib.pyplot.show()
+
+def compute_feature_statistics(X):
+  mu = X.mean(0)
+  sigma = X.std(0)
+  sigma[sigma < 0.0001] = 1  # Avoid division by zero in case of degenerate features.
+  return mu, sigma
+
+def normalize_features(X, mu=None, sigma=None):
+  if mu is None or sigma is None: 
+    mu, sigma = compute_feature_statistics(X)
+
+  # Normalize features and also add a bias feature.
+  X_new = np.concatenate([np.ones((X.shape[0], 1)), (X - mu) / sigma], 1)
+
+  return X_new, mu, sigma
+
+def feature_cache_key(mu, sigma, dtype):
+  return hashlib.sha1(mu.tobytes() + sigma.tobytes() + np.dtype(dtype).str.encode()).hexdigest()[:16]
+
+def softmax(scores):  # (num_examples, num_labels)
+  nonnegs = np.exp(scores - np.amax(scores, axis=1)[:, np.newaxis])  # Mitigate numerical overflow by subtracting max 
+  return nonnegs / np.sum(nonnegs, axis=1)[:, np.newaxis]
+
+def logsumexp(scores):  # (num_examples, num_labels)
+  rowwise_max = np.amax(scores, axis=1)[:, np.newaxis] 
+  return rowwise_max + np.log(np.sum(np.exp(scores - rowwise_max), axis=1)[:, np.newaxis])
+
+class LinearClassifier:
+
+  def __init__(self, inputs_train, num_labels, init_range=0.0, dtype=np.float64):
+    self.mu, self.sigma = compute_feature_statistics(inputs_train)  # Get means and standard devations
+    self.dim = inputs_train.shape[1] + 1  # Normalization adds a bias dimension
+    self.dtype = np.dtype(dtype)  # float32 halves memory traffic of the matmuls at a small cost in precision
+
+    # Initialize parameters. 
+    self.W = np.random.uniform(-init_range, init_range, (self.dim, num_labels)).astype(self.dtype)
+
+    # Initialize the gradient.
+    self.W_grad = np.zeros((self.dim, num_labels), dtype=self.dtype)
+
+    # Scratch buffer for softmax(scores) - onehot(y), grown on demand and reused across batches.
+    self.probs_buffer = np.empty((0, num_labels), dtype=self.dtype)
+
+  def forward(self, X_raw, y=None, regularization_weight=0., normalized=False):
+    if normalized:  # X_raw already went through normalize_features with our mu/sigma (e.g. MNISTDataset.normalize)
+      X = X_raw
+    else:
+      X = normalize_features(X_raw, self.mu, self.sigma)[0].astype(self.dtype, copy=False)
+    scores = np.matmul(X, self.W)  # (batch_size, num_labels)        
+    loss_sum = None
+    if y is not None:  # We're given gold labels, we're training.
+
+      # Fused forward/backward: a single exp pass gives both logsumexp (for the loss) and softmax (for the gradient).
+      probs = self.get_probs_buffer(scores.shape[0])
+      rowwise_max = np.amax(scores, axis=1, keepdims=True)
+      np.subtract(scores, rowwise_max, out=probs)
+      np.exp(probs, out=probs)
+      normalizers = np.sum(probs, axis=1, keepdims=True)
+      probs /= normalizers
+
+      sum_score = rowwise_max + np.log(normalizers)  # logsumexp(scores)
+      negative_log_probs = sum_score - np.take_along_axis(scores, y, axis=1)  # (batch_size, 1)
+
+      squared_norm_W = np.linalg.norm(self.W[1:, :], 'fro') ** 2  # Don't regularize bias parameters
+      loss_sum = np.sum(negative_log_probs) + regularization_weight * squared_norm_W
+      self.accumulate_gradients(X, y, scores, regularization_weight, probs=probs)
+
+    return loss_sum, scores
+
+  def loss_and_gradient(self, X_raw, y, regularization_weight=0., normalized=False):
+    # The average loss \hat{J}(W) whose gradient accumulate_gradients computes, and that gradient
+    self.zero_grad()
+    loss_sum, _ = self.forward(X_raw, y, regularization_weight, normalized=normalized)
+    squared_norm_W = np.linalg.norm(self.W[1:, :], 'fro') ** 2
+    loss_avg = (loss_sum - regularization_weight * squared_norm_W) / X_raw.shape[0] + regularization_weight * squared_norm_W
+    return loss_avg, self.W_grad
+
+  def accumulate_gradients(self, X, y, scores, regularization_weight, probs=None):
+    batch_size, num_labels = scores.shape
+    if probs is None:
+      probs = self.get_probs_buffer(batch_size)
+      probs[:] = softmax(scores)
+
+    # Gradient of the average negative log probability wrt W is X^T (P - G) / N where G is the gold one-hot matrix.
+    # We subtract G in place and fold the 1/N into P so that a single matmul gives the whole term.
+    probs[np.arange(batch_size), y[:, 0]] -= 1.
+    probs *= 1. / batch_size
+    self.W_grad += np.matmul(X.T, probs)
+
+    # Gradient of the regularization term (bias parameters are not regularized).
+    self.W_grad[1:, :] += (2. * regularization_weight) * self.W[1:, :]
+
+  def get_probs_buffer(self, batch_size):
+    if self.probs_buffer.shape[0] < batch_size:
+      self.probs_buffer = np.empty((batch_size, self.probs_buffer.shape[1]), dtype=self.dtype)
+    return self.probs_buffer[:batch_size]
+
+  def predict(self, X_raw, normalized=False):
+      _, scores = self.forward(X_raw, normalized=normalized)
+      preds = np.argmax(scores, axis=1)[:, np.newaxis]  # (batch_size, 1)
+      return preds
+
+  def zero_grad(self):
+    self.W_grad.fill(0.)
+
+  def num_parameters(self):
+    return self.W.size
+
+  def fold(self):
+    # Since ((x - mu) / sigma) . W[1:, l] + W[0, l] = x . (W[1:, l] / sigma) + (W[0, l] - (mu / sigma) . W[1:, l]),
+    # the normalization can be folded into the weights once, and raw inputs scored directly.
+    W_folded = (self.W[1:, :] / self.sigma[:, np.newaxis]).astype(self.dtype)
+    b_folded = (self.W[0, :] - np.matmul(self.mu / self.sigma, self.W[1:, :])).astype(self.dtype)
+    return FoldedLinearClassifier(W_folded, b_folded)
+
+class FoldedLinearClassifier:
+  """Inference-only LinearClassifier with the feature normalization folded into its weights (see LinearClassifier.fold)."""
+
+  def __init__(self, W, b):
+    self.W = W  # (num_features, num_labels)
+    self.b = b  # (num_labels,)
+
+  def scores(self, X_raw):
+    scores = np.matmul(X_raw, self.W)  # No normalized copy of X_raw, and no bias column
+    scores += self.b
+    return scores
+
+  def predict(self, X_raw):
+    return np.argmax(self.scores(X_raw), axis=1)[:, np.newaxis]  # (batch_size, 1)
+
+  def quantize(self):
+    # Symmetric per-label quantization: column l is stored as int8 values in [-127, 127] times a float scale.
+    scale = np.abs(self.W).max(axis=0) / 127.
+    scale[scale == 0.] = 1.
+    W_quantized = np.round(self.W / scale).astype(np.int8)
+    return QuantizedLinearClassifier(W_quantized, scale.astype(np.float32), self.b.astype(np.float32))
+
+class QuantizedLinearClassifier:
+  """FoldedLinearClassifier with int8 weights (one float scale per label), scoring uint8 pixels directly."""
+
+  def __init__(self, W_quantized, scale, b):
+    self.W_quantized = W_quantized  # (num_features, num_labels) int8
+    self.scale = scale  # (num_labels,)
+    self.b = b  # (num_labels,)
+
+  def scores(self, X_raw):
+    # NumPy has no BLAS path for integer matmuls, so the products of int8 weights and uint8 pixels are accumulated 
+    # in float32 (exact while the integer sums stay below 2^24 in magnitude) and rescaled once per label.
+    scores = np.matmul(X_raw, self.W_quantized, dtype=np.float32)
+    scores *= self.scale
+    scores += self.b
+    return scores
+
+  def predict(self, X_raw):
+    return np.argmax(self.scores(X_raw), axis=1)[:, np.newaxis]  # (batch_size, 1)
+
+class SGDOptimizer:
+
+  def __init__(self, model, learning_rate):
+    self.model = model
+    self.lr = learning_rate
+    self.update = np.empty_like(model.W)  # Preallocated so that step doesn't allocate a temporary
+
+  def step(self):
+    np.multiply(self.model.W_grad, self.lr, out=self.update)
+    self.model.W -= self.update
+
+  def zero_grad(self):
+    self.model.zero_grad()
+
+  def modify_lr(self, learning_rate):
+    self.lr = learning_rate
+
+class MomentumOptimizer(SGDOptimizer):
+
+  def __init__(self, model, learning_rate, momentum=0.9, nesterov=False):
+    super().__init__(model, learning_rate)
+    self.momentum = momentum
+    self.nesterov = nesterov
+    self.velocity = np.zeros_like(model.W)
+
+  def step(self):
+    # v <- momentum * v + g, then W <- W - lr * v (or W <- W - lr * (g + momentum * v) with Nesterov momentum)
+    self.velocity *= self.momentum
+    self.velocity += self.model.W_grad
+    if self.nesterov:
+      np.multiply(self.velocity, self.momentum, out=self.update)
+      self.update += self.model.W_grad
+      self.update *= self.lr
+    else:
+      np.multiply(self.velocity, self.lr, out=self.update)
+    self.model.W -= self.update
+
+class AdagradOptimizer(SGDOptimizer):
+
+  def __init__(self, model, learning_rate, epsilon=1e-8):
+    super().__init__(model, learning_rate)
+    self.epsilon = epsilon
+    self.sum_squares = np.zeros_like(model.W)
+
+  def step(self):
+    # G <- G + g^2, then W <- W - lr * g / (sqrt(G) + epsilon)
+    np.multiply(self.model.W_grad, self.model.W_grad, out=self.update)
+    self.sum_squares += self.update
+    np.sqrt(self.sum_squares, out=self.update)
+    self.update += self.epsilon
+    np.divide(self.model.W_grad, self.update, out=self.update)
+    self.update *= self.lr
+    self.model.W -= self.update
+
+class AdamOptimizer(SGDOptimizer):
+
+  def __init__(self, model, learning_rate=0.001, beta1=0.9, beta2=0.999, epsilon=1e-8):
+    super().__init__(model, learning_rate)
+    self.beta1 = beta1
+    self.beta2 = beta2
+    self.epsilon = epsilon
+    self.m = np.zeros_like(model.W)  # First moment estimate
+    self.v = np.zeros_like(model.W)  # Second moment estimate
+    self.t = 0
+
+  def step(self):
+    self.t += 1
+    self.m *= self.beta1
+    np.multiply(self.model.W_grad, 1. - self.beta1, out=self.update)
+    self.m += self.update
+    self.v *= self.beta2
+    np.multiply(self.model.W_grad, self.model.W_grad, out=self.update)
+    self.update *= 1. - self.beta2
+    self.v += self.update
+
+    # Bias correction folded into the step size (Kingma and Ba, 2015, Section 2)
+    lr_t = self.lr * np.sqrt(1. - self.beta2 ** self.t) / (1. - self.beta1 ** self.t)
+    np.sqrt(self.v, out=self.update)
+    self.update += self.epsilon
+    np.divide(self.m, self.update, out=self.update)
+    self.update *= lr_t
+    self.model.W -= self.update
+
+optimizer_types = {
+  'sgd': SGDOptimizer,
+  'momentum': MomentumOptimizer,
+  'nesterov': functools.partial(MomentumOptimizer, nesterov=True),
+  'adagrad': AdagradOptimizer,
+  'adam': AdamOptimizer,
+}
+
+class ConfusionMatrix:
+  """Streaming confusion matrix (rows are gold labels, columns are predictions) updated one batch at a time."""
+
+  def __init__(self, num_labels=10):
+    self.num_labels = num_labels
+    self.counts = np.zeros((num_labels, num_labels), dtype=np.int64)
+
+  def update(self, y, preds):
+    # A single bincount over the flattened (gold, predicted) cell index counts the whole batch.
+    cells = y.ravel().astype(np.intp) * self.num_labels + preds.ravel()
+    self.counts += np.bincount(cells, minlength=self.num_labels ** 2).reshape(self.num_labels, self.num_labels)
+
+  def num_examples(self):
+    return int(self.counts.sum())
+
+  def accuracy(self):
+    return np.trace(self.counts) / self.num_examples() * 100.
+
+  def per_class_accuracy(self):  # Recall of each gold label, in percent
+    return np.diag(self.counts) / np.maximum(self.counts.sum(axis=1), 1) * 100.
+
+  def per_class_precision(self):  # Fraction of the predictions of each label that are correct, in percent
+    return np.diag(self.counts) / np.maximum(self.counts.sum(axis=0), 1) * 100.
+
+  def row_normalized(self):  # Each row sums to 100
+    return self.counts / np.maximum(self.counts.sum(axis=1, keepdims=True), 1) * 100.
+
+def evaluate(model, dataset_eval, batch_size_eval=None):
+  # By default the whole split is scored in one large batch (one matmul); pass batch_size_eval to bound memory.
+  batch_size_eval = batch_size_eval or dataset_eval.num_examples()
+  normalized = dataset_eval.is_normalized_for(model)
+  confusion_matrix = ConfusionMatrix(model.W.shape[1])
+  for X, y in dataset_eval.generate_batch(batch_size_eval, normalized=normalized):
+    confusion_matrix.update(y, model.predict(X, normalized=normalized))
+  return confusion_matrix
+
+def evaluate_accuracy(model, dataset_eval, batch_size_eval=None):
+  return evaluate(model, dataset_eval, batch_size_eval).accuracy()
+
+def train(dataset_train, dataset_val, learning_rate=0.1, init_range=0., batch_size=16, regularization_weight=0., max_num_epochs=10, seed=42, loss_improvement=0.01, decay=2., tolerance=5, verbose=False, dtype=np.float64, cache_dir=None, optimizer_type='sgd', optimizer_options=None, timer=None):
+  timer = timer or NullPhaseTimer()
+  set_seed(seed)  
+  model = LinearClassifier(dataset_train.inputs, 10, init_range=init_range, dtype=dtype)  
+  optimizer = optimizer_types[optimizer_type](model, learning_rate, **(optimizer_options or {}))
+
+  # Normalize once up front (a no-op if already done with the same statistics, e.g. earlier in a sweep).
+  dataset_train.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+  dataset_val.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+
+  best_acc_val = float('-inf')
+  best_W = None
+  num_continuous_fails = 0
+  loss_avg_before = None
+
+  if verbose:
+    print('Num parameters {:d}'.format(model.num_parameters()))
+    print('Batch size {:d}, learning rate {:.5f}, regularization_weight {:.5f}'.format(batch_size, learning_rate, regularization_weight))
+
+  timer.reset()
+  for epoch in range(max_num_epochs):
+    loss_total = 0.
+    num_correct = 0    
+
+    for X, y in timer.timed(dataset_train.generate_batch(batch_size, normalized=True)):  # Shuffled in each epoch
+      with timer.phase('forward'):  # Includes the gradient, which forward computes in the same pass
+        loss_sum, scores = model.forward(X, y, regularization_weight, normalized=True)
+        loss_total += loss_sum
+        preds = np.argmax(scores, axis=1)[:, np.newaxis]
+        num_correct += np.sum(preds == y)
+
+      with timer.phase('update'):
+        optimizer.step()
+        optimizer.zero_grad()
+
+    loss_avg = loss_total / dataset_train.num_examples()
+    acc_train = num_correct / dataset_train.num_examples() * 100. 
+    with timer.phase('evaluation'):
+      acc_val = evaluate_accuracy(model, dataset_val)
+    timer.end_iteration('train', epoch + 1, dataset_train.num_examples(), loss_avg=loss_avg, acc_train=acc_train, acc_val=acc_val)
+
+    if acc_val > best_acc_val:
+      num_continuous_fails = 0
+      best_acc_val = acc_val
+      best_W = copy.deepcopy(model.W)
+    else:
+      num_continuous_fails += 1
+      if num_continuous_fails > tolerance:
+        if verbose: 
+            print('Early stopping')
+        break
+
+    if loss_avg_before is not None:
+      if loss_avg_before - loss_avg < loss_improvement:  # Training loss has not improved sufficiently, decay the learning rate
+        optimizer.modify_lr(optimizer.lr / decay)
+        if verbose and decay != 1.0:
+          print('Decaying learning rate to {:.5f}'.format(optimizer.lr))
+    loss_avg_before = loss_avg 
+
+    if verbose:
+      print('End of epoch {:3d}:\t loss avg {:10.4f}\t acc train {:10.2f}\t acc val {:10.2f}'.format(
+          epoch + 1, loss_avg, acc_train, acc_val)) 
+
+  model.W = best_W
+  if verbose:
+    print('Best acc val: {:10.2f}'.format(best_acc_val))
+
+  return model, best_acc_val, loss_avg, acc_train
+
+def train_lbfgs(dataset_train, dataset_val, regularization_weight=0., init_range=0., max_num_iterations=100, tolerance=1e-5, seed=42, verbose=False, dtype=np.float64, cache_dir=None):
+  set_seed(seed)
+  model = LinearClassifier(dataset_train.inputs, 10, init_range=init_range, dtype=dtype)
+  X = dataset_train.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+  y = dataset_train.labels[:, np.newaxis]
+  dataset_val.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+
+  def loss_and_gradient(w):
+    model.W = w.reshape(model.W.shape).astype(dtype, copy=False)
+    loss_avg, W_grad = model.loss_and_gradient(X, y, regularization_weight, normalized=True)
+    return loss_avg, W_grad.ravel().astype(np.float64)
+
+  num_iterations = [0]
+  def report(w):
+    num_iterations[0] += 1
+    if verbose:
+      model.W = w.reshape(model.W.shape).astype(dtype)
+      print('Iteration {:3d}:\t acc val {:10.2f}'.format(num_iterations[0], evaluate_accuracy(model, dataset_val)))
+
+  from scipy.optimize import minimize
+  result = minimize(loss_and_gradient, model.W.ravel().astype(np.float64), jac=True, method='L-BFGS-B', callback=report,
+                    options={'maxiter': max_num_iterations, 'gtol': tolerance})
+  model.W = result.x.reshape(model.W.shape).astype(dtype)
+  model.zero_grad()
+
+  acc_train = np.mean(model.predict(X, normalized=True)[:, 0] == dataset_train.labels) * 100.
+  acc_val = evaluate_accuracy(model, dataset_val)
+  if verbose:
+    print('Converged after {:d} iterations ({:d} passes over the data): {:s}'.format(result.nit, result.nfev, str(result.message)))
+    print('Acc val: {:10.2f}'.format(acc_val))
+
+  return model, acc_val, result.fun, acc_train
+
+def train_many(dataset_train, dataset_val, regularization_weights, learning_rate=0.1, init_range=0., batch_size=16, max_num_epochs=10, seed=42, loss_improvement=0.01, decay=2., tolerance=5, verbose=False, dtype=np.float64, cache_dir=None, batch_size_eval=1024, timer=None):
+  timer = timer or NullPhaseTimer()
+  set_seed(seed)
+  model = LinearClassifier(dataset_train.inputs, 10, init_range=init_range, dtype=dtype)  # Same initialization as train
+  dataset_train.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+  dataset_val.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+
+  num_configs = len(regularization_weights)
+  la = np.asarray(regularization_weights, dtype=dtype)  # (C,)
+  lr = np.broadcast_to(np.asarray(learning_rate, dtype=np.float64), (num_configs,)).copy()  # (C,), one per config
+  W = np.repeat(model.W[np.newaxis, :, :], num_configs, axis=0)  # (C, dim, num_labels)
+
+  active = np.ones(num_configs, dtype=bool)
+  best_acc_val = np.full(num_configs, float('-inf'))
+  best_W = W.copy()
+  num_continuous_fails = np.zeros(num_configs, dtype=int)
+  loss_avg_before = np.full(num_configs, np.nan)
+  loss_avg = np.zeros(num_configs)
+  acc_train = np.zeros(num_configs)
+
+  timer.reset()
+  for epoch in range(max_num_epochs):
+    configs = np.flatnonzero(active)
+    W_active = W[configs]  # (C', dim, num_labels), written back at the end of the epoch
+    la_active = la[configs][:, np.newaxis, np.newaxis]
+    lr_active = lr[configs][:, np.newaxis, np.newaxis]
+    loss_total = np.zeros(len(configs))
+    num_correct = np.zeros(len(configs), dtype=int)
+
+    for X, y in timer.timed(dataset_train.generate_batch(batch_size, normalized=True)):  # Shuffled in each epoch
+      with timer.phase('forward'):
+        rows = np.arange(X.shape[0])
+        scores = np.matmul(X, W_active)  # (C', batch_size, num_labels)
+        rowwise_max = np.amax(scores, axis=2, keepdims=True)
+        probs = np.exp(scores - rowwise_max)
+        normalizers = np.sum(probs, axis=2, keepdims=True)
+        probs /= normalizers
+
+        # Same loss and gradient as LinearClassifier.forward, for all configurations at once.
+        negative_log_probs = (rowwise_max + np.log(normalizers))[:, :, 0] - scores[:, rows, y[:, 0]]  # (C', batch_size)
+        squared_norm_W = np.sum(W_active[:, 1:, :] ** 2, axis=(1, 2))
+        loss_total += np.sum(negative_log_probs, axis=1) + la_active[:, 0, 0] * squared_norm_W
+        num_correct += np.sum(np.argmax(scores, axis=2) == y[:, 0], axis=1)
+
+      with timer.phase('gradient'):
+        probs[:, rows, y[:, 0]] -= 1.
+        probs *= 1. / X.shape[0]
+        W_grad = np.matmul(X.T, probs)  # (C', dim, num_labels)
+        W_grad[:, 1:, :] += (2. * la_active) * W_active[:, 1:, :]
+
+      with timer.phase('update'):
+        W_active -= lr_active * W_grad
+
+    with timer.phase('evaluation'):
+      num_correct_val = np.zeros(len(configs), dtype=int)
+      for X, y in dataset_val.generate_batch(batch_size_eval, normalized=True):
+        num_correct_val += np.sum(np.argmax(np.matmul(X, W_active), axis=2) == y[:, 0], axis=1)
+
+    loss_avg[configs] = loss_total / dataset_train.num_examples()
+    acc_train[configs] = num_correct / dataset_train.num_examples() * 100. 
+    acc_val = num_correct_val / dataset_val.num_examples() * 100.
+    timer.end_iteration('train_many', epoch + 1, len(configs) * dataset_train.num_examples(), num_configs_active=len(configs), 
+                        acc_val_max=acc_val.max())
+    W[configs] = W_active
+
+    improved = acc_val > best_acc_val[configs]
+    best_acc_val[configs[improved]] = acc_val[improved]
+    best_W[configs[improved]] = W_active[improved]
+    num_continuous_fails[configs[improved]] = 0
+    num_continuous_fails[configs[~improved]] += 1
+    stopped = num_continuous_fails[configs] > tolerance
+    active[configs[stopped]] = False
+
+    # Training loss has not improved sufficiently, decay the learning rate (of configurations still training).
+    configs = configs[~stopped]
+    lr[configs[loss_avg_before[configs] - loss_avg[configs] < loss_improvement]] /= decay
+    loss_avg_before[configs] = loss_avg[configs]
+
+    if verbose:
+      print('End of epoch {:3d}:\t {:d}/{:d} configurations still training\t best acc val {:10.2f}'.format(
+          epoch + 1, active.sum(), num_configs, best_acc_val.max())) 
+    if not active.any():
+      break
+
+  results = []
+  for c in range(num_configs):
+    model_c = copy.deepcopy(model)
+    model_c.W = best_W[c]
+    results.append((model_c, float(best_acc_val[c]), float(loss_avg[c]), float(acc_train[c])))
+  return results
+
+def train_config(split_train, regularization_weights, config):  # Runs in a sweep worker
+  dataset_train = MNISTDataset(split_train, inputs=shared_arrays['inputs_train'], labels=shared_arrays['labels_train'])
+  dataset_val = MNISTDataset('val', inputs=shared_arrays['inputs_val'], labels=shared_arrays['labels_val'])
+  results = train_many(dataset_train, dataset_val, regularization_weights, **config)
+  return max(acc_val for _, acc_val, _, _ in results), results
+
+def sweep(dataset_train, dataset_val, regularization_weights, configs, num_workers=None):
+  arrays = {'inputs_train': dataset_train.inputs, 'labels_train': dataset_train.labels,
+            'inputs_val': dataset_val.inputs, 'labels_val': dataset_val.labels}
+  evaluate = functools.partial(train_config, dataset_train.split, regularization_weights)
+  return run_sweep(evaluate, configs, arrays, num_workers=num_workers)
+
+def data_parallel_worker(connection, paths, worker, regularization_weight):
+  features = np.load(paths['features'], mmap_mode='r')
+  labels = np.load(paths['labels'], mmap_mode='r')
+  inds = np.load(paths['inds'], mmap_mode='r')  # Current epoch's shuffled order, written by the main process
+  model = LinearClassifier.__new__(LinearClassifier)  # Computes gradients on the shared W without statistics of its own
+  model.W = np.load(paths['W'], mmap_mode='r')
+  model.W_grad = np.load(paths['W_grads'], mmap_mode='r+')[worker]
+  model.dtype = model.W.dtype
+  model.probs_buffer = np.empty((0, model.W.shape[1]), dtype=model.dtype)
+  while True:
+    shard = connection.recv()
+    if shard is None:
+      break
+    start, stop = shard
+    X = features[inds[start:stop]]
+    y = labels[inds[start:stop], np.newaxis]
+    model.zero_grad()
+    loss_sum, scores = model.forward(X, y, regularization_weight, normalized=True)
+    num_correct = np.sum(np.argmax(scores, axis=1)[:, np.newaxis] == y)
+    connection.send((loss_sum, num_correct))
+
+def train_data_parallel(dataset_train, dataset_val, num_workers=2, learning_rate=0.1, init_range=0., batch_size=16, regularization_weight=0., max_num_epochs=10, seed=42, loss_improvement=0.01, decay=2., tolerance=5, verbose=False, dtype=np.float64, cache_dir=None, optimizer_type='sgd', optimizer_options=None, timer=None):
+  timer = timer or NullPhaseTimer()
+  set_seed(seed)  
+  model = LinearClassifier(dataset_train.inputs, 10, init_range=init_range, dtype=dtype)  
+  dataset_train.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+  dataset_val.normalize(model.mu, model.sigma, dtype=dtype, cache_dir=cache_dir)
+
+  with tempfile.TemporaryDirectory() as directory:
+    paths = share_arrays({'features': dataset_train.features, 'labels': dataset_train.labels}, directory)
+    for name, shape in [('inds', (dataset_train.num_examples(),)), ('W', model.W.shape), ('W_grads', (num_workers,) + model.W.shape)]:
+      paths[name] = os.path.join(directory, name + '.npy')
+      np.lib.format.open_memmap(paths[name], mode='w+', dtype=np.intp if name == 'inds' else dtype, shape=shape)
+    inds = np.load(paths['inds'], mmap_mode='r+')
+    W_grads = np.load(paths['W_grads'], mmap_mode='r')
+    W = np.load(paths['W'], mmap_mode='r+')
+    W[:] = model.W
+    model.W = W  # The optimizer updates the shared W in place
+    optimizer = optimizer_types[optimizer_type](model, learning_rate, **(optimizer_options or {}))
+
+    connections, workers = [], []
+    for worker in range(num_workers):
+      connection, connection_worker = multiprocessing.Pipe()
+      process = multiprocessing.Process(target=data_parallel_worker, args=(connection_worker, paths, worker, regularization_weight), daemon=True)
+      process.start()
+      connection_worker.close()  # So that recv raises EOFError instead of blocking if the worker dies
+      connections.append(connection)
+      workers.append(process)
+
+    try:
+      best_acc_val = float('-inf')
+      best_W = None
+      num_continuous_fails = 0
+      loss_avg_before = None
+
+      if verbose:
+        print('Num parameters {:d}, {:d} workers'.format(model.num_parameters(), num_workers))
+        print('Batch size {:d}, learning rate {:.5f}, regularization_weight {:.5f}'.format(batch_size, learning_rate, regularization_weight))
+
+      timer.reset()
+      for epoch in range(max_num_epochs):
+        loss_total = 0.
+        num_correct = 0    
+        with timer.phase('data'):
+          inds[:] = epoch_permutation(dataset_train.num_examples())  # The order train's EpochShuffler draws
+
+        for start in range(0, dataset_train.num_examples(), batch_size):
+          stop = min(start + batch_size, dataset_train.num_examples())
+          with timer.phase('forward'):  # Workers gather their shards and compute the loss and gradient
+            shards = [(shard[0], shard[-1] + 1) for shard in np.array_split(np.arange(start, stop), num_workers) if len(shard) > 0]
+            for connection, shard in zip(connections, shards):
+              connection.send(shard)
+            results = [connection.recv() for connection in connections[:len(shards)]]
+
+          with timer.phase('gradient'):
+            # Each shard's loss includes the regularization term, count it once as in train.
+            squared_norm_W = np.linalg.norm(model.W[1:, :], 'fro') ** 2
+            loss_total += sum(loss_sum for loss_sum, _ in results) - (len(shards) - 1) * regularization_weight * squared_norm_W
+            num_correct += sum(num_correct_shard for _, num_correct_shard in results)
+            for worker, (shard_start, shard_stop) in enumerate(shards):
+              model.W_grad += ((shard_stop - shard_start) / (stop - start)) * W_grads[worker]
+
+          with timer.phase('update'):
+            optimizer.step()
+            optimizer.zero_grad()
+
+        loss_avg = loss_total / dataset_train.num_examples()
+        acc_train = num_correct / dataset_train.num_examples() * 100. 
+        with timer.phase('evaluation'):
+          acc_val = evaluate_accuracy(model, dataset_val)
+        timer.end_iteration('train_data_parallel', epoch + 1, dataset_train.num_examples(), loss_avg=loss_avg, acc_train=acc_train, acc_val=acc_val)
+
+        if acc_val > best_acc_val:
+          num_continuous_fails = 0
+          best_acc_val = acc_val
+          best_W = np.array(model.W)
+        else:
+          num_continuous_fails += 1
+          if num_continuous_fails > tolerance:
+            if verbose: 
+                print('Early stopping')
+            break
+
+        if loss_avg_before is not None:
+          if loss_avg_before - loss_avg < loss_improvement:  # Training loss has not improved sufficiently, decay the learning rate
+            optimizer.modify_lr(optimizer.lr / decay)
+            if verbose and decay != 1.0:
+              print('Decaying learning rate to {:.5f}'.format(optimizer.lr))
+        loss_avg_before = loss_avg 
+
+        if verbose:
+          print('End of epoch {:3d}:\t loss avg {:10.4f}\t acc train {:10.2f}\t acc val {:10.2f}'.format(
+              epoch + 1, loss_avg, acc_train, acc_val)) 
+    finally:
+      for connection, process in zip(connections, workers):
+        if process.is_alive():
+          try:
+            connection.send(None)
+          except (BrokenPipeError, ConnectionResetError):  # Died since, don't hide the error being raised
+            pass
+      for process in workers:
+        process.join(timeout=5.)
+        if process.is_alive():
+          process.terminate()
+          process.join()
+
+  model.W = best_W
+  if verbose:
+    print('Best acc val: {:10.2f}'.format(best_acc_val))
+
+  return model, best_acc_val, loss_avg, acc_train
+
+def visualize_model(model):
+  import matplotlib.pyplot as plt
+  fig = plt.figure(figsize=(20,10))
+  for label in range(10):
+    plt.subplot(2, 5, label + 1)
+    plt.imshow(model.W[1:, label].reshape(28, 28))
+    plt.title('Label {:d}'.format(label))
+    plt.colorbar()
+  plt.show()
+
+def build_confusion_matrix(model, dataset_val, batch_size_eval=None):
+  return evaluate(model, dataset_val, batch_size_eval).row_normalized()
+
+def plot_confusion_matrix(model, dataset_val, batch_size_eval=None):
+  import matplotlib.pyplot as plt
+  import pandas
+  import seaborn
+  labels = [str(digit) for digit in range(10)]
+  df = pandas.DataFrame(build_confusion_matrix(model, dataset_val, batch_size_eval), index=labels, columns=labels)
+  plt.figure(figsize = (15,10))
+  return seaborn.heatmap(df, annot=True)
+
+def compare_quantized(model, dataset_eval, chunk_size=65536):
+  model_folded = model.fold()
+  model_quantized = model_folded.quantize()
+  confusion_matrix, confusion_matrix_quantized = ConfusionMatrix(model.W.shape[1]), ConfusionMatrix(model.W.shape[1])
+  num_agreements = 0
+  for start in range(0, dataset_eval.num_examples(), chunk_size):
+    X, y = dataset_eval.inputs[start:start + chunk_size], dataset_eval.labels[start:start + chunk_size]
+    preds, preds_quantized = model_folded.predict(X), model_quantized.predict(X)
+    confusion_matrix.update(y, preds)
+    confusion_matrix_quantized.update(y, preds_quantized)
+    num_agreements += np.sum(preds == preds_quantized)
+  return {'acc': confusion_matrix.accuracy(), 'acc_quantized': confusion_matrix_quantized.accuracy(), 
+          'agreement': num_agreements / dataset_eval.num_examples() * 100., 
+          'weight_bytes': model_folded.W.nbytes, 'weight_bytes_quantized': model_quantized.W_quantized.nbytes}
+
+def create_kaggle_submission(model, dataset_test, netid, path=None, chunk_size=65536):
+  if path is None:
+    path = '/content/drive/My Drive/cs461hw2_{:s}.csv'.format(netid)
+  model_folded = model.fold()  # Scores raw pixels directly
+  with open(path, 'w') as f:
+    f.write('id,category\n')  # Header
+    for start in range(0, dataset_test.num_examples(), chunk_size):  # Not shuffled
+      preds = model_folded.predict(dataset_test.inputs[start:start + chunk_size])[:, 0]
+      write_predictions(f, preds, start)
+
+def save_model(model, path):
+  if isinstance(model, LinearClassifier):
+    save_arrays(path, 'LinearClassifier', {'W': model.W, 'mu': model.mu, 'sigma': model.sigma})
+  elif isinstance(model, FoldedLinearClassifier):
+    save_arrays(path, 'FoldedLinearClassifier', {'W': model.W, 'b': model.b})
+  elif isinstance(model, QuantizedLinearClassifier):
+    save_arrays(path, 'QuantizedLinearClassifier', {'W_quantized': model.W_quantized, 'scale': model.scale, 'b': model.b})
+  else:
+    raise ValueError('Unknown model type: ' + type(model).__name__)
+
+def load_model(path, mmap_mode='r'):  # Pass mmap_mode=None to get writable arrays (e.g. to keep training)
+  model_type, arrays, _ = load_arrays(path, mmap_mode=mmap_mode)
+  if model_type == 'LinearClassifier':
+    model = LinearClassifier.__new__(LinearClassifier)  # Statistics are loaded rather than computed from training data
+    model.W, model.mu, model.sigma = arrays['W'], arrays['mu'], arrays['sigma']
+    model.dim, num_labels = model.W.shape
+    model.dtype = model.W.dtype
+    model.W_grad = np.zeros((model.dim, num_labels), dtype=model.dtype)
+    model.probs_buffer = np.empty((0, num_labels), dtype=model.dtype)
+    return model
+  if model_type == 'FoldedLinearClassifier':
+    return FoldedLinearClassifier(arrays['W'], arrays['b'])
+  if model_type == 'QuantizedLinearClassifier':
+    return QuantizedLinearClassifier(arrays['W_quantized'], arrays['scale'], arrays['b'])
+  raise ValueError('Unknown model type: ' + model_type)
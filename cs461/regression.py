@@ -0,0 +1,231 @@
+"""
+Predicting Boston housing prices with regression: polynomial feature expansion, linear regression fit 
+exactly or by gradient descent on the squared or asymmetric squared loss, sweeps over feature sets, 
+and saving/loading models.
+"""
+
+import numpy as np
+
+from .utils import NullPhaseTimer, run_sweep, shared_arrays, save_arrays, load_arrays
+
+
+def load_boston(seed=54321):
+  """
+  Loads the Boston housing data (from scikit-learn versions that still ship it), shuffles it with the given 
+  seed, and splits it 70/15/15. Returns (X_train, y_train, X_val, y_val, X_test, y_test).
+  """
+  import sklearn.datasets
+  boston_dataset = sklearn.datasets.load_boston()
+  np.random.seed(seed)  # Because the data is so small, different data randomizations may yield greatly different results.
+  shuffled_row_indices = np.random.permutation(boston_dataset.data.shape[0])
+  X_boston, y_boston = boston_dataset.data[shuffled_row_indices, :], boston_dataset.target[shuffled_row_indices]
+
+  num_examples_train = int(X_boston.shape[0] * 0.7)
+  num_examples_val = int(X_boston.shape[0] * 0.15)
+  end_val = num_examples_train + num_examples_val
+  return (X_boston[:num_examples_train], y_boston[:num_examples_train], X_boston[num_examples_train:end_val], 
+          y_boston[num_examples_train:end_val], X_boston[end_val:], y_boston[end_val:])
+
+def polynomial_expansion(X, degrees, mu=None, sigma=None):
+  """
+    Input:
+      X (N, d): Training data, each row is a d-dimensional input vector 
+      degrees: List of degrees specifying the polynomial expansion
+      mu (D,): Feature means for normalization
+      sigma (D,): Feature standard deviations for normalization
+
+    Output:
+      X_new (N, D): Training data after expansion and normalization 
+      mu (D,): See Input, if None is passed this is computed
+      sigma (D,): See Input, if None is passsed this is computed
+      X_new_unnormalized (N, D): Training data after expansion before normalization (for sanity check)
+  """
+  N, d = X.shape
+
+  # Calculate the dimension of the transformed feature vector phi(x)
+  D = (len(degrees) - 1) * d + 1 if 0 in degrees else len(degrees) * d
+
+  X_new_unnormalized = np.empty([N, D])
+  if 0 in degrees:
+    X_new_unnormalized[:, 0] = 1
+    column = 1
+  else:
+    column = 0  # Track current column position
+
+  for degree in degrees:
+    if degree != 0:
+      new_features = X ** degree  # (N, d)
+      X_new_unnormalized[:, column:column + d] = new_features  # Populate the next d columns              
+      column += d
+
+  # Normalize features (independently).
+  if mu is None or sigma is None:
+    mu = X_new_unnormalized.mean(0)
+    sigma = X_new_unnormalized.std(0)
+    sigma[sigma < 0.0001] = 1  # If the feature is constant, variance is zero. Avoid division by zero
+
+  X_new = (X_new_unnormalized - mu) / sigma
+  if 0 in degrees:
+    X_new[:, 0] = 1  # We don't normalize the bias dimension.
+
+  return X_new, mu, sigma, X_new_unnormalized
+
+class LinearRegressor:
+
+  def __init__(self, X_train=None, y_train=None, degrees=(0, 1)):
+    self.w = None  # Parameter
+    self.mu = None  # Feature means (computed from training data)
+    self.sigma = None  # Feature standard deviations (computed from training data)
+    self.degrees = degrees
+
+    # If given training data at initialization, compute the closed-form LSE.
+    if X_train is not None and y_train is not None:
+      X_train_new = self.feature_transform(X_train, train=True)
+      self.w = np.dot(np.linalg.pinv(X_train_new), y_train) 
+
+  def feature_transform(self, X, train=False):
+    if train: 
+      X_new, mu, sigma, _ = polynomial_expansion(X, self.degrees)
+      self.mu = mu
+      self.sigma = sigma
+    else:
+      assert self.mu is not None and self.sigma is not None
+      X_new = polynomial_expansion(X, self.degrees, self.mu, self.sigma)[0]
+
+    return X_new
+
+  def predict(self, X):
+    assert self.w is not None 
+    X_new = self.feature_transform(X)
+    preds = np.dot(X_new, self.w)
+    return preds
+
+  def squared_loss(self, X, y):
+    preds = self.predict(X)
+    errors = y - np.squeeze(preds) 
+    squared_loss = np.mean(errors ** 2)  # Average squared difference
+    return squared_loss
+
+class TrueModel:
+
+  def __init__(self): 
+    self.true_mapping = lambda x: np.sin(x * 1.7) + .1 * x ** 2 + 3
+    self.true_standard_deviation = 0.3
+
+  def sample(self, num_samples, left_end=-2, right_end=2):
+    # Get evenly separated inputs then jitter 'em. 
+    X_clean = np.linspace(left_end, right_end, num_samples)
+    noise_x = np.random.uniform(-.1, .1, X_clean.shape)
+    X = np.expand_dims(X_clean + noise_x, axis=1)
+
+    # Generate labels according to the true model.
+    y_clean = self.true_mapping(X)
+    noise_y = np.random.normal(0, self.true_standard_deviation, y_clean.shape)
+    y = np.squeeze(y_clean + noise_y)
+
+    return X, y   
+
+  def visualize_samples(self, num_samples, left_end=-2, right_end=2):
+    import matplotlib.pyplot as plt
+    X, y = self.sample(num_samples, left_end, right_end)
+    plt.plot(X, y, 'r*')
+    plt.xlabel('x')
+    plt.ylabel('y')
+
+    # Also plot the true mapping over dense x-axis ticks
+    xticks = np.expand_dims(np.arange(left_end, right_end, 0.01), axis=1)
+    plt.plot(xticks, self.true_mapping(xticks), 'r:')
+
+def squared_loss_and_gradient(X, y, w, no_grad=False):  # Expects X already feature transformed
+  preds = np.dot(X, w)
+  errors = y - np.squeeze(preds) 
+  loss = np.mean(errors **2)
+  if no_grad:
+    return loss
+  else: 
+    grad = - 2 * np.mean(X * np.expand_dims(errors, axis=1), axis=0)
+    return loss, grad.reshape(w.shape)
+
+def gradient_descent(model, X_train, y_train, loss_and_gradient, X_val=None, y_val=None, lr=0.01, num_steps_max=10000, patience=10, timer=None):
+  timer = timer or NullPhaseTimer()
+  X_train_new = model.feature_transform(X_train, train=True)  
+  has_val = X_val is not None and y_val is not None
+  if has_val:
+    X_val_new = model.feature_transform(X_val)
+  model.w = np.zeros((X_train_new.shape[1]))  # Parameter initialized as a zero vector
+  losses = []  # Let's keep track of training loss
+  loss_val_best = float('inf')
+  death_count = 0
+
+  timer.reset()
+  for t in range(num_steps_max):
+    with timer.phase('gradient'):  # Includes the forward pass
+      loss, grad = loss_and_gradient(X_train_new, y_train, model.w)  # Generic function that returns loss/gradient at current w 
+    losses.append(loss)
+
+    with timer.phase('update'):
+      model.w = model.w - lr*grad
+
+    # Early stop once the validation loss hasn't improved for patience steps (without validation data, run all steps).
+    loss_val = None
+    if has_val:
+      with timer.phase('evaluation'):
+        loss_val = loss_and_gradient(X_val_new, y_val, model.w, no_grad=True)
+    timer.end_iteration('gradient_descent', t + 1, X_train_new.shape[0], loss_train=loss, loss_val=loss_val)
+    if not has_val:
+      continue
+    if loss_val < loss_val_best :
+      loss_val_best = loss_val
+      death_count = 0
+
+    if death_count > patience :
+      break
+
+    else :
+      death_count = death_count + 1
+
+  # Compute training loss and validation loss of the trained model
+  loss_train = loss_and_gradient(X_train_new, y_train, model.w, no_grad=True)
+  loss_val = loss_and_gradient(X_val_new, y_val, model.w, no_grad=True) if has_val else None
+
+  return losses, loss_train, loss_val
+
+def asymmetric_squared_loss_and_gradient(X, y, w, no_grad=False, alpha=0.05):  # Expects X already feature transformed
+  preds = np.dot(X, w)
+  errors = y - np.squeeze(preds) 
+  weighted_errors = np.where(errors > 0, alpha, 1.) * errors  # Underestimates (preds < y) are weighted by alpha
+  loss = np.mean(weighted_errors * errors)
+  if no_grad:
+    return loss
+  else: 
+    grad = - 2 * np.mean(X * np.expand_dims(weighted_errors, axis=1), axis=0)
+    return loss, grad.reshape(w.shape)
+
+def aloss(alpha):
+    return lambda X, y, w, no_grad=False: asymmetric_squared_loss_and_gradient(X, y, w, no_grad=no_grad, alpha=alpha)
+
+def fit_feature_set(config):  # Runs in a sweep worker
+  # Losses are picked by name here since lambdas (e.g. from aloss) can't be sent to a worker.
+  loss_and_gradient = squared_loss_and_gradient if config.get('alpha') is None else aloss(config['alpha'])
+  model = LinearRegressor(degrees=config['degrees'])
+  losses, loss_train, loss_val = gradient_descent(model, shared_arrays['X_train'], shared_arrays['y_train'], loss_and_gradient, 
+                                                  shared_arrays['X_val'], shared_arrays['y_val'])
+  return -loss_val, (model, len(losses), loss_train, loss_val)
+
+def sweep_feature_sets(X_train, y_train, X_val, y_val, configs, num_workers=None):
+  arrays = {'X_train': X_train, 'y_train': y_train, 'X_val': X_val, 'y_val': y_val}
+  return run_sweep(fit_feature_set, configs, arrays, num_workers=num_workers)
+
+def save_model(model, path):
+  if isinstance(model, LinearRegressor):
+    save_arrays(path, 'LinearRegressor', {'w': model.w, 'mu': model.mu, 'sigma': model.sigma}, degrees=list(model.degrees))
+  else:
+    raise ValueError('Unknown model type: ' + type(model).__name__)
+
+def load_model(path, mmap_mode='r'):
+  model_type, arrays, attributes = load_arrays(path, mmap_mode=mmap_mode)
+  if model_type == 'LinearRegressor':
+    model = LinearRegressor(degrees=tuple(attributes['degrees']))
+    model.w, model.mu, model.sigma = arrays['w'], arrays['mu'], arrays['sigma']
+    return model
+  raise ValueError('Unknown model type: ' + model_type)
@@ -0,0 +1,744 @@
+"""
+Spam detection with decision trees: Gini stumps, depth-limited trees, AdaBoost ensembles, tuning over 
+tree sizes, and saving/loading models as flat arrays. Examples are (x, y) pairs with labels in {+1, -1}.
+"""
+
+import heapq
+import os
+import pickle
+import random
+from collections import deque
+
+import numpy as np
+
+from .utils import NullPhaseTimer, set_seed, run_sweep, shared_arrays, save_arrays, load_arrays, write_predictions
+
+DATADIR = '/content/drive/My Drive/data/spam/'  # Where load_data looks for the .pkl splits by default
+
+
+def gini_impurity(distribution):  
+  # distribution: [p_1 ... p_L] such that p_l >= 0 and sum_{l=1}^L p_l = 1
+
+  return distribution[0] * distribution[1]
+
+def compute_split_loss(total1, total2, positive1, positive2):
+  positive1_prob = positive1 / total1 if total1 > 0. else 0.5
+  positive2_prob = positive2 / total2 if total2 > 0. else 0.5
+  impurity1 = gini_impurity([1 - positive1_prob, positive1_prob])
+  impurity2 = gini_impurity([1 - positive2_prob, positive2_prob])
+  impurity = total1 * impurity1 + total2 * impurity2
+  return impurity
+
+def compute_split_losses(total1, total2, positive1, positive2):  # compute_split_loss on arrays of partitions
+  positive1_prob = np.divide(positive1, total1, out=np.full(np.shape(total1), 0.5), where=total1 > 0.)
+  positive2_prob = np.divide(positive2, total2, out=np.full(np.shape(total2), 0.5), where=total2 > 0.)
+  impurity1 = gini_impurity([1 - positive1_prob, positive1_prob])
+  impurity2 = gini_impurity([1 - positive2_prob, positive2_prob])
+  return total1 * impurity1 + total2 * impurity2
+
+def cumulative_weights_sorted(weights, labels):  # Total and positive label weight of examples 0...j for every j
+  weights = np.asarray(weights, dtype=np.float64)
+  return np.cumsum(weights, axis=-1), np.cumsum(np.where(np.asarray(labels) == 1, weights, 0.), axis=-1)
+
+def split_losses_sorted(values, weights, labels):  # O(N)
+  """
+  Computes the loss of every split of a feature at once, given the feature values in nondecreasing order along with the 
+  weights and labels (+1 or -1) of the corresponding examples. Entry j is the loss of putting examples 0...j on the left, 
+  and is inf unless values j and j + 1 differ. Works along the last axis, e.g. on (d, N) arrays with a feature per row.
+  """
+  return split_losses_cumulative(values, *cumulative_weights_sorted(weights, labels))
+
+def split_losses_cumulative(values, cumulative_weights, cumulative_weights_positive):  # From cumulative_weights_sorted
+  values = np.asarray(values)
+  total1, positive1 = cumulative_weights[..., :-1], cumulative_weights_positive[..., :-1]
+  total2 = cumulative_weights[..., -1:] - total1
+  positive2 = cumulative_weights_positive[..., -1:] - positive1
+  losses = compute_split_losses(total1, total2, positive1, positive2)
+
+  losses[values[..., 1:] == values[..., :-1]] = np.inf  # Effective partitions only fall between distinct values
+  return losses
+
+def best_split_sorted(values, weights, labels):  # O(N)
+  """
+  Computes the best threshold on a single feature according to Gini impurity, given the feature values in nondecreasing 
+  order along with the weights and labels (+1 or -1) of the corresponding examples. 
+  Returns (threshold, loss), which is (None, float('inf')) if all values are equal.
+  """
+  values = np.asarray(values)
+  losses = split_losses_sorted(values, weights, labels)
+  j = np.argmin(losses) if len(losses) > 0 else None  # The first best partition, as in a loop with a strict comparison
+  if j is None or losses[j] == np.inf:
+    return None, float('inf')
+  return float(values[j] + values[j + 1]) / 2., float(losses[j])
+
+def fit_stump(data, weights=None, indices=None):  # O(dN)
+  """
+  Computes the best split on a dataset of N (input, label) pairs according to Gini impurity where the label is either +1 or -1.
+  Each example is weighted by some nonnegative weight value (1.0 if None).
+  Only the examples included in the list of indices are considered (all if None). 
+  """
+  if weights is None:
+    weights = np.ones(len(data))
+  assert len(weights) == len(data)  
+  assert (weights >= 0).all()
+
+  if indices is None:
+    indices = list(range(len(data)))
+
+  feature_best = None
+  threshold_best = None
+  loss_best = float('inf')
+
+  for feature in range(len(data[0][0])):
+    # Sorting indices so that feature values are nondecreasing. 
+    indices_sorted = sorted(indices, key=lambda i: data[i][0][feature])
+    threshold, loss = best_split_sorted([data[i][0][feature] for i in indices_sorted], [weights[i] for i in indices_sorted], 
+                                        [data[i][1] for i in indices_sorted])
+    if loss < loss_best:
+      feature_best, threshold_best, loss_best = feature, threshold, loss
+
+  # May return (None, None, float('inf')) if no split can be found (e.g., has one feature group for every dimension).
+  return feature_best, threshold_best, loss_best
+
+class FeatureIndex:
+  """
+  Columnar copy of a dataset of N (input, label) pairs for fitting trees. Every feature is argsorted once, and a 
+  subset of examples is represented by a (d, n) array whose row f lists them in nondecreasing order of feature f. 
+  Splitting a node filters these rows (which keeps them sorted) instead of sorting again, and one index can be 
+  shared by every tree fit on the same data (e.g. all rounds of adaboost).
+  """
+
+  def __init__(self, data):
+    self.inputs = np.array([x for x, _ in data], dtype=np.float64)  # (N, d)
+    self.labels = np.array([y for _, y in data])  # (N,)
+    self.order = np.ascontiguousarray(np.argsort(self.inputs, axis=0, kind='stable').T)  # (d, N)
+    self.goes_left = np.zeros(len(self.labels), dtype=bool)  # Scratch space for partition
+    self.scratch_indices = np.empty((2, self.order.size), dtype=np.intp)  # Scratch space for partition
+    self.scratch_mask = np.empty((2, self.order.size), dtype=bool)
+
+  def sorted_indices(self, indices=None):  # Reference for tests, fitting starts from a copy of self.order
+    """(d, n): the given examples (all if None) in sorted order for every feature."""
+    if indices is None:
+      return self.order
+    mask = np.zeros(len(self.labels), dtype=bool)
+    mask[indices] = True
+    return self.order[mask[self.order]].reshape(self.order.shape[0], -1)
+
+  def split(self, indices_sorted, feature, threshold):  # Reference for tests, fitting uses partition
+    """Stable partition into (left, right), both still sorted. Allocates several (d, n) arrays."""
+    goes_left = self.inputs[indices_sorted, feature] <= threshold  # (d, n), every row has the same n examples
+    num_features = indices_sorted.shape[0]
+    return indices_sorted[goes_left].reshape(num_features, -1), indices_sorted[~goes_left].reshape(num_features, -1)
+
+  def partition(self, order, start, end, feature, threshold):  # Stable split of order[:, start:end] in place
+    """
+    Same as split on the examples in columns start:end of order (initially a copy of self.order), but rearranges 
+    these columns in place into the left examples followed by the right ones, and returns where the right ones start. 
+    Works in the scratch buffers allocated once in __init__, so nothing of size O(dn) is allocated per node.
+    """
+    num_features, size = order.shape[0], order.shape[0] * (end - start)
+    middle = start + int(np.searchsorted(self.inputs[order[feature, start:end], feature], threshold, side='right'))  # Row feature is sorted
+    self.goes_left[order[feature, start:middle]] = True
+    self.goes_left[order[feature, middle:end]] = False
+    segment, result = self.scratch_indices[0, :size], self.scratch_indices[1, :size]
+    goes_left, goes_right = self.scratch_mask[0, :size], self.scratch_mask[1, :size]
+    np.copyto(segment.reshape(num_features, -1), order[:, start:end])  # Contiguous, row by row
+    np.take(self.goes_left, segment, out=goes_left)
+    np.logical_not(goes_left, out=goes_right)
+    size_left = num_features * (middle - start)
+    np.compress(goes_left, segment, out=result[:size_left])
+    np.compress(goes_right, segment, out=result[size_left:])
+    order[:, start:middle] = result[:size_left].reshape(num_features, -1)
+    order[:, middle:end] = result[size_left:].reshape(num_features, -1)
+    return middle
+
+def fit_stump_presorted(index, weights, indices_sorted):  # O(dN), no sorting
+  """
+  Same as fit_stump on the examples given by indices_sorted, a (d, n) array (e.g. columns of a copy of index.order 
+  rearranged by index.partition) that lists them in nondecreasing order of every feature. All features are searched at once.
+  """
+  return best_split_presorted(index, weights, indices_sorted)[:3]
+
+def best_split_presorted(index, weights, indices_sorted):
+  """
+  Same as fit_stump_presorted, but also returns the (total weight, positive label weight) of the examples on each 
+  side of the split (None if there is none). They come from the cumulative sums of the search.
+  """
+  features = np.arange(indices_sorted.shape[0])[:, np.newaxis]
+  values = index.inputs[indices_sorted, features]  # (d, n)
+  cumulative_weights, cumulative_weights_positive = cumulative_weights_sorted(weights[indices_sorted], index.labels[indices_sorted])
+  losses = split_losses_cumulative(values, cumulative_weights, cumulative_weights_positive)  # (d, n - 1)
+  if losses.size == 0:
+    return None, None, float('inf'), None
+  feature, j = np.unravel_index(np.argmin(losses), losses.shape)  # The lowest feature among ties, as in fit_stump
+  if losses[feature, j] == np.inf:
+    return None, None, float('inf'), None
+  total, positive = cumulative_weights[feature, -1], cumulative_weights_positive[feature, -1]
+  total1, positive1 = cumulative_weights[feature, j], cumulative_weights_positive[feature, j]
+  totals = ((float(total1), float(positive1)), (float(total - total1), float(positive - positive1)))
+  return int(feature), float(values[feature, j] + values[feature, j + 1]) / 2., float(losses[feature, j]), totals
+
+class FeatureBins:
+  """
+  Quantized copy of a dataset of N (input, label) pairs for fitting trees on histograms. Every feature is cut once 
+  into at most max_bins bins at thresholds between distinct values (between all of them if there are few enough, 
+  otherwise at quantiles), so the best split of a node only depends on per-bin totals of its examples. The histograms 
+  of a node take O(nd) time to build and O(d * max_bins) to search, and those of the larger child of a split are 
+  the parent's minus those of its smaller sibling.
+  """
+
+  def __init__(self, data, max_bins=255):
+    assert 2 <= max_bins <= 256  # Bin numbers are stored as uint8
+    inputs = np.array([x for x, _ in data], dtype=np.float64)  # (N, d)
+    self.labels = np.array([y for _, y in data])  # (N,)
+    self.max_bins = max_bins
+    self.thresholds = np.full((inputs.shape[1], max_bins - 1), np.inf)  # (d, max_bins - 1), rows padded with inf
+    self.bins = np.empty(inputs.shape, dtype=np.uint8)  # (N, d)
+    for feature, values in enumerate(inputs.T):
+      thresholds = self.cut(values, max_bins)
+      self.thresholds[feature, :len(thresholds)] = thresholds
+      self.bins[:, feature] = np.searchsorted(thresholds, values)  # Bin b holds values in (thresholds[b - 1], thresholds[b]]
+
+  @staticmethod
+  def cut(values, max_bins):  # At most max_bins - 1 thresholds, each halfway between two consecutive distinct values
+    distinct = np.unique(values)
+    if len(distinct) > max_bins:  # Cut right after the distinct values at evenly spaced quantiles
+      quantiles = np.quantile(values, np.linspace(0., 1., max_bins + 1)[1:-1])
+      positions = np.unique(np.clip(np.searchsorted(distinct, quantiles, side='right') - 1, 0, len(distinct) - 2))
+    else:
+      positions = np.arange(len(distinct) - 1)
+    return (distinct[positions] + distinct[positions + 1]) / 2.
+
+  def histograms(self, weights, indices):  # (3, d, max_bins): example count, total weight and positive label weight
+    num_features = self.bins.shape[1]
+    bins = (self.bins[indices] + np.arange(num_features) * self.max_bins).ravel()  # Every feature has its own bins
+    weights = np.repeat(weights[indices], num_features)
+    positive = np.repeat(self.labels[indices] == 1, num_features)
+    length = num_features * self.max_bins
+    return np.stack([np.bincount(bins, minlength=length).astype(np.float64), np.bincount(bins, weights, length),
+                     np.bincount(bins, np.where(positive, weights, 0.), length)]).reshape(3, num_features, self.max_bins)
+
+  def split(self, indices, feature, threshold):  # Partition into (left, right), as by x[feature] <= threshold
+    goes_left = self.bins[indices, feature] <= np.searchsorted(self.thresholds[feature], threshold)
+    return indices[goes_left], indices[~goes_left]
+
+  def partition(self, indices, start, end, feature, threshold):  # split of indices[start:end] in place, returns the middle
+    segment = indices[start:end]
+    goes_left = self.bins[segment, feature] <= np.searchsorted(self.thresholds[feature], threshold)
+    left, right = segment[goes_left], segment[~goes_left]
+    middle = start + len(left)
+    indices[start:middle] = left
+    indices[middle:end] = right
+    return middle
+
+def fit_stump_histogram(bins, histograms):  # O(d * max_bins), independent of the number of examples
+  """
+  Same as fit_stump, but only splitting between the bins of a FeatureBins. histograms is a (3, d, max_bins) array 
+  from bins.histograms with the example counts, total weights and positive label weights in every bin of the node.
+  """
+  return best_split_histogram(bins, histograms)[:3]
+
+def best_split_histogram(bins, histograms):  # Also returns the totals of both sides, as best_split_presorted
+  cumulative = np.cumsum(histograms, axis=-1)
+  (count1, total1, positive1), (count, total, positive) = cumulative[..., :-1], cumulative[..., -1:]
+  losses = compute_split_losses(total1, total - total1, positive1, positive - positive1)  # (d, max_bins - 1)
+  losses[(count1 == 0) | (count1 == count)] = np.inf  # Effective partitions have examples on both sides
+  feature, j = np.unravel_index(np.argmin(losses), losses.shape)
+  if losses[feature, j] == np.inf:
+    return None, None, float('inf'), None
+  total, positive = float(total[feature, 0]), float(positive[feature, 0])
+  total1, positive1 = float(total1[feature, j]), float(positive1[feature, j])
+  totals = ((total1, positive1), (total - total1, positive - positive1))
+  return int(feature), float(bins.thresholds[feature, j]), float(losses[feature, j]), totals
+
+class Node:
+
+  def __init__(self, parent):
+    self.parent = parent
+    self.child_left = None
+    self.child_right = None
+    self.feature = None  # Feature (i.e., dimension) to split on
+    self.threshold = None  
+    self.label = None
+    self.leaf = False
+
+class BinaryClassifier:
+
+  def predict(self, x):  # Given a vector x, return either +1 or -1 
+      raise NotImplementedError
+
+  def predict_all(self, data_unlabeled):
+    return [self.predict(x) for x in data_unlabeled]    
+
+  def evaluate_accuracy(self, data):  # One predict_all on all inputs, so trees and ensembles use predict_flat
+    inputs = np.array([x for x, _ in data], dtype=np.float64)
+    labels = np.array([y for _, y in data])
+    num_correct = int(np.sum(np.asarray(self.predict_all(inputs)) == labels))
+    return num_correct / len(data) * 100.
+
+class DecisionTree(BinaryClassifier):
+
+  def __init__(self, data, weights=None, max_depth=10, min_split_size=1, timer=None, index=None, max_bins=None, 
+               max_leaves=None, min_gain=0.):
+    if weights is None:
+      weights = np.ones(len(data))  
+    self.arrays = None  # Flat layout for predict_all
+    if index is None and max_bins is not None:
+      index = FeatureBins(data, max_bins)
+    if max_leaves is not None or min_gain > 0.:  # Leaf-wise growth, exact or on histograms
+      self.root = self.fit_best_first(data, weights, max_depth, min_split_size, max_leaves, min_gain, timer=timer, index=index)
+    elif isinstance(index, FeatureBins):  # Histogram mode
+      self.root = self.fit_histogram(data, weights, max_depth, min_split_size, timer=timer, bins=index)
+    else:
+      self.root = self.fit(data, weights, max_depth, min_split_size, timer=timer, index=index)
+
+  def fit(self, data, weights, max_depth, min_split_size, timer=None, index=None):
+    timer = timer or NullPhaseTimer()
+    index = index if index is not None else FeatureIndex(data)  # Pass one in to reuse it across trees
+    weights = np.asarray(weights, dtype=np.float64)
+    order = index.order.copy()  # A node owns columns start:end, which are partitioned in place when it is split
+    root = Node(None)
+    queue = deque()
+    queue.append((0, order.shape[1], root, 1, (weights.sum(), weights[index.labels == 1].sum())))
+    timer.reset()
+    depth_current, num_examples_depth = 1, 0  # An iteration is one depth level (nodes are expanded breadth-first)
+    while queue:
+      start, end, node, depth, (weight_total, weight_total_positive) = queue.popleft()
+      if depth > depth_current:
+        timer.end_iteration('DecisionTree.fit', depth_current, num_examples_depth)
+        depth_current, num_examples_depth = depth, 0
+      num_examples_depth += end - start
+      with timer.phase('label'):  # From the totals of the split of the parent
+        node.label = 1 if weight_total_positive > weight_total / 2. else -1 
+
+      if depth >= max_depth or end - start < min_split_size:
+        node.leaf = True 
+        continue
+
+      with timer.phase('stump'):
+        feature, threshold, loss, totals = best_split_presorted(index, weights, order[:, start:end])
+
+      if loss == float('inf'):  # Could not find any split (e.g., pure).
+        node.leaf = True 
+        continue
+
+      node.feature = feature
+      node.threshold = threshold
+      with timer.phase('partition'):
+        middle = index.partition(order, start, end, feature, threshold)
+      node.child_left = Node(None)
+      node.child_right = Node(None)
+      queue.append((start, middle, node.child_left, depth + 1, totals[0]))
+      queue.append((middle, end, node.child_right, depth + 1, totals[1]))
+
+    timer.end_iteration('DecisionTree.fit', depth_current, num_examples_depth)
+    return root    
+
+  def fit_histogram(self, data, weights, max_depth, min_split_size, timer=None, bins=None):
+    timer = timer or NullPhaseTimer()
+    bins = bins if bins is not None else FeatureBins(data)  # Pass one in to reuse it across trees
+    weights = np.asarray(weights, dtype=np.float64)
+    indices = np.arange(len(weights))  # A node owns indices[start:end], which are partitioned in place when it is split
+    root = Node(None)
+    queue = deque()
+    queue.append((0, len(indices), None, root, 1, (weights.sum(), weights[bins.labels == 1].sum())))  # No histograms yet
+    timer.reset()
+    depth_current, num_examples_depth = 1, 0
+    while queue:
+      start, end, histograms, node, depth, (weight_total, weight_total_positive) = queue.popleft()
+      if depth > depth_current:
+        timer.end_iteration('DecisionTree.fit', depth_current, num_examples_depth)
+        depth_current, num_examples_depth = depth, 0
+      num_examples_depth += end - start
+      with timer.phase('label'):  # From the totals of the split of the parent
+        node.label = 1 if weight_total_positive > weight_total / 2. else -1 
+
+      if depth >= max_depth or end - start < min_split_size:
+        node.leaf = True 
+        continue
+
+      with timer.phase('histogram'):
+        if histograms is None:
+          histograms = bins.histograms(weights, indices[start:end])
+      with timer.phase('stump'):
+        feature, threshold, loss, totals = best_split_histogram(bins, histograms)
+
+      if loss == float('inf'):  # Could not find any split (e.g., pure).
+        node.leaf = True 
+        continue
+
+      node.feature = feature
+      node.threshold = threshold
+      with timer.phase('partition'):
+        middle = bins.partition(indices, start, end, feature, threshold)
+      histograms_left, histograms_right = None, None
+      if depth + 1 < max_depth:  # The children may be split too
+        with timer.phase('histogram'):
+          if middle - start <= end - middle:
+            histograms_left = bins.histograms(weights, indices[start:middle])
+            histograms_right = histograms - histograms_left
+          else:
+            histograms_right = bins.histograms(weights, indices[middle:end])
+            histograms_left = histograms - histograms_right
+      node.child_left = Node(None)
+      node.child_right = Node(None)
+      queue.append((start, middle, histograms_left, node.child_left, depth + 1, totals[0]))
+      queue.append((middle, end, histograms_right, node.child_right, depth + 1, totals[1]))
+
+    timer.end_iteration('DecisionTree.fit', depth_current, num_examples_depth)
+    return root
+
+  def fit_best_first(self, data, weights, max_depth, min_split_size, max_leaves=None, min_gain=0., timer=None, index=None):
+    """
+    Grows the tree leaf-wise instead of level by level: the leaf whose best split reduces the loss (total weight 
+    times Gini impurity) the most is split next, until there are max_leaves leaves or no split gains more than 
+    min_gain. Gains are divided by the total weight of the root, so min_gain does not depend on the scale of the 
+    weights (the root loss is then at most 0.5). The comparison is strict: a split that gains nothing is never 
+    taken, even with the default min_gain=0. Leaves deeper than max_depth or smaller than min_split_size are not 
+    split, and once the tree has max_leaves leaves new ones are not searched at all. The index can be a 
+    FeatureIndex (exact splits) or a FeatureBins (histogram splits), as in fit and fit_histogram.
+    """
+    timer = timer or NullPhaseTimer()
+    index = index if index is not None else FeatureIndex(data)  # Pass one in to reuse it across trees
+    weights = np.asarray(weights, dtype=np.float64)
+    histogram = isinstance(index, FeatureBins)
+    examples = np.arange(len(weights)) if histogram else index.order.copy()  # A node owns examples[..., start:end]
+    root = Node(None)
+    weight_root = weights.sum()
+    gain_scale = 1. / weight_root if weight_root > 0. else 1.  # Gains as a fraction of the root weight
+    leaves = [(root, 0, examples.shape[-1], 1, (weight_root, weights[index.labels == 1].sum()), None)]  # New leaves
+    heap = []  # Leaves that can be split, by decreasing gain (then creation order)
+    num_leaves, num_candidates = 1, 0
+    timer.reset()
+    while True:
+      for node, start, end, depth, (weight_total, weight_total_positive), histograms in leaves:
+        node.leaf = True
+        node.label = 1 if weight_total_positive > weight_total / 2. else -1 
+        if depth >= max_depth or end - start < min_split_size or (max_leaves is not None and num_leaves >= max_leaves):
+          continue  # The last check skips searching leaves that the budget will never let split
+        with timer.phase('stump'):
+          if histogram:
+            if histograms is None:
+              histograms = index.histograms(weights, examples[start:end])
+            split = best_split_histogram(index, histograms)
+          else:
+            split = best_split_presorted(index, weights, examples[:, start:end])
+        positive_prob = weight_total_positive / weight_total if weight_total > 0. else 0.5
+        gain = (weight_total * gini_impurity([1 - positive_prob, positive_prob]) - split[2]) * gain_scale  # Loss of the leaf minus of the split
+        if split[2] < float('inf') and gain > min_gain:
+          heapq.heappush(heap, (-gain, num_candidates, node, start, end, depth, split, histograms))
+          num_candidates += 1
+
+      if not heap or (max_leaves is not None and num_leaves >= max_leaves):
+        break
+      negative_gain, _, node, start, end, depth, (feature, threshold, _, totals), histograms = heapq.heappop(heap)
+      node.leaf = False
+      node.feature = feature
+      node.threshold = threshold
+      with timer.phase('partition'):
+        middle = index.partition(examples, start, end, feature, threshold)
+      histograms_left, histograms_right = None, None
+      searchable = max_leaves is None or num_leaves + 1 < max_leaves  # The children can still be split
+      if histograms is not None and depth + 1 < max_depth and searchable:  # Sibling subtraction, as in fit_histogram
+        with timer.phase('histogram'):
+          if middle - start <= end - middle:
+            histograms_left = index.histograms(weights, examples[start:middle])
+            histograms_right = histograms - histograms_left
+          else:
+            histograms_right = index.histograms(weights, examples[middle:end])
+            histograms_left = histograms - histograms_right
+      node.child_left = Node(None)
+      node.child_right = Node(None)
+      leaves = [(node.child_left, start, middle, depth + 1, totals[0], histograms_left), 
+                (node.child_right, middle, end, depth + 1, totals[1], histograms_right)]
+      num_leaves += 1
+      timer.end_iteration('DecisionTree.fit', num_leaves - 1, end - start, gain=-negative_gain)  # An iteration is one split
+
+    return root
+
+  def predict(self, x):
+    node = self.root
+    while not node.leaf: 
+      node = node.child_left if x[node.feature] <= node.threshold else node.child_right
+    return node.label
+
+  def flatten(self):  # The flat layout of the tree (see flatten_trees), built on first use
+    if self.arrays is None:
+      self.arrays = flatten_trees([self.root])
+    return self.arrays
+
+  def predict_all(self, data_unlabeled):
+    if isinstance(data_unlabeled, np.ndarray):  # All rows at once on the flat layout
+      return predict_flat(self.flatten(), data_unlabeled)[0].tolist()
+    return super().predict_all(data_unlabeled)  # Converting rows of Python lists costs more than walking them
+
+def flatten_trees(roots):
+  feature, threshold, label, child_left, child_right, tree_starts = [], [], [], [], [], []
+  for root in roots:
+    tree_starts.append(len(feature))
+    nodes = deque([root])
+    next_index = len(feature) + 1  # Index of the next node to be enqueued
+    while nodes:
+      node = nodes.popleft()
+      label.append(node.label)
+      if node.leaf:
+        feature.append(-1)
+        threshold.append(0.)
+        child_left.append(-1)
+        child_right.append(-1)
+      else:
+        feature.append(node.feature)
+        threshold.append(node.threshold)
+        child_left.append(next_index)
+        child_right.append(next_index + 1)
+        nodes.extend([node.child_left, node.child_right])
+        next_index += 2
+  tree_starts.append(len(feature))
+  return {'feature': np.array(feature, dtype=np.int64), 'threshold': np.array(threshold, dtype=np.float64), 
+          'label': np.array(label, dtype=np.int8), 'child_left': np.array(child_left, dtype=np.int64), 
+          'child_right': np.array(child_right, dtype=np.int64), 'tree_starts': np.array(tree_starts, dtype=np.int64)}
+
+def predict_flat(arrays, inputs):  # (T, n) labels by each of the T trees in arrays on n inputs
+  """
+  Predicts a (n, d) block of inputs with every tree in a flat layout from flatten_trees at once. Each (tree, input) 
+  pair starts at the root of its tree, and all pairs advance one level per iteration by gathering from the node 
+  arrays. Pairs that reach a leaf drop out, so an iteration only costs as much as the pairs still descending.
+  """
+  inputs = np.asarray(inputs, dtype=np.float64)
+  feature, threshold, child_left, child_right = arrays['feature'], arrays['threshold'], arrays['child_left'], arrays['child_right']
+  roots = np.asarray(arrays['tree_starts'][:-1])
+  nodes = np.repeat(roots, len(inputs))  # Current node of every pair, flattened (T, n)
+  rows = np.tile(np.arange(len(inputs)), len(roots))
+  active = np.flatnonzero(feature[nodes] >= 0)
+  while len(active) > 0:
+    node = nodes[active]
+    goes_left = inputs[rows[active], feature[node]] <= threshold[node]
+    node = np.where(goes_left, child_left[node], child_right[node])
+    nodes[active] = node
+    active = active[feature[node] >= 0]
+  return np.asarray(arrays['label'])[nodes].reshape(len(roots), len(inputs))
+
+class DataXOR:
+
+  def __init__(self, num_examples=1000, num_examples_train=500):
+    assert 0 < num_examples_train < num_examples
+    set_seed(42)
+    data = []
+    for _ in range(num_examples):
+      mean, label = random.choice([((-2, -2), 1), ((2, -2), -1), ((2, 2), 1), ((-2, 2), -1)])
+      data.append((np.random.randn(2) + mean, label))
+    self.train = data[:num_examples_train]
+    self.val = data[num_examples_train:]
+
+  def plot_train(self):
+    import matplotlib
+    import matplotlib.pyplot as plt
+    plt.scatter([x[0] for x, _ in self.train], [x[1] for x, _ in self.train], c=[y for _, y in self.train], cmap=matplotlib.cm.Paired)
+    plt.plot()  
+
+  def draw_contour(self, model, M=200):
+    import matplotlib
+    import matplotlib.pyplot as plt
+    # First, scatter plot training examples from which the tree is learned.
+    self.plot_train()
+
+    # Next, compute model predictions for (M, M) "grid" coordinates on the plane. 
+    # To do this, we need 2 * M^2 input values: M^2 values for dim 1 and M^2 values for dim 2.
+    # We can get such evenly spaced values by NumPy's linspace and meshgrid.
+    ticks = np.linspace(min(min(x) for x, _ in self.train), max(max(x) for x, _ in self.train), M)
+    x1, x2 = np.meshgrid(ticks, ticks, indexing="ij")
+    inputs = np.stack([x1, x2], axis=2).reshape(-1, 2)
+    preds = np.array(model.predict_all(inputs)).reshape(x1.shape)  # {+1, -1}^{M x M}
+
+    # Draw the contour based on the grid predictions. The bigger M is, the smoother the contour.
+    plt.contourf(x1, x2, preds, cmap=matplotlib.cm.Paired, alpha=0.8)
+    plt.plot()
+
+def load_data(split, datadir=None):
+  with open(os.path.join(datadir if datadir is not None else DATADIR, split + '.pkl'), 'rb') as f:
+    return pickle.load(f)
+
+def fit_tree(config):  # Runs in a sweep worker
+  # Fit on the (x, y) list format, whose Python lists the tree code indexes fast, and evaluate on the arrays at once.
+  data_train = list(zip(shared_arrays['inputs_train'].tolist(), shared_arrays['labels_train'].tolist()))
+  tree = DecisionTree(data_train, **config)
+  acc_train = float(np.mean(tree.predict_all(shared_arrays['inputs_train']) == shared_arrays['labels_train'])) * 100.
+  acc_val = float(np.mean(tree.predict_all(shared_arrays['inputs_val']) == shared_arrays['labels_val'])) * 100.
+  return acc_val, (tree, acc_train)
+
+def tune_tree(data_train, data_val, verbose=False, num_workers=None):
+  arrays = {'inputs_train': np.array([x for x, _ in data_train]), 'labels_train': np.array([y for _, y in data_train]),
+            'inputs_val': np.array([x for x, _ in data_val]), 'labels_val': np.array([y for _, y in data_val])}
+  configs = [{'max_depth': int(max_depth), 'min_split_size': int(min_split_size)} 
+             for max_depth in np.logspace(1, 5, num=6, base=2).astype(int) 
+             for min_split_size in np.logspace(0, 4, num=5, base=2).astype(int)]
+  tree_best = None
+  acc_val_best = 0. 
+  for config, acc_val, (tree, acc_train), is_best in run_sweep(fit_tree, configs, arrays, num_workers=num_workers):
+    print_string = 'max_depth={:d}   min_split_size={:d}   acc_train {:.2f}   acc_val {:.2f}'.format(config['max_depth'], config['min_split_size'], acc_train, acc_val)
+    if is_best and acc_val > 0.:
+      acc_val_best = acc_val
+      tree_best = tree
+      print_string += ' <--------new best'
+    if verbose:
+      print(print_string)
+  return tree_best, acc_val_best
+
+class Ensemble(BinaryClassifier):
+
+  def __init__(self): 
+    self.classifiers = []  # Each must have a predict function outputting +1 or -1
+    self.alphas = []  
+    self.arrays = None  # Flat layout of the DecisionTree classifiers, see flatten
+    self.arrays_trees = None  # The trees self.arrays was built from
+
+  def predict(self, x):
+    score = sum(alpha * classifier.predict(x) for alpha, classifier in zip(self.alphas, self.classifiers))
+    return np.sign(score)
+
+  def flatten(self):  # flatten_trees of the DecisionTree classifiers in order, rebuilt only when they change
+    trees = tuple(classifier for classifier in self.classifiers if isinstance(classifier, DecisionTree))
+    if self.arrays is None or self.arrays_trees != trees:
+      self.arrays = flatten_trees([tree.root for tree in trees])
+      self.arrays_trees = trees
+    return self.arrays
+
+  def score_matrix(self, data_unlabeled):  # (T, n): alpha_t times the prediction of classifier t on every input
+    inputs = np.asarray(data_unlabeled, dtype=np.float64)  # Converted once for all classifiers
+    scores = np.empty((len(self.classifiers), len(inputs)))
+    is_tree = np.array([isinstance(classifier, DecisionTree) for classifier in self.classifiers], dtype=bool)
+    if is_tree.any():
+      scores[is_tree] = predict_flat(self.flatten(), inputs)  # All trees in a single pass
+    for t in np.flatnonzero(~is_tree):
+      scores[t] = self.classifiers[t].predict_all(inputs)
+    scores *= np.asarray(self.alphas, dtype=np.float64)[:, np.newaxis]
+    return scores
+
+  def predict_all(self, data_unlabeled):
+    return np.sign(self.score_matrix(data_unlabeled).sum(axis=0)).tolist()
+
+def adaboost(data_train, data_val, max_steps=100, max_depth=7, min_split_size=25, patience=40, verbose=False, timer=None, 
+             max_bins=None, max_leaves=None, min_gain=0.):  #100, 4, 10, 20
+  """
+  max_leaves and min_gain are passed to every DecisionTree (see DecisionTree.fit_best_first). min_gain is a fraction 
+  of the total weight of the training examples, e.g. 0.01 only takes splits that reduce the weighted Gini loss by 1%.
+  """
+  timer = timer or NullPhaseTimer()
+  weights = np.full(len(data_train), 1. / len(data_train))  
+
+  # Will maintain ensemble scores on all data for efficiency
+  scores_train_current = np.zeros(len(data_train))
+  scores_val_current = np.zeros(len(data_val))
+
+  ensemble = Ensemble()
+  step_best = 0
+  acc_val_best = 0
+
+  # Labels and inputs as arrays, so that every round is a few array operations
+  labels_train = np.array([y for _, y in data_train])
+  labels_val = np.array([y for _, y in data_val])
+  inputs_train = np.array([x for x, _ in data_train], dtype=np.float64)
+  inputs_val = np.array([x for x, _ in data_val], dtype=np.float64)
+  # Sorted (or binned, with max_bins) once and shared by the trees of every round
+  index = FeatureIndex(data_train) if max_bins is None else FeatureBins(data_train, max_bins)
+
+  timer.reset()
+  for step in range(max_steps):
+    with timer.phase('fit'):
+      tree = DecisionTree(data_train, weights=weights, max_depth=max_depth, min_split_size=min_split_size, index=index, 
+                          max_leaves=max_leaves, min_gain=min_gain)
+    with timer.phase('forward'):
+      preds = predict_flat(tree.flatten(), inputs_train)[0]
+
+    with timer.phase('update'):
+      weighted_error = weights[preds != labels_train].sum()
+      alpha = (1/2)*np.log((1-weighted_error)/weighted_error)
+      weights = np.exp(labels_train*(-alpha)*preds)*weights
+      weights = weights / np.sum(weights)
+
+    # Sanity check
+    assert 0 <= weighted_error <= 0.5
+    assert (weights >= 0).all()
+    assert abs(1 - weights.sum()) < 1e-6
+
+    # Update ensemble scores incrementally
+    with timer.phase('evaluation'):
+      scores_train_current += alpha * preds
+      scores_val_current += alpha * predict_flat(tree.flatten(), inputs_val)[0]
+      acc_train = float(np.mean(np.sign(scores_train_current) == labels_train)) * 100. 
+      acc_val = float(np.mean(np.sign(scores_val_current) == labels_val)) * 100. 
+    timer.end_iteration('adaboost', step + 1, len(data_train), weighted_error=weighted_error, acc_train=acc_train, acc_val=acc_val)
+    print_string = 'Step {:d}   weighted_error {:.4f}   acc_train {:.2f}   acc_val {:.2f}'.format(step, weighted_error, acc_train, acc_val)
+
+    if acc_val > acc_val_best: 
+      step_best = step 
+      acc_val_best = acc_val
+      print_string += ' <--------new best'
+    elif step - step_best > patience:
+      if verbose: 
+        print(print_string, '\nNo improvement in over {:d} steps, early stopping'.format(patience))
+      break 
+
+    if verbose: 
+      print(print_string)
+
+    ensemble.classifiers.append(tree)
+    ensemble.alphas.append(alpha)
+
+  # Only use the weak learners that gave us the best validation accuracy.
+  ensemble.classifiers = ensemble.classifiers[: step_best + 1]
+  ensemble.alphas = ensemble.alphas[: step_best + 1]
+  return ensemble, acc_val_best
+
+def create_kaggle_submission(model, data_unlabeled, netid, path=None, chunk_size=65536):
+  if path is None:
+    path = '/content/drive/My Drive/cs461hw4_{:s}.csv'.format(netid)
+  with open(path, 'w') as f:
+    f.write('id,prediction\n')  # Header
+    for start in range(0, len(data_unlabeled), chunk_size):
+      write_predictions(f, model.predict_all(data_unlabeled[start:start + chunk_size]), start)
+
+def unflatten_trees(arrays):
+  num_nodes = len(arrays['feature'])
+  nodes = [Node(None) for _ in range(num_nodes)]
+  feature, threshold, label = arrays['feature'].tolist(), arrays['threshold'].tolist(), arrays['label'].tolist()
+  child_left, child_right = arrays['child_left'].tolist(), arrays['child_right'].tolist()
+  for i, node in enumerate(nodes):
+    node.label = label[i]
+    if child_left[i] < 0:
+      node.leaf = True
+    else:
+      node.feature, node.threshold = feature[i], threshold[i]
+      node.child_left, node.child_right = nodes[child_left[i]], nodes[child_right[i]]
+      node.child_left.parent = node.child_right.parent = node
+  return [nodes[start] for start in arrays['tree_starts'][:-1].tolist()]
+
+def save_model(model, path):
+  if isinstance(model, DecisionTree):
+    save_arrays(path, 'DecisionTree', model.flatten())
+  elif isinstance(model, Ensemble):
+    arrays = flatten_trees([classifier.root for classifier in model.classifiers])
+    arrays['alphas'] = np.array(model.alphas, dtype=np.float64)
+    save_arrays(path, 'Ensemble', arrays)
+  else:
+    raise ValueError('Unknown model type: ' + type(model).__name__)
+
+def load_model(path, mmap_mode='r'):
+  model_type, arrays, _ = load_arrays(path, mmap_mode=mmap_mode)
+  roots = unflatten_trees(arrays)
+  trees = []
+  for root in roots:
+    tree = DecisionTree.__new__(DecisionTree)  # Skip fitting
+    tree.root = root
+    tree.arrays = None
+    trees.append(tree)
+  if model_type == 'DecisionTree':
+    trees[0].arrays = arrays  # Already in the flat layout
+    return trees[0]
+  if model_type == 'Ensemble':
+    model = Ensemble()
+    model.classifiers = trees
+    model.alphas = arrays['alphas'].tolist()
+    model.arrays, model.arrays_trees = arrays, tuple(trees)  # Already in the flat layout
+    return model
+  raise ValueError('Unknown model type: ' + model_type)
@@ -0,0 +1,315 @@
+"""
+Twitter sentiment analysis with support vector machines: linear SVMs trained by subgradient descent and 
+their int8 quantized form, kernel SVMs trained with kernelized Pegasos, 2D toy data and bag-of-words tweet 
+data, and saving/loading models. Labels are in {+1, -1}.
+"""
+
+import functools
+import os
+import re
+
+import numpy as np
+
+from .utils import NullPhaseTimer, EpochShuffler, set_seed, save_arrays, load_arrays
+
+DATADIR = '/content/drive/My Drive/data/airline_tweets/'  # Where load_dataframes looks for the CSV files by default
+
+
+class Data: 
+  """Parent class for data objects"""
+
+  prefetch = False  # Gather the next chunk of a shuffled epoch in the background
+  shuffler = None
+
+  def generate_batch(self, batch_size, shuffle=True):
+    if shuffle:
+      if self.shuffler is None or self.shuffler.inputs is not self.inputs:
+        self.shuffler = EpochShuffler(self.inputs, self.labels, prefetch=self.prefetch)
+      for inds, X, y in self.shuffler.batches(batch_size):
+        yield X, y, inds
+      return
+    inds = np.arange(self.num_examples)
+    for i in range(0, self.num_examples, batch_size):
+        X = self.inputs[i: i + batch_size]  # Views, no copying
+        y = self.labels[i: i + batch_size]
+        yield X, y, inds[i: i + batch_size]
+
+class Data2D(Data):
+
+  def __init__(self, num_examples, boundary='line', input_min=-0.5, input_max=0.5):
+    super().__init__()
+    set_seed(42)
+    self.inputs = np.random.uniform(input_min, input_max, (num_examples, 2))
+    if boundary == 'line':
+      labels = self.inputs.sum(axis=1) > 0
+    elif boundary == 'circle':
+      labels = (self.inputs ** 2).sum(axis=1) > ((input_max * 0.7) ** 2)
+    else:
+      raise ValueError('Unknown boundary: ' + boundary)
+
+    self.labels = 2 * labels - 1  # Convert binary labels from 0/1 to +1/-1    
+    self.num_examples = num_examples
+    self.dim = 2
+    self.input_min = input_min
+    self.input_max = input_max
+
+  def plot(self):
+    import matplotlib
+    import matplotlib.pyplot as plt
+    plt.scatter(self.inputs[:, 0], self.inputs[:, 1], c=self.labels, cmap=matplotlib.cm.Paired)
+    plt.plot()
+
+class LinearSVM:
+
+  def __init__(self, dim, init_randn=False):
+    self.w = np.random.randn(dim) if init_randn else np.zeros(dim) 
+
+  def forward(self, X, y=None, la=1.):
+    """
+    Given input vectors X (N x d), make N predictions (scores & labels).
+    If also given gold labels y, compute the loss/gradient.
+    Use regularization strength la ("lambda").
+    """ 
+    scores = X.dot(self.w[:, np.newaxis]).squeeze() 
+    preds = 2 * (scores > 0) - 1  
+    loss = None
+    grad = None
+    if y is not None:
+      margins = y*scores  
+      loss = (la/2)*(np.linalg.norm(self.w))**2 + np.mean(np.maximum(1-margins, 0))
+      grad = 0
+      n = 0
+      for i in margins: 
+        if i > 1:
+          grad = grad + 0
+        else:
+          grad += -y[n]*X[n]
+        n+=1
+      grad = grad / X.shape[0]
+      grad +=  la*self.w 
+
+    return {'preds': preds, 'scores': scores, 'loss': loss, 'grad': grad}
+
+  def quantize(self):
+    # Symmetric quantization: w is stored as int8 values in [-127, 127] times a single float scale.
+    scale = np.abs(self.w).max() / 127. or 1.
+    return QuantizedLinearSVM(np.round(self.w / scale).astype(np.int8), np.float32(scale))
+
+class QuantizedLinearSVM:
+  """Inference-only LinearSVM with int8 weights and a float scale (see LinearSVM.quantize)."""
+
+  def __init__(self, w_quantized, scale):
+    self.w_quantized = w_quantized  # (d,) int8
+    self.scale = scale
+
+  def forward(self, X):
+    # Integer inputs (e.g. word counts) are multiplied as they are. NumPy has no BLAS path for integer matmuls, so the 
+    # products are accumulated in float32 and rescaled once.
+    scores = np.matmul(X, self.w_quantized, dtype=np.float32) * self.scale
+    preds = 2 * (scores > 0) - 1
+    return {'preds': preds, 'scores': scores}
+
+def evaluate(model, data, batch_size_eval=16):
+  num_correct = 0
+  for (X, y, _) in data.generate_batch(batch_size_eval, shuffle=False):
+    output = model.forward(X)
+    num_correct += (y == output['preds']).sum()
+  acc = num_correct / data.num_examples * 100.
+  return acc
+
+def train_linear(data, la, max_num_epochs=20, seed=42, verbose=False, timer=None):
+  timer = timer or NullPhaseTimer()
+  set_seed(seed)
+  model = LinearSVM(data.dim) 
+  acc = 0.
+  step = 1
+  timer.reset()
+  for epoch in range(1, max_num_epochs + 1):
+    loss_total = 0.
+    for (x, y, _) in timer.timed(data.generate_batch(1)): 
+      with timer.phase('forward'):  # Includes the gradient
+        output = model.forward(x, y, la=la)
+      with timer.phase('update'):
+        lr = 1 / (la * step)
+        model.w -= lr * output['grad']
+      loss_total += output['loss']
+      step += 1
+    with timer.phase('evaluation'):
+      acc = evaluate(model, data)
+    timer.end_iteration('train_linear', epoch, data.num_examples, loss_avg=loss_total / data.num_examples, acc_train=acc)
+    if verbose:
+      print('Epoch {:d}: avg loss {:.3f}, train acc {:.2f}'.format(epoch, loss_total / data.num_examples, acc))    
+
+  return model, acc
+
+def draw_contour(model, data2d, M=100):
+  import matplotlib
+  import matplotlib.pyplot as plt
+  # First, scatter plot actual data points.
+  plt.scatter(data2d.inputs[:, 0], data2d.inputs[:, 1], c=data2d.labels, cmap=matplotlib.cm.Paired)
+
+  # Next, compute model predictions for (M, M) "grid" coordinates on the plane. 
+  # To do this, we need 2 * M^2 input values: M^2 values for dim 1 and M^2 values for dim 2.
+  # We can get such evenly spaced values by NumPy's linspace and meshgrid.
+  ticks = np.linspace(data2d.input_min, data2d.input_max, M)
+  x1, x2 = np.meshgrid(ticks, ticks, indexing="ij")
+  inputs = np.stack([x1, x2], axis=2).reshape(-1, 2)
+  preds = model.forward(inputs)['preds'].reshape(x1.shape)  # {+1, -1}^{M x M}
+
+  # Draw the contour based on the grid predictions. The bigger M is, the smoother the contour.
+  plt.contourf(x1, x2, preds, cmap=matplotlib.cm.Paired, alpha=0.8)
+  plt.plot()
+
+def compare_quantized(model, data, batch_size_eval=4096):
+  model_quantized = model.quantize()
+  num_correct, num_correct_quantized, num_agreements = 0, 0, 0
+  for (X, y, _) in data.generate_batch(batch_size_eval, shuffle=False):
+    preds, preds_quantized = model.forward(X)['preds'], model_quantized.forward(X)['preds']
+    num_correct += (y == preds).sum()
+    num_correct_quantized += (y == preds_quantized).sum()
+    num_agreements += (preds == preds_quantized).sum()
+  return {'acc': num_correct / data.num_examples * 100., 'acc_quantized': num_correct_quantized / data.num_examples * 100., 
+          'agreement': num_agreements / data.num_examples * 100., 
+          'weight_bytes': model.w.nbytes, 'weight_bytes_quantized': model_quantized.w_quantized.nbytes}
+
+def construct_kernel(kernel_type, dim=1, offset=0., gamma=0.1):
+  """
+  Return a function that takes X (N, d) and Y (M, d) and outputs a (N, M) matrix 
+  filled with kernel outputs.
+  """
+  if kernel_type == 'linear':
+    def kernel(X, Y):
+      return X.dot(Y.T)
+
+  elif kernel_type == 'poly':
+    def kernel(X, Y):
+      return (offset + X.dot(Y.T)) ** dim
+
+  elif kernel_type == 'gaussian':
+    def kernel(X, Y):
+      # Insert a new axis so that we can broadcast.
+      X = X[:, np.newaxis, :]  # (N, 1, d)
+
+      exponents = (-gamma * np.linalg.norm(X-Y, axis=2)**2)
+      return np.exp(exponents)
+
+  else:
+    raise ValueError('Unknown kernel: ' + kernel)
+
+  kernel.spec = {'kernel_type': kernel_type, 'dim': dim, 'offset': offset, 'gamma': gamma}  # To rebuild it, see load_model
+  return kernel
+
+class KernelSVM:
+
+  def __init__(self, dim, kernel):
+    self.kernel = kernel
+    self.support_X = np.zeros((1, dim))  # (K, d) where K is the number of support vectors
+    self.support_y = np.zeros(1)  # K
+    self.support_al = np.zeros(1)  # K
+
+  def forward(self, X):
+    kernel_output = self.kernel(self.support_X, X)  # (K, N)
+    scores = (self.support_al * self.support_y).dot(kernel_output)  # N
+    preds = 2 * (scores > 0) - 1  
+    return {'preds': preds, 'scores': scores}
+
+def pegasos_kernelized(data, kernel, la, max_num_epochs=20, seed=42, verbose=False, timer=None):
+  timer = timer or NullPhaseTimer()
+  set_seed(seed)
+  model = KernelSVM(data.dim, kernel)
+  violation_counts = np.zeros(data.num_examples)
+  acc = 0.
+  step = 1
+  timer.reset()
+  for epoch in range(1, max_num_epochs + 1):
+    loss_total = 0.
+    for (x, y, x_index) in timer.timed(data.generate_batch(1)):
+      with timer.phase('forward'):
+        output = model.forward(x)
+      lr = 1 / (la * step)
+      margin = y*lr*(output['scores'])[0]
+      if margin < 1:
+        with timer.phase('update'):
+          violation_counts[x_index] +=  1
+
+          model.support_X = np.append(model.support_X, x, axis = 0) 
+          model.support_y = np.append(model.support_y, y, axis = 0) 
+          model.support_al = np.append(model.support_al, violation_counts[x_index], axis = 0) 
+
+      step += 1
+
+    with timer.phase('evaluation'):
+      acc = evaluate(model, data)
+    timer.end_iteration('pegasos_kernelized', epoch, data.num_examples, num_support_vectors=len(model.support_al), acc_train=acc)
+    if verbose:
+      print('Epoch {:d}: train acc {:.2f}'.format(epoch, acc))    
+
+  return model, acc
+
+def download_nltk_data():  # Tokenizer, stop word and lemmatizer data used by tokenize_normalize
+  import nltk
+  for resource in ('stopwords', 'punkt', 'wordnet'):
+    nltk.download(resource, quiet=True)
+
+@functools.lru_cache(maxsize=None)
+def nltk_resources():  # Loaded on first use, nltk is slow to import
+  import nltk
+  from nltk.stem import WordNetLemmatizer
+  from nltk.corpus import stopwords
+  return nltk, set(stopwords.words('english')), WordNetLemmatizer()
+
+def tokenize_normalize(tweet):
+  nltk, stop_words, wordnet_lemmatizer = nltk_resources()
+  only_letters = re.sub('[^a-zA-Z]', ' ', tweet)
+  tokens = nltk.word_tokenize(only_letters)[2:]
+  lower_case = [l.lower() for l in tokens]
+  filtered_result = list(filter(lambda l: l not in stop_words, lower_case))
+  lemmas = [wordnet_lemmatizer.lemmatize(t) for t in filtered_result]
+  return lemmas
+
+def load_dataframes(datadir=None):  # (train, val, devtest) dataframes of the airline tweets
+  import pandas as pd
+  datadir = datadir if datadir is not None else DATADIR
+  return tuple(pd.read_csv(os.path.join(datadir, name + '.csv')) for name in ('train', 'val', 'devtest'))
+
+def build_vectorizer(dataframes, ngram_range=(1, 1)):  # Bag of words over the vocabulary of all given dataframes
+  from sklearn.feature_extraction.text import CountVectorizer
+  vectorizer = CountVectorizer(tokenizer=tokenize_normalize, token_pattern=None, 
+                               strip_accents='unicode', ngram_range=ngram_range)
+  vectorizer.fit([text for dataframe in dataframes for text in dataframe.text])
+  return vectorizer
+
+class DataTwitter(Data):
+
+  def __init__(self, dataframe, vectorizer):
+    self.inputs = vectorizer.transform(dataframe.text).toarray()
+
+    # Convert 'positive', 'neutral' to +1 and 'negative' to -1.
+    sentiments = dataframe['airline_sentiment'].tolist()
+    self.labels = np.array([-1 if sentiment == 'negative' else 1 for sentiment in sentiments])
+    (self.num_examples, self.dim) = self.inputs.shape
+
+def save_model(model, path):
+  if isinstance(model, LinearSVM):
+    save_arrays(path, 'LinearSVM', {'w': model.w})
+  elif isinstance(model, QuantizedLinearSVM):
+    save_arrays(path, 'QuantizedLinearSVM', {'w_quantized': model.w_quantized}, scale=float(model.scale))
+  elif isinstance(model, KernelSVM):
+    save_arrays(path, 'KernelSVM', {'support_X': model.support_X, 'support_y': model.support_y, 'support_al': model.support_al}, 
+                kernel=model.kernel.spec)
+  else:
+    raise ValueError('Unknown model type: ' + type(model).__name__)
+
+def load_model(path, mmap_mode='r'):
+  model_type, arrays, attributes = load_arrays(path, mmap_mode=mmap_mode)
+  if model_type == 'LinearSVM':
+    model = LinearSVM(len(arrays['w']))
+    model.w = arrays['w']
+    return model
+  if model_type == 'QuantizedLinearSVM':
+    return QuantizedLinearSVM(arrays['w_quantized'], np.float32(attributes['scale']))
+  if model_type == 'KernelSVM':
+    model = KernelSVM(arrays['support_X'].shape[1], construct_kernel(**attributes['kernel']))
+    model.support_X, model.support_y, model.support_al = arrays['support_X'], arrays['support_y'], arrays['support_al']
+    return model
+  raise ValueError('Unknown model type: ' + model_type)
@@ -0,0 +1,228 @@
+"""
+Helpers shared by the projects: seeding, per-phase timing, epoch shuffling, gradient checking, 
+hyperparameter sweeps over memory-mapped arrays, and the on-disk model format used by save_model/load_model.
+"""
+
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+
+def set_seed(seed):  # For reproducibility, fix random seeds.
+  random.seed(seed)
+  np.random.seed(seed)
+
+class PhaseTimer:
+  """
+  Records the wall time of each phase of a training iteration (e.g. data fetch, forward, update, evaluation), 
+  the throughput and optionally the peak memory allocated by Python (via tracemalloc, which slows things down), 
+  and writes one JSON line per iteration. Training loops take it as an optional timer; NullPhaseTimer does nothing.
+  """
+
+  def __init__(self, stream=None, trace_memory=False):
+    self.stream = stream if stream is not None else sys.stdout  # Any file-like object, e.g. open('log.jsonl', 'a')
+    self.trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+      tracemalloc.start()
+    self.reset()
+
+  def reset(self):  # Starts a new iteration
+    self.phases = {}
+    self.iteration_start = time.perf_counter()
+    if self.trace_memory and hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+, before that the peak is since the start
+      tracemalloc.reset_peak()
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.phases[name] = self.phases.get(name, 0.) + time.perf_counter() - start
+
+  def timed(self, iterable, name='data'):  # Times fetching each item as the given phase
+    iterator = iter(iterable)
+    while True:
+      with self.phase(name):
+        item = next(iterator, self)  # self as the end marker, since items may be None
+      if item is self:
+        return
+      yield item
+
+  def end_iteration(self, trainer, iteration, num_examples=None, **stats):
+    wall_time = time.perf_counter() - self.iteration_start
+    record = {'trainer': trainer, 'iteration': iteration, 'wall_time': wall_time, 'phases': self.phases}
+    if num_examples is not None:
+      record['examples_per_sec'] = num_examples / wall_time
+    if self.trace_memory:
+      record['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    record.update(stats)
+    self.stream.write(json.dumps(record, default=float) + '\n')  # default=float for NumPy scalars
+    self.reset()
+
+class NullPhaseTimer:
+
+  def reset(self):
+    pass
+
+  def phase(self, name):
+    return contextlib.nullcontext()
+
+  def timed(self, iterable, name='data'):
+    return iterable
+
+  def end_iteration(self, trainer, iteration, num_examples=None, **stats):
+    pass
+
+def epoch_permutation(num_examples):  # The shuffled order of an epoch, shared by every trainer so that they agree
+  inds = list(range(num_examples))
+  random.shuffle(inds)  # Same random stream as shuffling the index list directly
+  return np.array(inds, dtype=np.intp)
+
+class EpochShuffler:
+  """
+  Hands out the batches of a shuffled epoch as views of a chunk of consecutive batches, gathered into a 
+  reusable chunk_size-row buffer, so that neither a fancy-indexed copy per batch nor a shuffled copy of 
+  the whole dataset is made. The permutation is drawn on the calling thread when the epoch starts, like 
+  an unbuffered shuffle, so the random stream is consumed in the same order with or without prefetch. 
+  With prefetch=True, only the gather of the next chunk runs on a background thread while the current 
+  one is consumed. A batch view is only valid until its chunk buffer is refilled.
+  """
+
+  def __init__(self, inputs, labels=None, prefetch=False, chunk_size=4096):
+    self.inputs = inputs
+    self.labels = labels
+    self.prefetch = prefetch
+    self.chunk_size = chunk_size
+    self.buffers = []
+    self.pending = None  # Thread gathering the next chunk
+
+  def allocate(self, num_rows):
+    inputs = np.empty((num_rows,) + self.inputs.shape[1:], dtype=self.inputs.dtype)
+    labels = np.empty((num_rows,) + self.labels.shape[1:], dtype=self.labels.dtype) if self.labels is not None else None
+    return inputs, labels
+
+  def permutation(self):
+    return epoch_permutation(self.inputs.shape[0])
+
+  def gather(self, buffer, inds):  # mode='clip' since out= is buffered with the default mode='raise'
+    np.take(self.inputs, inds, axis=0, out=buffer[0][:len(inds)], mode='clip')
+    if self.labels is not None:
+      np.take(self.labels, inds, axis=0, out=buffer[1][:len(inds)], mode='clip')
+
+  def start(self, buffer, inds):
+    self.pending = threading.Thread(target=self.gather, args=(buffer, inds), daemon=True)
+    self.pending.start()
+
+  def wait(self):
+    if self.pending is not None:
+      self.pending.join()
+      self.pending = None
+
+  def batches(self, batch_size):  # Yields (inds, inputs, labels) for the batches of a freshly shuffled epoch
+    self.wait()  # In case the previous epoch was abandoned while a chunk was being gathered
+    inds = self.permutation()
+    chunk_size = max(self.chunk_size // batch_size, 1) * batch_size  # Whole batches per chunk
+    chunk_size = min(chunk_size, len(inds))
+    if not self.buffers or len(self.buffers[0][0]) < chunk_size:
+      self.buffers = [self.allocate(chunk_size) for _ in range(2 if self.prefetch else 1)]
+
+    chunks = [inds[i: i + chunk_size] for i in range(0, len(inds), chunk_size)]
+    for k, chunk in enumerate(chunks):
+      buffer = self.buffers[k % len(self.buffers)]
+      if self.pending is not None:
+        self.wait()  # Gathered in the background while the previous chunk was consumed
+      else:
+        self.gather(buffer, chunk)
+      if self.prefetch and k + 1 < len(chunks):
+        self.start(self.buffers[(k + 1) % 2], chunks[k + 1])
+      inputs = buffer[0][:len(chunk)]
+      labels = buffer[1][:len(chunk)] if self.labels is not None else None
+      for i in range(0, len(chunk), batch_size):
+        yield chunk[i: i + batch_size], inputs[i: i + batch_size], labels[i: i + batch_size] if labels is not None else None
+
+def check_gradient(loss_and_gradient, w, num_directions=10, epsilon=1e-5, sample_coordinates=False, seed=0):
+  """
+  Checks the gradient returned by loss_and_gradient(w) -> (loss, grad) against central differences 
+  (f(w + epsilon d) - f(w - epsilon d)) / (2 epsilon), which should equal grad . d, along num_directions 
+  random unit directions d (or randomly sampled coordinates if sample_coordinates). This costs 
+  2 * num_directions + 1 evaluations however big w is. Returns the largest absolute error.
+  """
+  rng = np.random.RandomState(seed)  # Own generator so that checking doesn't disturb the global random state
+  w = np.array(w, dtype=np.float64)
+  grad = np.array(loss_and_gradient(w.copy())[1], dtype=np.float64).ravel()  # Copied since some models reuse the gradient buffer
+  if sample_coordinates:
+    directions = np.zeros((num_directions, w.size))
+    directions[np.arange(num_directions), rng.choice(w.size, num_directions, replace=num_directions > w.size)] = 1.
+  else:
+    directions = rng.randn(num_directions, w.size)
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+
+  derivatives = directions.dot(grad)  # Analytic directional derivatives, all at once
+  errors = np.empty(num_directions)
+  for k in range(num_directions):
+    direction = directions[k].reshape(w.shape)
+    loss_plus = loss_and_gradient(w + epsilon * direction)[0]
+    loss_minus = loss_and_gradient(w - epsilon * direction)[0]
+    errors[k] = abs((loss_plus - loss_minus) / (2 * epsilon) - derivatives[k])
+  return errors.max()
+
+shared_arrays = {}  # Arrays mapped by a sweep worker, see run_sweep
+
+def share_arrays(arrays, directory):
+  paths = {}
+  for name, array in arrays.items():
+    paths[name] = os.path.join(directory, name + '.npy')
+    np.save(paths[name], array)
+  return paths
+
+def attach_arrays(paths):  # Process pool initializer
+  for name, path in paths.items():
+    shared_arrays[name] = np.load(path, mmap_mode='r')
+
+def run_sweep(evaluate, configs, arrays, num_workers=None):
+  """
+  Calls evaluate(config) -> (score, result) for every config on a pool of num_workers processes (all cores if None). 
+  The given arrays are written once to .npy files that every worker memory-maps into shared_arrays, 
+  so the data is shared through the page cache instead of being copied to each worker. Yields 
+  (config, score, result, is_best) as configs finish, where is_best marks a new best-so-far score 
+  (ties go to the earlier config, as in a serial loop with a strict comparison).
+  """
+  with tempfile.TemporaryDirectory() as directory:
+    paths = share_arrays(arrays, directory)
+    with ProcessPoolExecutor(num_workers, initializer=attach_arrays, initargs=(paths,)) as executor:
+      futures = {executor.submit(evaluate, config): i for i, config in enumerate(configs)}
+      best = None  # (score, config index)
+      for future in as_completed(futures):
+        i = futures[future]
+        score, result = future.result()
+        is_best = best is None or score > best[0] or (score == best[0] and i < best[1])
+        if is_best:
+          best = (score, i)
+        yield configs[i], score, result, is_best
+
+def save_arrays(path, model_type, arrays, **attributes):
+  os.makedirs(path, exist_ok=True)
+  for name, array in arrays.items():
+    np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+  header = {'type': model_type, 'version': 1, 'arrays': sorted(arrays), 'attributes': attributes}
+  with open(os.path.join(path, 'header.json'), 'w') as f:  # Written last: a directory without a header is incomplete
+    json.dump(header, f)
+
+def load_arrays(path, mmap_mode='r'):
+  with open(os.path.join(path, 'header.json')) as f:
+    header = json.load(f)
+  arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in header['arrays']}
+  return header['type'], arrays, header['attributes']
+
+def write_predictions(f, preds, start=0):  # One formatted write per chunk instead of one writerow per example
+  f.write(''.join(map('{:d},{:d}\n'.format, range(start, start + len(preds)), np.asarray(preds, dtype=int).tolist())))
@@ -0,0 +1,77 @@
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from cs461 import mnist, spam, svm
+from cs461.batch_score import main
+from cs461.utils import set_seed
+
+
+def read_predictions(path):
+  with open(path) as f:
+    lines = f.read().splitlines()
+  return lines[0], [tuple(int(field) for field in line.split(',')) for line in lines[1:]]
+
+class TestBatchScore(unittest.TestCase):
+
+  def setUp(self):
+    set_seed(42)
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+
+  def path(self, name):
+    return os.path.join(self.directory.name, name)
+
+  def round_trip(self, model, save_model, X, preds, chunk_size=7):  # save_model -> batch_score CLI -> CSV
+    save_model(model, self.path('model'))
+    if X.dtype == np.uint8:
+      np.save(self.path('inputs.npy'), X)
+      inputs = self.path('inputs.npy')
+    else:
+      with open(self.path('inputs.pkl'), 'wb') as f:
+        pickle.dump(X.tolist(), f)
+      inputs = self.path('inputs.pkl')
+    main([self.path('model'), inputs, self.path('predictions.csv'), '--chunk-size', str(chunk_size)])
+    header, rows = read_predictions(self.path('predictions.csv'))
+    self.assertEqual(header, 'id,prediction')
+    self.assertEqual(rows, list(enumerate(np.asarray(preds, dtype=int).tolist())))
+
+  def test_mnist(self):
+    inputs_train = np.random.randint(256, size=(50, 784)).astype(np.uint8)
+    X = np.random.randint(256, size=(30, 784)).astype(np.uint8)
+    model = mnist.LinearClassifier(inputs_train, 10, init_range=0.1)
+    for model_saved in [model, model.fold(), model.fold().quantize()]:
+      self.round_trip(model_saved, mnist.save_model, X, model_saved.predict(X)[:, 0])
+
+  def test_svm(self):
+    X = np.random.randint(3, size=(22, 40)).astype(np.uint8)  # Like word counts
+    model = svm.LinearSVM(40, init_randn=True)
+    for model_saved in [model, model.quantize()]:
+      self.round_trip(model_saved, svm.save_model, X, model_saved.forward(X)['preds'], chunk_size=21)  # A 1-row last chunk
+
+  def test_spam(self):
+    data = [(np.random.randint(0, 15, size=(13,)).tolist(), 2 * np.random.randint(2) - 1) for _ in range(200)]
+    X = np.array([x for x, _ in data], dtype=np.float64)  # Pickled as a list of feature vectors, like x_test.pkl
+    ensemble = spam.Ensemble()
+    for max_depth in [1, 3, 6]:
+      ensemble.classifiers.append(spam.DecisionTree(data, np.random.rand(len(data)), max_depth=max_depth))
+      ensemble.alphas.append(np.random.rand())
+    for model in [ensemble.classifiers[-1], ensemble]:
+      self.round_trip(model, spam.save_model, X, model.predict_all([x for x, _ in data]))
+
+  def test_command_line(self):  # The script at the repository root, in a fresh interpreter
+    X = np.random.randint(256, size=(10, 784)).astype(np.uint8)
+    model = mnist.LinearClassifier(np.random.randint(256, size=(50, 784)), 10, init_range=0.1).fold()
+    mnist.save_model(model, self.path('model'))
+    np.save(self.path('inputs.npy'), X)
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'batch_score.py')
+    subprocess.run([sys.executable, script, self.path('model'), self.path('inputs.npy'), self.path('predictions.csv'),
+                    '--header', 'id,category'], check=True, capture_output=True)
+    header, rows = read_predictions(self.path('predictions.csv'))
+    self.assertEqual(header, 'id,category')
+    self.assertEqual(rows, list(enumerate(model.predict(X)[:, 0].tolist())))
@@ -0,0 +1,25 @@
+import importlib.util
+import os
+import unittest
+
+path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'run_benchmarks.py')
+spec = importlib.util.spec_from_file_location('run_benchmarks', path)
+run_benchmarks = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(run_benchmarks)
+
+
+class TestBenchmarks(unittest.TestCase):
+
+  def test_run(self):  # Every benchmark runs at a tiny scale
+    report = run_benchmarks.run_benchmarks(list(run_benchmarks.BENCHMARKS), scale=0.01, repeat=1)
+    self.assertEqual(sorted(report['results']), sorted(run_benchmarks.BENCHMARKS))
+    for result in report['results'].values():
+      self.assertGreater(result['median'], 0.)
+
+  def test_compare(self):
+    baseline = {'results': {'a': {'params': {'N': 10}, 'median': 1.}, 'b': {'params': {'N': 10}, 'median': 1.}, 
+                            'c': {'params': {'N': 20}, 'median': 1.}}}
+    report = {'results': {'a': {'params': {'N': 10}, 'median': 1.2}, 'b': {'params': {'N': 10}, 'median': 1.5}, 
+                          'c': {'params': {'N': 10}, 'median': 9.}, 'd': {'params': {'N': 10}, 'median': 9.}}}
+    rows = run_benchmarks.compare(report, baseline, tolerance=0.25)
+    self.assertEqual([(name, regressed) for name, _, _, _, regressed in rows], [('a', False), ('b', True)])
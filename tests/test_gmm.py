@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+
+import numpy as np
+from scipy.stats import multivariate_normal
+
+from cs461.gmm import GMM, load_model, save_model
+from cs461.utils import set_seed
+
+
+class TestGMM(unittest.TestCase):
+      
+  def setUp(self):
+    set_seed(42)
+    self.dim = 100
+    self.num_components = 7
+    self.num_examples = 200
+    self.power = 2 # Check for numerical stability
+
+    self.inputs = np.random.randn(self.num_examples, self.dim)
+
+  def test_model_diag(self): 
+    model = self.init_model(diag=True)
+    log_probs_gold = self.get_log_probs_gold(model)
+    log_probs = model.compute_log_probs(self.inputs)
+    for k in range(self.num_components):
+      for i in range(self.num_examples):
+        self.assertAlmostEqual(log_probs[k, i], log_probs_gold[k, i])
+
+  def test_model_nondiag(self): 
+    model = self.init_model(diag=False)
+    log_probs_gold = self.get_log_probs_gold(model)
+    log_probs = model.compute_log_probs(self.inputs)
+    for k in range(self.num_components):
+      for i in range(self.num_examples):
+        self.assertAlmostEqual(log_probs[k, i], log_probs_gold[k, i])
+
+  def get_log_probs_gold(self, model):
+    log_probs_gold = []
+    for k in range(self.num_components):
+      dist = multivariate_normal(mean=model.mu[k], cov=(np.diag(model.sigma[k]) if model.diag else model.sigma[k]))
+      log_probs_gold.append([np.log(model.pi[k]) + dist.logpdf(self.inputs[i]) for i in range(self.num_examples)])
+    return np.array(log_probs_gold)
+
+  def init_model(self, diag=False):
+    model = GMM(self.dim, self.num_components, diag=diag)
+    pi_unnormalized = np.random.uniform(size=(self.num_components,)) ** self.power
+    model.pi = pi_unnormalized / pi_unnormalized.sum()
+    model.mu = np.random.randn(self.num_components, self.dim) ** self.power 
+    if diag:
+      model.sigma = np.random.randn(self.num_components, self.dim) ** self.power
+    else:
+      model.sigma = np.array([np.diag(np.random.randn(self.dim)) ** self.power for _ in range(self.num_components)])
+    return model
+
+  def test_save_model(self):  # Same log probabilities, from read-only memory-mapped arrays
+    models = [self.init_model(diag=True), self.init_model(diag=False)]
+    for model_saved in [models[0], models[1], models]:  # A single GMM, and one GMM per label
+      with tempfile.TemporaryDirectory() as directory:
+        save_model(model_saved, directory)
+        model_loaded = load_model(directory)
+        pairs = zip(model_loaded, model_saved) if isinstance(model_saved, list) else [(model_loaded, model_saved)]
+        for gmm_loaded, gmm in pairs:
+          self.assertEqual(gmm_loaded.diag, gmm.diag)
+          np.testing.assert_array_equal(gmm_loaded.compute_log_probs(self.inputs), gmm.compute_log_probs(self.inputs))
+          for array in [gmm_loaded.pi, gmm_loaded.mu, gmm_loaded.sigma]:
+            self.assertIsInstance(array, np.memmap)
+            self.assertFalse(array.flags.writeable)
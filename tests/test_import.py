@@ -0,0 +1,15 @@
+import subprocess
+import sys
+import unittest
+
+LAZY_MODULES = ['matplotlib', 'seaborn', 'pandas', 'nltk', 'sklearn', 'scipy']
+
+
+class TestImport(unittest.TestCase):
+
+  def test_no_heavy_imports(self):  # In a fresh interpreter, since this one may already have them loaded
+    code = ('import sys\n'
+            'import cs461.mnist, cs461.spam, cs461.svm, cs461.gmm, cs461.regression, cs461.batch_score\n'
+            'print(" ".join(name for name in {:s} if name in sys.modules))'.format(repr(LAZY_MODULES)))
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    self.assertEqual(loaded, [])
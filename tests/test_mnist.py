@@ -0,0 +1,264 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from cs461.mnist import (ConfusionMatrix, LinearClassifier, MNISTDataset, compute_feature_statistics, load_model, normalize_features, 
+                         optimizer_types, save_model, train, train_data_parallel, train_lbfgs, train_many)
+from cs461.utils import check_gradient, set_seed
+
+
+class TestGradient(unittest.TestCase):
+
+  def setUp(self):
+    set_seed(42)
+    dim = 100
+    num_labels = 7
+    num_examples = 10
+    self.inputs_train = np.random.randn(num_examples, dim)
+    self.model = LinearClassifier(self.inputs_train, num_labels, init_range=0.01)
+    self.X = np.random.randn(num_examples, dim)
+    self.y = np.random.randint(num_labels, size=(num_examples, 1))
+    self.epsilon = 1e-4
+    self.regularization_weight = 0.01
+    self.loss_avg = self.model.forward(self.X, self.y, self.regularization_weight)[0] / num_examples
+    self.model.zero_grad()
+      
+  def test_gradient_W(self):
+    for i in range(self.model.W.shape[0]):
+      for j in range(self.model.W.shape[1]): 
+        self.model.W[i, j] += self.epsilon
+        loss_avg_perturbed = self.model.forward(self.X, self.y, self.regularization_weight)[0] / self.X.shape[0]
+        partial_derivative_i_j = self.model.W_grad[i, j]
+        truth = (loss_avg_perturbed - self.loss_avg) / self.epsilon
+        error = abs(partial_derivative_i_j - truth)
+        self.assertLess(error, 1e-3)
+        self.model.W[i, j] -= self.epsilon
+        self.model.zero_grad()
+
+  def test_gradient_W_float32(self):
+    self.model.forward(self.X, self.y, self.regularization_weight)
+    W_grad = self.model.W_grad.copy()
+    model32 = LinearClassifier(self.inputs_train, self.model.W.shape[1], dtype=np.float32)
+    model32.W = self.model.W.astype(np.float32)
+    loss_sum = model32.forward(self.X, self.y, self.regularization_weight)[0]
+    self.assertEqual(model32.W_grad.dtype, np.float32)
+    self.assertAlmostEqual(loss_sum / self.X.shape[0], self.loss_avg, places=4)
+    self.assertLess(np.abs(model32.W_grad - W_grad).max(), 1e-5)
+
+  def test_gradient_W_directional(self):  # Full-size MNIST model
+    model = LinearClassifier(np.random.randint(256, size=(50, 784)), 10, init_range=0.01)
+    X = np.random.randint(256, size=(64, 784))
+    y = np.random.randint(10, size=(64, 1))
+    def loss_and_gradient(W):
+      model.W = W
+      return model.loss_and_gradient(X, y, self.regularization_weight)
+    self.assertLess(check_gradient(loss_and_gradient, model.W), 1e-6)
+    self.assertLess(check_gradient(loss_and_gradient, model.W, sample_coordinates=True), 1e-6)
+
+class TestFoldedLinearClassifier(unittest.TestCase):
+
+  def test_fold(self):
+    set_seed(42)
+    inputs_train = np.random.randint(256, size=(50, 784)).astype(np.uint8)
+    inputs_train[:, :10] = 0  # Degenerate features (sigma set to 1)
+    model = LinearClassifier(inputs_train, 10, init_range=0.1)
+    X = np.random.randint(256, size=(64, 784)).astype(np.uint8)
+    model_folded = model.fold()
+    self.assertLess(np.abs(model_folded.scores(X) - model.forward(X)[1]).max(), 1e-8)
+    np.testing.assert_array_equal(model_folded.predict(X), model.predict(X))
+
+  def test_quantize(self):
+    set_seed(42)
+    inputs_train = np.random.randint(256, size=(50, 784)).astype(np.uint8)
+    model = LinearClassifier(inputs_train, 10, init_range=0.1)
+    X = np.random.randint(256, size=(64, 784)).astype(np.uint8)
+    model_folded = model.fold()
+    model_quantized = model_folded.quantize()
+    self.assertEqual(model_quantized.W_quantized.dtype, np.int8)
+    # Rounding moves each weight by at most half a quantization step.
+    error_bound = np.sum(X, axis=1, keepdims=True) * model_quantized.scale / 2. + 1e-3
+    self.assertTrue(np.all(np.abs(model_quantized.scores(X) - model_folded.scores(X)) <= error_bound))
+
+def synthetic_datasets(num_examples=300, num_examples_val=100, dim=20, seed=0, noise=0.):  # Linearly separable but for noise, 10 labels
+  rng = np.random.RandomState(seed)
+  W = rng.randn(dim, 10)
+  inputs = rng.randint(256, size=(num_examples + num_examples_val, dim)).astype(np.uint8)
+  labels = np.argmax((inputs - 127.5).dot(W), axis=1).astype(np.uint8)
+  flipped = rng.rand(len(labels)) < noise  # Relabeled at random
+  labels[flipped] = rng.randint(10, size=flipped.sum())
+  return (MNISTDataset('train', inputs=inputs[:num_examples], labels=labels[:num_examples]), 
+          MNISTDataset('val', inputs=inputs[num_examples:], labels=labels[num_examples:]))
+
+class TestMNISTDataset(unittest.TestCase):
+
+  def setUp(self):
+    set_seed(42)
+    self.inputs = np.random.randint(256, size=(40, 784)).astype(np.uint8)
+    self.labels = np.random.randint(10, size=40).astype(np.uint8)
+    self.mu, self.sigma = compute_feature_statistics(self.inputs)
+
+  def test_labels(self):  # Decoded from one-hot to uint8 as the row-by-row decode did, also memory-mapped
+    label_matrix = np.eye(10)[self.labels]  # One-hot, float64 as on disk
+    labels_baseline = [np.nonzero(row)[0][0] for row in label_matrix]
+    with tempfile.TemporaryDirectory() as directory:
+      np.save(os.path.join(directory, 'inputs_train.npy'), self.inputs)
+      np.save(os.path.join(directory, 'labels_train.npy'), label_matrix)
+      for mmap_mode in [None, 'r']:
+        dataset = MNISTDataset('train', mmap_mode=mmap_mode, datadir=directory)
+        self.assertEqual(dataset.labels.dtype, np.uint8)
+        self.assertEqual(dataset.labels.shape, (40,))
+        self.assertEqual(dataset.labels.tolist(), labels_baseline)
+        self.assertEqual(dict(dataset.label_count), {label: labels_baseline.count(label) for label in range(10)})
+        np.testing.assert_array_equal(dataset.inputs, self.inputs)
+
+  def test_normalize_cache(self):
+    features_fresh = normalize_features(self.inputs, self.mu, self.sigma)[0]
+    with tempfile.TemporaryDirectory() as directory:
+      dataset = MNISTDataset('train', inputs=self.inputs, labels=self.labels)
+      features = dataset.normalize(self.mu, self.sigma, cache_dir=directory)
+      self.assertIs(dataset.normalize(self.mu, self.sigma, cache_dir=directory), features)  # Kept in memory
+      self.assertEqual(len(os.listdir(directory)), 1)
+      dataset = MNISTDataset('train', inputs=self.inputs, labels=self.labels)  # E.g. a later run or another worker
+      features_cached = dataset.normalize(self.mu, self.sigma, cache_dir=directory)
+      self.assertIsInstance(features_cached, np.memmap)  # Loaded from the cache, not recomputed
+      np.testing.assert_allclose(features_cached, features_fresh, rtol=0., atol=1e-12)
+
+      mu, sigma = self.mu + 1., self.sigma * 2.  # Different statistics are not served from the cache
+      features_other = dataset.normalize(mu, sigma, cache_dir=directory)
+      self.assertEqual(len(os.listdir(directory)), 2)
+      np.testing.assert_allclose(features_other, normalize_features(self.inputs, mu, sigma)[0], rtol=0., atol=1e-12)
+      features_float32 = dataset.normalize(mu, sigma, dtype=np.float32, cache_dir=directory)  # Nor a different dtype
+      self.assertEqual(features_float32.dtype, np.float32)
+      self.assertEqual(len(os.listdir(directory)), 3)
+
+class TestOptimizers(unittest.TestCase):
+
+  def setUp(self):
+    self.model = LinearClassifier(np.zeros((5, 1)), 2)  # W is (2, 2)
+    self.W = np.array([[1., -2.], [0.5, 0.]])
+    self.W_grad = np.array([[0.1, -0.2], [0.4, 0.]])
+
+  def steps(self, optimizer_type, learning_rate, num_steps=2, **optimizer_options):  # The same gradient at every step
+    self.model.W = self.W.copy()
+    optimizer = optimizer_types[optimizer_type](self.model, learning_rate, **optimizer_options)
+    for _ in range(num_steps):
+      self.model.W_grad[:] = self.W_grad
+      optimizer.step()
+      optimizer.zero_grad()
+    self.assertEqual(np.abs(self.model.W_grad).max(), 0.)
+    return self.model.W
+
+  def test_sgd(self):  # W - lr g
+    np.testing.assert_allclose(self.steps('sgd', 0.5, num_steps=1), [[0.95, -1.9], [0.3, 0.]])
+
+  def test_momentum(self):  # v = g, then 1.9 g: W - lr (1 + 1.9) g
+    np.testing.assert_allclose(self.steps('momentum', 0.5), [[0.855, -1.71], [-0.08, 0.]])
+
+  def test_nesterov(self):  # lr (g + 0.9 v) with v = g, then 1.9 g: W - lr (1.9 + 2.71) g
+    np.testing.assert_allclose(self.steps('nesterov', 0.5), [[0.7695, -1.539], [-0.422, 0.]])
+
+  def test_adagrad(self):  # G = g^2, then 2 g^2: W - lr (1 + 1 / sqrt(2)) sign(g), no move where g = 0
+    step = 0.5 * (1. + 1. / np.sqrt(2.))
+    np.testing.assert_allclose(self.steps('adagrad', 0.5), [[1. - step, -2. + step], [0.5 - step, 0.]], atol=1e-7)
+
+  def test_adam(self):  # With bias correction, a constant gradient moves every weight by lr sign(g) per step
+    np.testing.assert_allclose(self.steps('adam', 0.1), [[0.8, -1.8], [0.3, 0.]], atol=1e-5)  # Up to epsilon
+
+  def test_train(self):  # Every optimizer reduces the loss from log(10) at W = 0
+    for optimizer_type, learning_rate in [('sgd', 0.1), ('momentum', 0.01), ('nesterov', 0.01), ('adagrad', 0.1), ('adam', 0.01)]:
+      _, acc_val, loss_avg, _ = train(*synthetic_datasets(), learning_rate=learning_rate, max_num_epochs=3, optimizer_type=optimizer_type)
+      self.assertLess(loss_avg, 0.7 * np.log(10), optimizer_type)
+      self.assertGreater(acc_val, 50., optimizer_type)
+
+class TestTrainLBFGS(unittest.TestCase):
+
+  def test_convergence(self):  # The minimizer of the convex training loss, at least as good as long SGD
+    for regularization_weight in [0., 0.01]:
+      datasets = synthetic_datasets(noise=0.2)
+      model, acc_val, loss_avg, _ = train_lbfgs(*datasets, regularization_weight=regularization_weight, max_num_iterations=500)
+      model_sgd, acc_val_sgd, _, _ = train(*synthetic_datasets(noise=0.2), regularization_weight=regularization_weight, 
+                                           learning_rate=0.05, max_num_epochs=100, decay=1., tolerance=100)
+      X, y = datasets[0].features, datasets[0].labels[:, np.newaxis]
+      loss_avg_sgd = model_sgd.loss_and_gradient(X, y, regularization_weight, normalized=True)[0]
+      loss_avg_check, W_grad = model.loss_and_gradient(X, y, regularization_weight, normalized=True)
+      self.assertAlmostEqual(loss_avg_check, loss_avg)
+      self.assertLess(np.abs(W_grad).max(), 1e-4)
+      self.assertLessEqual(loss_avg, loss_avg_sgd + 1e-6)
+      self.assertAlmostEqual(acc_val, acc_val_sgd, delta=3.)
+      if regularization_weight > 0.:  # Strongly convex, so SGD approaches the same minimizer
+        self.assertAlmostEqual(loss_avg, loss_avg_sgd, delta=0.01)
+        np.testing.assert_allclose(model_sgd.W, model.W, rtol=0., atol=0.2)
+
+class TestConfusionMatrix(unittest.TestCase):
+
+  def test_counts(self):  # Same as counting one example at a time, over several batches
+    set_seed(42)
+    y, preds = np.random.randint(10, size=(500, 1)).astype(np.uint8), np.random.randint(10, size=(500, 1))
+    counts = np.zeros((10, 10), dtype=int)
+    for gold, pred in zip(y[:, 0], preds[:, 0]):
+      counts[gold, pred] += 1
+    confusion_matrix = ConfusionMatrix(10)
+    for start in range(0, len(y), 64):
+      confusion_matrix.update(y[start:start + 64], preds[start:start + 64])
+    np.testing.assert_array_equal(confusion_matrix.counts, counts)
+    self.assertEqual(confusion_matrix.num_examples(), 500)
+    self.assertAlmostEqual(confusion_matrix.accuracy(), np.mean(y == preds) * 100.)
+    np.testing.assert_allclose(confusion_matrix.row_normalized().sum(axis=1), 100.)
+
+  def test_precision_recall(self):
+    confusion_matrix = ConfusionMatrix(3)
+    confusion_matrix.update(np.array([0, 0, 0, 0, 1, 1, 2]), np.array([0, 0, 0, 1, 1, 0, 0]))
+    np.testing.assert_array_equal(confusion_matrix.counts, [[3, 1, 0], [1, 1, 0], [1, 0, 0]])
+    np.testing.assert_allclose(confusion_matrix.per_class_accuracy(), [75., 50., 0.])  # Recall: 3/4, 1/2, 0/1
+    np.testing.assert_allclose(confusion_matrix.per_class_precision(), [60., 50., 0.])  # 3/5, 1/2, and 2 is never predicted
+    self.assertAlmostEqual(confusion_matrix.accuracy(), 4 / 7 * 100.)
+
+class TestTrainMany(unittest.TestCase):
+
+  def test_train(self):  # Each configuration trains exactly as a separate train call
+    regularization_weights = [0., 0.001, 0.1]
+    options = {'batch_size': 16, 'max_num_epochs': 6, 'init_range': 0.01, 'tolerance': 1, 'seed': 3}
+    results = train_many(*synthetic_datasets(), regularization_weights, **options)
+    self.assertEqual(len(results), len(regularization_weights))
+    for regularization_weight, (model, acc_val, loss_avg, acc_train) in zip(regularization_weights, results):
+      model_gold, acc_val_gold, loss_avg_gold, acc_train_gold = train(*synthetic_datasets(), regularization_weight=regularization_weight, **options)
+      np.testing.assert_allclose(model.W, model_gold.W, rtol=0., atol=1e-10)
+      self.assertAlmostEqual(loss_avg, loss_avg_gold, places=8)
+      self.assertEqual((acc_val, acc_train), (acc_val_gold, acc_train_gold))
+
+class TestTrainDataParallel(unittest.TestCase):
+
+  def test_one_worker(self):  # Same epoch orders and the same updates as train
+    options = {'batch_size': 16, 'regularization_weight': 0.001, 'max_num_epochs': 3, 'init_range': 0.01}
+    model, acc_val, loss_avg, acc_train = train(*synthetic_datasets(), **options)
+    model_parallel, acc_val_parallel, loss_avg_parallel, acc_train_parallel = train_data_parallel(*synthetic_datasets(), num_workers=1, **options)
+    np.testing.assert_allclose(model_parallel.W, model.W, rtol=0., atol=1e-12)
+    self.assertAlmostEqual(loss_avg_parallel, loss_avg, places=10)
+    self.assertEqual((acc_val_parallel, acc_train_parallel), (acc_val, acc_train))
+
+  def test_two_workers(self):  # The shard gradients average to the batch gradient
+    options = {'batch_size': 16, 'max_num_epochs': 2}
+    model, _, loss_avg, _ = train(*synthetic_datasets(), **options)
+    model_parallel, _, loss_avg_parallel, _ = train_data_parallel(*synthetic_datasets(), num_workers=2, **options)
+    np.testing.assert_allclose(model_parallel.W, model.W, rtol=0., atol=1e-10)
+    self.assertAlmostEqual(loss_avg_parallel, loss_avg, places=8)
+
+class TestSaveModel(unittest.TestCase):
+
+  def test_save_model(self):  # Same predictions, from read-only memory-mapped arrays
+    set_seed(42)
+    model = LinearClassifier(np.random.randint(256, size=(50, 784)), 10, init_range=0.1)
+    X = np.random.randint(256, size=(64, 784)).astype(np.uint8)
+    for model_saved, names in [(model, ['W', 'mu', 'sigma']), (model.fold(), ['W', 'b']), 
+                               (model.fold().quantize(), ['W_quantized', 'scale', 'b'])]:
+      with tempfile.TemporaryDirectory() as directory:
+        save_model(model_saved, directory)
+        model_loaded = load_model(directory)
+        self.assertIs(type(model_loaded), type(model_saved))
+        np.testing.assert_array_equal(model_loaded.predict(X), model_saved.predict(X))
+        for name in names:
+          array = getattr(model_loaded, name)
+          self.assertIsInstance(array, np.memmap)
+          self.assertFalse(array.flags.writeable)
@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from cs461.regression import (LinearRegressor, asymmetric_squared_loss_and_gradient, gradient_descent, load_model, 
+                              polynomial_expansion, save_model, squared_loss_and_gradient)
+from cs461.utils import check_gradient
+
+
+class TestLinearRegressor(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(42)
+    self.X = rng.randn(50, 3)
+    self.y = self.X.dot([1., -2., 0.5]) + 3 + 0.1 * rng.randn(50)
+    self.X_new = polynomial_expansion(self.X, (0, 1, 2))[0]
+    self.w = rng.randn(self.X_new.shape[1])
+
+  def test_gradient(self):
+    self.assertLess(check_gradient(lambda w: squared_loss_and_gradient(self.X_new, self.y, w), self.w), 1e-6)
+    for alpha in [0.05, 1., 3.]:
+      loss_and_gradient = lambda w: asymmetric_squared_loss_and_gradient(self.X_new, self.y, w, alpha=alpha)
+      self.assertLess(check_gradient(loss_and_gradient, self.w), 1e-6)
+
+  def test_asymmetric_loss(self):
+    self.assertAlmostEqual(asymmetric_squared_loss_and_gradient(self.X_new, self.y, self.w, no_grad=True, alpha=1.), 
+                           squared_loss_and_gradient(self.X_new, self.y, self.w, no_grad=True))
+    loss = asymmetric_squared_loss_and_gradient(np.eye(2), np.array([1., -1.]), np.zeros(2), no_grad=True, alpha=0.1)
+    self.assertAlmostEqual(loss, (0.1 + 1.) / 2)  # Underestimating the first label costs alpha as much
+
+  def test_gradient_descent(self):
+    model_exact = LinearRegressor(self.X, self.y, degrees=(0, 1))
+    model = LinearRegressor(degrees=(0, 1))
+    gradient_descent(model, self.X, self.y, squared_loss_and_gradient, lr=0.1)
+    self.assertAlmostEqual(model.squared_loss(self.X, self.y), model_exact.squared_loss(self.X, self.y), places=4)
+
+  def test_save_model(self):
+    model = LinearRegressor(self.X, self.y, degrees=(0, 1, 2))
+    with tempfile.TemporaryDirectory() as directory:
+      save_model(model, directory)
+      model_loaded = load_model(directory)
+      np.testing.assert_array_equal(model_loaded.predict(self.X), model.predict(self.X))
@@ -0,0 +1,224 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from cs461.spam import (DecisionTree, Ensemble, FeatureBins, FeatureIndex, best_split_histogram, best_split_presorted, 
+                        compute_split_loss, fit_stump, fit_stump_histogram, fit_stump_presorted, flatten_trees, load_model, 
+                        predict_flat, save_model)
+from cs461.utils import NullPhaseTimer, set_seed
+
+
+class TestFitStump(unittest.TestCase):
+
+  def setUp(self):
+    set_seed(42)
+    num_features = 15
+    self.dim = 13
+    num_examples = 42
+    num_examples_subset = 31
+
+    # Random feature values in {0...num_features-1}
+    self.data = [[np.random.randint(0, num_features, size=(self.dim,)), 2 * np.random.randint(2) - 1] for _ in range(num_examples)]
+    self.weights = np.random.rand(num_examples)
+    self.indices = np.random.choice(list(range(num_examples)), num_examples_subset, replace=False)
+
+  def fit_stump_naive(self):  # O(dN^2)
+    data = [self.data[i] for i in self.indices]
+    weights = [self.weights[i] for i in self.indices]
+    
+    loss_best = float('inf')
+    feature_best = None
+    threshold_best = None    
+    for feature in range(self.dim):  # O(d)
+      for threshold in self.get_thresholds():  # O(N)
+        total1 = sum([weights[i] for i, (x, _) in enumerate(data) if x[feature] <= threshold])  # O(N)
+        total2 = sum([weights[i] for i, (x, _) in enumerate(data) if x[feature] > threshold])
+        positive1 = sum([weights[i] for i, (x, y) in enumerate(data) if x[feature] <= threshold and y == 1])
+        positive2 = sum([weights[i] for i, (x, y) in enumerate(data) if x[feature] > threshold and y == 1])
+        loss = compute_split_loss(total1, total2, positive1, positive2)
+        if loss < loss_best:
+          loss_best = loss
+          feature_best = feature        
+          threshold_best = threshold
+
+    return feature_best, threshold_best, loss_best  
+
+  def test_fit_stump(self): 
+    feature, threshold, loss = fit_stump(self.data, weights=self.weights, indices=self.indices)
+    feature_gold, threshold_gold, loss_gold = self.fit_stump_naive()
+    self.assertEqual(feature, feature_gold)
+    self.assertAlmostEqual(threshold, threshold_gold)
+    self.assertAlmostEqual(loss, loss_gold)
+
+  def test_fit_stump_presorted(self):
+    index = FeatureIndex(self.data)
+    feature, threshold, loss = fit_stump_presorted(index, self.weights, index.sorted_indices(self.indices))
+    feature_gold, threshold_gold, loss_gold = self.fit_stump_naive()
+    self.assertEqual(feature, feature_gold)
+    self.assertAlmostEqual(threshold, threshold_gold)
+    self.assertAlmostEqual(loss, loss_gold)
+
+  def test_split(self):
+    index = FeatureIndex(self.data)
+    indices_sorted = index.sorted_indices(self.indices)
+    for feature, threshold in [(0, 6.5), (self.dim - 1, 2.5)]:
+      for indices, goes_left in zip(index.split(indices_sorted, feature, threshold), [True, False]):
+        self.assertEqual(sorted(indices[0]), sorted(i for i in self.indices if (self.data[i][0][feature] <= threshold) == goes_left))
+        for f, row in enumerate(indices):  # Still sorted by every feature
+          self.assertTrue((np.diff(index.inputs[row, f]) >= 0).all())
+
+  def test_partition(self):
+    index = FeatureIndex(self.data)
+    order = index.sorted_indices(self.indices).copy()
+    start, end = 0, order.shape[1]
+    for feature, threshold in [(0, 6.5), (self.dim - 1, 2.5)]:  # The second one splits the left child
+      left, right = index.split(order[:, start:end], feature, threshold)
+      middle = index.partition(order, start, end, feature, threshold)
+      np.testing.assert_array_equal(order[:, start:middle], left)
+      np.testing.assert_array_equal(order[:, middle:end], right)
+      end = middle
+
+  def test_split_totals(self):
+    index = FeatureIndex(self.data)
+    indices_sorted = index.sorted_indices(self.indices)
+    bins = FeatureBins(self.data)
+    for feature, threshold, _, totals in [best_split_presorted(index, self.weights, indices_sorted), 
+                                          best_split_histogram(bins, bins.histograms(self.weights, self.indices))]:
+      for indices, (total, positive) in zip(index.split(indices_sorted, feature, threshold), totals):
+        self.assertAlmostEqual(total, self.weights[indices[0]].sum())
+        self.assertAlmostEqual(positive, self.weights[indices[0]][index.labels[indices[0]] == 1].sum())
+
+  def test_fit_stump_histogram(self):
+    bins = FeatureBins(self.data)  # Fewer distinct values than bins, so the same splits as the exact search
+    feature, threshold, loss = fit_stump_histogram(bins, bins.histograms(self.weights, self.indices))
+    feature_gold, threshold_gold, loss_gold = self.fit_stump_naive()
+    self.assertEqual(feature, feature_gold)
+    self.assertAlmostEqual(threshold, threshold_gold)
+    self.assertAlmostEqual(loss, loss_gold)
+
+  def test_histogram_subtraction(self):
+    bins = FeatureBins(self.data, max_bins=4)
+    self.assertTrue((bins.bins < 4).all())
+    threshold = bins.thresholds[0, 1]
+    left, right = bins.split(self.indices, 0, threshold)
+    self.assertEqual(sorted(left), sorted(i for i in self.indices if self.data[i][0][0] <= threshold))
+    histograms = bins.histograms(self.weights, self.indices)
+    np.testing.assert_allclose(histograms - bins.histograms(self.weights, left), bins.histograms(self.weights, right), atol=1e-12)
+    indices = self.indices.copy()
+    middle = bins.partition(indices, 0, len(indices), 0, threshold)
+    np.testing.assert_array_equal(indices[:middle], left)
+    np.testing.assert_array_equal(indices[middle:], right)
+  
+  def get_thresholds(self):
+    feature_values = {}
+    for x, _ in self.data:
+      for value in x:
+        feature_values[value] = True
+    feature_values_sorted = sorted(feature_values.keys())
+    thresholds = [(feature_values_sorted[j] + feature_values_sorted[j + 1]) / 2. for j in range(len(feature_values_sorted) - 1)]
+    return thresholds
+
+class TestBestFirst(unittest.TestCase):
+
+  def setUp(self):
+    set_seed(42)
+    self.data = [(np.random.randn(5).tolist(), 2 * np.random.randint(2) - 1) for _ in range(300)]
+    self.inputs = np.random.randn(100, 5)
+
+  def count_leaves(self, node):
+    return 1 if node.leaf else self.count_leaves(node.child_left) + self.count_leaves(node.child_right)
+
+  def test_max_leaves(self):
+    for max_bins in [None, 16]:
+      for max_leaves in [1, 2, 7, 20]:
+        tree = DecisionTree(self.data, max_depth=32, max_bins=max_bins, max_leaves=max_leaves)
+        self.assertEqual(self.count_leaves(tree.root), max_leaves)
+      stump = DecisionTree(self.data, max_depth=2, max_bins=max_bins)  # Two leaves from the best split of the root
+      tree = DecisionTree(self.data, max_depth=32, max_bins=max_bins, max_leaves=2)
+      self.assertEqual(tree.predict_all(self.inputs), stump.predict_all(self.inputs))
+
+  def test_unlimited(self):  # Without a budget, only zero gain splits are skipped, which do not change predictions
+    for max_bins in [None, 16]:
+      tree = DecisionTree(self.data, max_depth=6, max_bins=max_bins)
+      tree_best_first = DecisionTree(self.data, max_depth=6, max_bins=max_bins, max_leaves=len(self.data))
+      self.assertEqual(tree_best_first.predict_all(self.inputs), tree.predict_all(self.inputs))
+
+  def test_min_gain(self):
+    tree = DecisionTree(self.data, max_depth=32, min_gain=0.5)  # At least the normalized loss of the root
+    self.assertTrue(tree.root.leaf)
+    weights = np.random.rand(len(self.data))
+    for max_bins in [None, 16]:  # Normalized by the root weight, so the same tree for any scale of the weights
+      trees = [DecisionTree(self.data, weights * scale, max_depth=32, max_bins=max_bins, min_gain=0.01) for scale in [1., 1000.]]
+      self.assertEqual(trees[0].predict_all(self.inputs), trees[1].predict_all(self.inputs))
+
+  def test_budget_skips_search(self):
+    class CountingTimer(NullPhaseTimer):
+      def __init__(self):
+        self.counts = {}
+      def phase(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        return super().phase(name)
+    for max_bins in [None, 16]:
+      for max_leaves in [1, 2, 7]:
+        timer = CountingTimer()
+        DecisionTree(self.data, max_depth=32, max_bins=max_bins, max_leaves=max_leaves, timer=timer)
+        self.assertEqual(timer.counts.get('stump', 0), max(2 * max_leaves - 3, 0))  # The root and children of all but the last split
+
+class TestSaveModel(unittest.TestCase):
+
+  def test_save_model(self):
+    set_seed(42)
+    data = [(np.random.randint(0, 15, size=(13,)).tolist(), 2 * np.random.randint(2) - 1) for _ in range(200)]
+    ensemble = Ensemble()
+    for max_depth in [1, 3, 6]:
+      ensemble.classifiers.append(DecisionTree(data, np.random.rand(len(data)), max_depth=max_depth))
+      ensemble.alphas.append(np.random.rand())
+    inputs = [x for x, _ in data]
+    with tempfile.TemporaryDirectory() as directory:
+      for model in [ensemble.classifiers[-1], ensemble]:
+        save_model(model, directory)
+        self.assertEqual(load_model(directory).predict_all(inputs), model.predict_all(inputs))
+
+  def test_predict_flat(self):
+    set_seed(42)
+    data = [(np.random.randn(5).tolist(), 2 * np.random.randint(2) - 1) for _ in range(300)]
+    trees = [DecisionTree(data, np.random.rand(len(data)), max_depth=max_depth) for max_depth in [1, 4, 12]]
+    inputs = np.random.randn(100, 5)
+    preds = predict_flat(flatten_trees([tree.root for tree in trees]), inputs)  # All trees at once
+    for tree, preds_tree in zip(trees, preds):
+      self.assertEqual(preds_tree.tolist(), [tree.predict(x) for x in inputs])
+      self.assertEqual(tree.predict_all(inputs), preds_tree.tolist())
+
+  def test_score_matrix(self):
+    set_seed(42)
+    data = [(np.random.randn(5).tolist(), 2 * np.random.randint(2) - 1) for _ in range(300)]
+    ensemble = Ensemble()
+    for max_depth in [1, 3, 6]:
+      ensemble.classifiers.append(DecisionTree(data, np.random.rand(len(data)), max_depth=max_depth))
+      ensemble.alphas.append(np.random.rand())
+    inputs = [x for x, _ in data]
+    scores = ensemble.score_matrix(inputs)
+    self.assertEqual(scores.shape, (3, len(inputs)))
+    for alpha, classifier, scores_classifier in zip(ensemble.alphas, ensemble.classifiers, scores):
+      np.testing.assert_allclose(scores_classifier, [alpha * classifier.predict(x) for x in inputs])
+    self.assertEqual(ensemble.predict_all(inputs), [ensemble.predict(x) for x in inputs])
+    arrays = ensemble.flatten()
+    self.assertIs(ensemble.flatten(), arrays)  # Cached while the classifiers don't change
+    ensemble.classifiers.append(DecisionTree(data, np.random.rand(len(data)), max_depth=2))
+    ensemble.alphas.append(np.random.rand())
+    self.assertEqual(ensemble.score_matrix(inputs).shape, (4, len(inputs)))
+    self.assertEqual(ensemble.predict_all(inputs), [ensemble.predict(x) for x in inputs])
+
+  def test_evaluate_accuracy(self):  # Same as predicting one row at a time
+    set_seed(42)
+    data = [(np.random.randint(0, 15, size=(13,)).tolist(), 2 * np.random.randint(2) - 1) for _ in range(200)]
+    data_val = [(np.random.randint(0, 15, size=(13,)).tolist(), 2 * np.random.randint(2) - 1) for _ in range(150)]
+    ensemble = Ensemble()
+    for max_depth in [1, 3, 6]:
+      ensemble.classifiers.append(DecisionTree(data, np.random.rand(len(data)), max_depth=max_depth))
+      ensemble.alphas.append(np.random.rand())
+    for model in ensemble.classifiers + [ensemble]:
+      for data_eval in [data, data_val]:
+        accuracy = sum(y == model.predict(x) for x, y in data_eval) / len(data_eval) * 100.
+        self.assertAlmostEqual(model.evaluate_accuracy(data_eval), accuracy)
@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from cs461.svm import KernelSVM, LinearSVM, construct_kernel, load_model, save_model
+from cs461.utils import check_gradient, set_seed
+
+
+class TestLinearSVM(unittest.TestCase):
+
+  def setUp(self):
+    set_seed(42)
+    dim = 3
+    num_examples = 42
+    self.model = LinearSVM(dim, init_randn=True)  # Random init, instead of 0
+    self.X = np.random.randn(num_examples, dim)
+    self.y = 2 * np.random.randint(2, size=(num_examples,)) - 1
+    self.places = 4
+      
+  def test_model(self): 
+    output = self.model.forward(self.X, self.y, 0.01)
+   # true_loss = -0.24501151815868508
+    true_loss = 1.2042458946313077
+    true_grad = [0.16616191, -0.08949146,  0.24762397]
+    self.assertAlmostEqual(output['loss'], true_loss, places=self.places)
+    for i in range(len(true_grad)):
+      self.assertAlmostEqual(output['grad'][i], true_grad[i], places=self.places)
+
+  def test_gradient(self):
+    model = LinearSVM(5000, init_randn=True)
+    X = np.random.randint(2, size=(100, 5000))  # Like bag-of-words inputs
+    y = 2 * np.random.randint(2, size=(100,)) - 1
+    def loss_and_gradient(w):
+      model.w = w
+      output = model.forward(X, y, 0.01)
+      return output['loss'], output['grad']
+    self.assertLess(check_gradient(loss_and_gradient, model.w), 1e-6)
+
+  def test_quantize(self):
+    model = LinearSVM(5000, init_randn=True)
+    X = np.random.randint(3, size=(100, 5000))
+    model_quantized = model.quantize()
+    self.assertEqual(model_quantized.w_quantized.dtype, np.int8)
+    # Rounding moves each weight by at most half a quantization step.
+    error_bound = np.sum(X, axis=1) * model_quantized.scale / 2. + 1e-3
+    self.assertTrue(np.all(np.abs(model_quantized.forward(X)['scores'] - model.forward(X)['scores']) <= error_bound))
+
+class TestSaveModel(unittest.TestCase):
+
+  def test_save_model(self):  # Same predictions, from read-only memory-mapped arrays
+    set_seed(42)
+    X = np.random.randint(3, size=(100, 50))
+    model = LinearSVM(50, init_randn=True)
+    model_kernel = KernelSVM(50, construct_kernel('poly', dim=2, offset=1.))
+    model_kernel.support_X = np.random.randint(3, size=(20, 50)).astype(np.float64)
+    model_kernel.support_y = 2. * np.random.randint(2, size=(20,)) - 1
+    model_kernel.support_al = np.random.randint(1, 5, size=(20,)).astype(np.float64)
+    for model_saved, names in [(model, ['w']), (model.quantize(), ['w_quantized']), 
+                               (model_kernel, ['support_X', 'support_y', 'support_al'])]:
+      with tempfile.TemporaryDirectory() as directory:
+        save_model(model_saved, directory)
+        model_loaded = load_model(directory)
+        self.assertIs(type(model_loaded), type(model_saved))
+        np.testing.assert_array_equal(model_loaded.forward(X)['preds'], model_saved.forward(X)['preds'])
+        np.testing.assert_array_equal(model_loaded.forward(X)['scores'], model_saved.forward(X)['scores'])
+        for name in names:
+          array = getattr(model_loaded, name)
+          self.assertIsInstance(array, np.memmap)
+          self.assertFalse(array.flags.writeable)
@@ -0,0 +1,80 @@
+import io
+import json
+import random
+import time
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from cs461.utils import EpochShuffler, PhaseTimer, run_sweep, set_seed, shared_arrays
+
+
+def evaluate_config(config):  # Runs in a sweep worker
+  time.sleep(config['delay'])
+  return config['score'], (config['name'], float(shared_arrays['inputs'].sum()))
+
+class TestEpochShuffler(unittest.TestCase):
+
+  def setUp(self):
+    self.inputs = np.arange(1003 * 3, dtype=np.float64).reshape(1003, 3)
+    self.labels = np.arange(1003) % 7
+
+  def epochs(self, prefetch, num_epochs=3, batch_size=10):  # Batches of each epoch, and a draw after every epoch
+    set_seed(0)
+    shuffler = EpochShuffler(self.inputs, self.labels, prefetch=prefetch, chunk_size=256)
+    epochs = []
+    for _ in range(num_epochs):
+      batches = [(inds.copy(), X.copy(), y.copy()) for inds, X, y in shuffler.batches(batch_size)]
+      epochs.append((batches, random.random()))
+    return epochs
+
+  def test_batches(self):
+    for batches, _ in self.epochs(prefetch=False):
+      inds = np.concatenate([inds for inds, _, _ in batches])
+      self.assertEqual(sorted(inds.tolist()), list(range(len(self.inputs))))
+      for inds, X, y in batches:
+        np.testing.assert_array_equal(X, self.inputs[inds])
+        np.testing.assert_array_equal(y, self.labels[inds])
+    self.assertEqual(len(batches), 101)
+
+  def test_prefetch(self):  # Same batches and same random stream as without prefetch
+    for (batches, draw), (batches_prefetch, draw_prefetch) in zip(self.epochs(prefetch=False), self.epochs(prefetch=True)):
+      self.assertEqual(draw, draw_prefetch)
+      for batch, batch_prefetch in zip(batches, batches_prefetch):
+        for array, array_prefetch in zip(batch, batch_prefetch):
+          np.testing.assert_array_equal(array, array_prefetch)
+
+class TestRunSweep(unittest.TestCase):
+
+  def test_completion_order(self):  # Yields in completion order, ties go to the earlier config
+    configs = [{'name': 'slow', 'score': 1., 'delay': 1.}, {'name': 'fast', 'score': 1., 'delay': 0.}, 
+               {'name': 'worse', 'score': 0.5, 'delay': 0.}, {'name': 'tie', 'score': 1., 'delay': 0.}]
+    inputs = np.arange(6.)
+    results = list(run_sweep(evaluate_config, configs, {'inputs': inputs}, num_workers=2))
+    self.assertEqual([config['name'] for config, _, _, _ in results], ['fast', 'worse', 'tie', 'slow'])
+    self.assertEqual([is_best for _, _, _, is_best in results], [True, False, False, True])  # Of the tied configs, slow comes first
+    for config, score, (name, total), _ in results:
+      self.assertEqual((score, name, total), (config['score'], config['name'], inputs.sum()))  # Arrays mapped in the worker
+
+class TestPhaseTimer(unittest.TestCase):
+
+  def test_json_lines(self):
+    if not tracemalloc.is_tracing():
+      self.addCleanup(tracemalloc.stop)  # Slows down everything else
+    stream = io.StringIO()
+    timer = PhaseTimer(stream, trace_memory=True)
+    for iteration in range(1, 3):
+      for _ in timer.timed(range(3)):
+        with timer.phase('forward'):
+          np.ones(100000).sum()
+      timer.end_iteration('test', iteration, 300, loss_avg=np.float64(0.5))
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    self.assertEqual([record['iteration'] for record in records], [1, 2])
+    for record in records:
+      self.assertEqual(record['trainer'], 'test')
+      self.assertEqual(sorted(record['phases']), ['data', 'forward'])
+      self.assertLessEqual(sum(record['phases'].values()), record['wall_time'])
+      self.assertAlmostEqual(record['examples_per_sec'], 300 / record['wall_time'])
+      self.assertGreaterEqual(record['peak_memory_bytes'], 100000 * 8)  # The temporary array
+      self.assertEqual(record['loss_avg'], 0.5)